@@ -0,0 +1,89 @@
+"""
+Database configuration for settings.py.
+
+SQLite connections are tuned for several server processes sharing one file:
+
+- WAL journaling lets readers keep reading while one writer commits.
+- ``synchronous=NORMAL`` syncs at checkpoints instead of on every commit.
+  Under WAL a process crash loses nothing; a power cut can lose the last
+  few commits.
+- ``busy_timeout`` makes a connection wait for a lock instead of failing
+  straight away with "database is locked".
+- ``BEGIN IMMEDIATE`` takes the write lock when a transaction starts. A
+  deferred transaction that reads first and then writes cannot wait for
+  the lock: if another writer got there first, SQLite fails the upgrade
+  at once, whatever ``busy_timeout`` says.
+- A larger page cache and memory-mapped reads cut system calls on hot
+  pages.
+
+Connections are kept open for ``CONN_MAX_AGE`` seconds so that the pragmas
+are not re-run on every request. Read replicas can be listed in
+``DATABASE_REPLICAS``; they are opened read-only (``query_only``).
+
+Environment variables:
+
+- ``DATABASE_PATH``: the primary database file (default ``db.sqlite3``)
+- ``DATABASE_REPLICAS``: replica files, separated by commas
+- ``DATABASE_CONN_MAX_AGE``: seconds to keep a connection (default 60)
+- ``DATABASE_BUSY_TIMEOUT_MS``: how long to wait for a lock (default 5000)
+"""
+import os
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    # Negative sizes are KiB: 20 MB of page cache per connection
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+REPLICA_PREFIX = 'replica'
+
+
+def pragma_statements(pragmas):
+    """``PRAGMA`` statements for a mapping of pragma names to values"""
+    return [f'PRAGMA {name}={value}' for name, value in pragmas.items()]
+
+
+def sqlite_database(name, read_only=False, conn_max_age=60, busy_timeout=None):
+    """A ``DATABASES`` entry for one SQLite file with the tuned pragmas"""
+    pragmas = dict(SQLITE_PRAGMAS)
+    if busy_timeout is not None:
+        pragmas['busy_timeout'] = busy_timeout
+    if read_only:
+        pragmas['query_only'] = 1
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': conn_max_age != 0,
+        'OPTIONS': {
+            'init_command': ';'.join(pragma_statements(pragmas)),
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+
+
+def replica_aliases(databases):
+    """Aliases of the configured read replicas, in order"""
+    return [alias for alias in databases if alias.startswith(REPLICA_PREFIX)]
+
+
+def databases_from_env(base_dir, environ=os.environ):
+    """The primary database plus one read-only alias per replica file"""
+    options = {
+        'conn_max_age': int(environ.get('DATABASE_CONN_MAX_AGE', 60)),
+        'busy_timeout': int(environ.get('DATABASE_BUSY_TIMEOUT_MS', SQLITE_PRAGMAS['busy_timeout'])),
+    }
+    databases = {
+        'default': sqlite_database(environ.get('DATABASE_PATH', str(base_dir / 'db.sqlite3')), **options),
+    }
+    replicas = [path.strip() for path in environ.get('DATABASE_REPLICAS', '').split(',') if path.strip()]
+    for number, path in enumerate(replicas, start=1):
+        replica = sqlite_database(path, read_only=True, **options)
+        # Tests read the test primary through the replica alias
+        replica['TEST'] = {'MIRROR': 'default'}
+        databases[f'{REPLICA_PREFIX}_{number}'] = replica
+    return databases
@@ -0,0 +1,321 @@
+"""
+Per-request query and latency instrumentation.
+
+``RequestMetricsMiddleware`` counts every SQL statement a request runs (on
+any database alias, through a connection execute wrapper), with its time,
+and adds the time spent serializing and rendering the response. Each
+request gets:
+
+- a ``Server-Timing`` header (``db``, ``serialize``, ``render``, ``total``),
+  which browser dev tools show under the request's timing tab;
+- one structured log line on the ``alx_travel_app.requests`` logger;
+- observations in the Prometheus histograms served at ``/metrics``.
+
+Requests slower than ``SLOW_REQUEST_MS`` are sampled (``SLOW_REQUEST_SAMPLE_RATE``)
+with their SQL, and requests running more than ``REQUEST_QUERY_BUDGET``
+queries are flagged along with the statements they repeat, which is how an
+N+1 shows up. Both are logged at WARNING.
+
+Metrics live in the memory of each server process, so with several
+workers each scrape sees the share of the worker that answered it.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger('alx_travel_app.requests')
+
+# Statements kept per request for the slow request sample
+MAX_RECORDED_QUERIES = 100
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it runs"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.phases = defaultdict(float)    # phase -> ms, excluding SQL
+        self.statements = Counter()
+        self.recorded = []                  # (sql, ms) of the first statements
+
+
+def current():
+    """Metrics of the request being handled, or None"""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper timing every statement of an instrumented request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        metrics.queries += 1
+        metrics.db_ms += ms
+        metrics.statements[sql] += 1
+        if len(metrics.recorded) < MAX_RECORDED_QUERIES:
+            metrics.recorded.append((sql, ms))
+
+
+def install_query_wrapper():
+    """Wrap this thread's connections, once each"""
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            # First in the list: execute_wrapper() blocks pop() the last one
+            connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def timed(phase):
+    """Add the block's time, less any SQL it ran, to ``phase``"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started, db_ms = time.perf_counter(), metrics.db_ms
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics.phases[phase] += elapsed - (metrics.db_ms - db_ms)
+
+
+class Histogram:
+    """Prometheus histogram with labels"""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}    # label values -> [bucket counts..., sum, count]
+
+    def observe(self, values, amount):
+        row = self.series.setdefault(values, [0] * (len(self.buckets) + 2))
+        for index, bound in enumerate(self.buckets):
+            if amount <= bound:
+                row[index] += 1
+        row[-2] += amount
+        row[-1] += 1
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        for values, row in sorted(self.series.items()):
+            labels = format_labels(self.labels, values)
+            for bound, count in zip(self.buckets, row):
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {count}'
+            yield f'{self.name}_bucket{{{labels},le="+Inf"}} {row[-1]}'
+            yield f'{self.name}_sum{{{labels}}} {row[-2]:.6f}'
+            yield f'{self.name}_count{{{labels}}} {row[-1]}'
+
+
+class CounterMetric:
+    """Prometheus counter with labels"""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = Counter()
+
+    def observe(self, values, amount=1):
+        self.series[values] += amount
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        for values, count in sorted(self.series.items()):
+            yield f'{self.name}{{{format_labels(self.labels, values)}}} {count}'
+
+
+def format_labels(names, values):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+class Registry:
+    """The process's request metrics, in Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = CounterMetric(
+                'http_requests_total', 'Requests by route, method and status.',
+                ('route', 'method', 'status'),
+            )
+            self.latency = Histogram(
+                'http_request_duration_seconds', 'Request latency by route.',
+                ('route', 'method'), LATENCY_BUCKETS,
+            )
+            self.db_time = Histogram(
+                'http_request_db_duration_seconds', 'SQL time per request by route.',
+                ('route', 'method'), LATENCY_BUCKETS,
+            )
+            self.queries = Histogram(
+                'http_request_db_queries', 'SQL statements per request by route.',
+                ('route', 'method'), QUERY_BUCKETS,
+            )
+            self.over_budget = CounterMetric(
+                'http_requests_over_query_budget_total',
+                'Requests that ran more queries than REQUEST_QUERY_BUDGET.',
+                ('route', 'method'),
+            )
+
+    def observe(self, route, method, status, seconds, metrics, over_budget):
+        with self.lock:
+            self.requests.observe((route, method, str(status)))
+            self.latency.observe((route, method), seconds)
+            self.db_time.observe((route, method), metrics.db_ms / 1000)
+            self.queries.observe((route, method), metrics.queries)
+            if over_budget:
+                self.over_budget.observe((route, method))
+
+    def render(self):
+        with self.lock:
+            metrics = (self.requests, self.latency, self.db_time, self.queries, self.over_budget)
+            return '\n'.join(line for metric in metrics for line in metric.lines()) + '\n'
+
+
+registry = Registry()
+
+
+def route_name(request):
+    """Bounded label for the URL pattern that handled ``request``"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def server_timing(metrics, total_ms):
+    entries = [f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries"']
+    entries += [f'{phase};dur={ms:.1f}' for phase, ms in metrics.phases.items()]
+    entries.append(f'total;dur={total_ms:.1f}')
+    return ', '.join(entries)
+
+
+class RequestMetricsMiddleware:
+    """Time each request's SQL, serialization and rendering, and report it"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_wrapper()
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        # Async ORM calls run in the thread-sensitive executor thread
+        await sync_to_async(install_query_wrapper)()
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, metrics)
+        return response
+
+    def report(self, request, response, metrics):
+        total_ms = (time.perf_counter() - metrics.started) * 1000
+        route = route_name(request)
+        budget = getattr(settings, 'REQUEST_QUERY_BUDGET', 50)
+        over_budget = metrics.queries > budget
+        response['Server-Timing'] = server_timing(metrics, total_ms)
+        registry.observe(route, request.method, response.status_code, total_ms / 1000, metrics, over_budget)
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.db_ms, 2),
+            **{f'{phase}_ms': round(ms, 2) for phase, ms in metrics.phases.items()},
+        }
+        level = logging.INFO
+        if over_budget:
+            level = logging.WARNING
+            fields['query_budget'] = budget
+            fields['repeated_sql'] = [
+                {'sql': sql, 'count': count}
+                for sql, count in metrics.statements.most_common(3) if count > 1
+            ]
+        slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        if total_ms >= slow_ms and random.random() < getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 1.0):
+            level = logging.WARNING
+            fields['slow'] = True
+            fields['sql'] = [{'sql': sql, 'ms': round(ms, 2)} for sql, ms in metrics.recorded]
+        logger.log(level, '%s %s %s %.1fms', request.method, request.path, response.status_code,
+                   total_ms, extra={'fields': fields})
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with a record's ``fields`` merged in"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **getattr(record, 'fields', {}),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: staff, or ``Authorization: Bearer $METRICS_TOKEN``"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    allowed = (
+        (token and constant_time_compare(header, f'Bearer {token}'))
+        or (request.user.is_authenticated and request.user.is_staff)
+    )
+    if not allowed:
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,194 @@
+"""
+Read/write routing between the primary database and read replicas.
+
+``ReplicaRouter`` sends reads of the models in ``REPLICA_MODELS`` to a
+replica alias (see ``DATABASE_REPLICAS`` in database.py) and everything
+else, including every write, to ``default``. Once something has written,
+the rest of the request (or of the command or task) reads from the primary
+too, so nobody misses their own write. Reads inside a transaction on the
+primary stay there as well.
+
+Replicas are chosen by health and lag. Lag comes from a heartbeat row
+that ``beat()`` writes on the primary and replication copies to each
+replica: lag = now - the replica's heartbeat. A replica that cannot be
+queried, has no heartbeat, or lags more than ``REPLICA_MAX_LAG`` seconds
+is skipped until its next check. When no replica qualifies, reads go to
+the primary.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from .database import replica_aliases
+
+HEARTBEAT_TABLE = 'replication_heartbeat'
+
+# Set once the current request (or command) has written to the primary
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def primary_only():
+    """Read from the primary inside the block, e.g. to fill a cache"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def beat(using=DEFAULT_DB_ALIAS, clock=time.time):
+    """Record the current time in the primary's heartbeat row"""
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {HEARTBEAT_TABLE} '
+            f'(id INTEGER PRIMARY KEY, beat DOUBLE PRECISION NOT NULL)'
+        )
+        cursor.execute(f'DELETE FROM {HEARTBEAT_TABLE}')
+        cursor.execute(f'INSERT INTO {HEARTBEAT_TABLE} (id, beat) VALUES (1, %s)', [clock()])
+
+
+def heartbeat_lag(alias, clock=time.time):
+    """Seconds the replica ``alias`` is behind the primary, or None if unusable"""
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'SELECT beat FROM {HEARTBEAT_TABLE} WHERE id = 1')
+            row = cursor.fetchone()
+    except DatabaseError:
+        # Reconnect on the next check rather than reuse a broken connection
+        connections[alias].close()
+        return None
+    if row is None:
+        return None
+    return max(0.0, clock() - row[0])
+
+
+class ReplicaMonitor:
+    """Health and lag of each replica, re-checked at most every ``interval`` seconds"""
+
+    def __init__(self, aliases=None, probe=heartbeat_lag, clock=time.monotonic):
+        self._aliases = aliases
+        self.probe = probe
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.checked = {}   # alias -> (monotonic time of check, lag or None)
+
+    @property
+    def aliases(self):
+        if self._aliases is None:
+            return replica_aliases(settings.DATABASES)
+        return self._aliases
+
+    @property
+    def max_lag(self):
+        return getattr(settings, 'REPLICA_MAX_LAG', 5.0)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'REPLICA_CHECK_INTERVAL', 5.0)
+
+    def lag(self, alias):
+        """Cached lag of ``alias``; None while it is unhealthy"""
+        now = self.clock()
+        with self.lock:
+            checked = self.checked.get(alias)
+            if checked is not None and now - checked[0] < self.interval:
+                return checked[1]
+        lag = self.probe(alias)
+        with self.lock:
+            self.checked[alias] = (now, lag)
+        return lag
+
+    def status(self):
+        """{alias: lag or None} for every replica"""
+        return {alias: self.lag(alias) for alias in self.aliases}
+
+    def choose(self):
+        """A healthy replica within the lag limit, favouring fresher ones; or None"""
+        candidates = [
+            (alias, lag) for alias, lag in self.status().items()
+            if lag is not None and lag <= self.max_lag
+        ]
+        if not candidates:
+            return None
+        aliases, lags = zip(*candidates)
+        return random.choices(aliases, weights=[1 / (1 + lag) for lag in lags])[0]
+
+
+monitor = ReplicaMonitor()
+
+
+class ReplicaRouter:
+    """Reads of ``REPLICA_MODELS`` from replicas, everything else from the primary"""
+
+    def __init__(self, monitor=monitor):
+        self.monitor = monitor
+
+    def replica_models(self):
+        return getattr(settings, 'REPLICA_MODELS', ('listings.listing', 'listings.review'))
+
+    def db_for_read(self, model, **hints):
+        if (
+            model._meta.label_lower not in self.replica_models()
+            or is_pinned()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Follow relations from where the object was loaded
+            return instance._state.db
+        return self.monitor.choose() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in self.monitor.aliases
+
+
+class PrimaryPinningMiddleware:
+    """Start each request unpinned, so earlier writes do not pin later requests"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _pinned.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+    async def __acall__(self, request):
+        token = _pinned.set(False)
+        try:
+            return await self.get_response(request)
+        finally:
+            _pinned.reset(token)
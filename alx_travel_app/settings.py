@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
+from .database import databases_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'alx_travel_app.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'alx_travel_app.routers.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,14 +79,114 @@ WSGI_APPLICATION = 'alx_travel_app.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# SQLite in WAL mode with persistent connections; DATABASE_PATH,
+# DATABASE_REPLICAS and friends are described in alx_travel_app/database.py.
+
+DATABASES = databases_from_env(BASE_DIR)
+
+# Listing and review reads go to a replica when one is healthy and no more
+# than REPLICA_MAX_LAG seconds behind; see alx_travel_app/routers.py.
+DATABASE_ROUTERS = ['alx_travel_app.routers.ReplicaRouter']
+REPLICA_MODELS = ('listings.listing', 'listings.review')
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+
+
+# Request instrumentation (alx_travel_app/instrumentation.py): requests
+# running more than REQUEST_QUERY_BUDGET queries are flagged, and a share of
+# requests slower than SLOW_REQUEST_MS are logged with their SQL. /metrics
+# takes "Authorization: Bearer $METRICS_TOKEN" or a staff session.
+
+REQUEST_QUERY_BUDGET = int(os.environ.get('REQUEST_QUERY_BUDGET', 50))
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', 1.0))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Booking lifecycle jobs (listings/jobs.py, run by "manage.py run_worker"):
+# pending bookings are cancelled BOOKING_PENDING_TTL_HOURS after creation,
+# and a worker renews its JOB_LEASE_SECONDS lease after every batch.
 
-DATABASES = {
+BOOKING_PENDING_TTL_HOURS = float(os.environ.get('BOOKING_PENDING_TTL_HOURS', 24))
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', 500))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+
+# Booking responses stored for Idempotency-Key retries (listings/bookings.py)
+# are kept this long, then purged by the purge_idempotency_keys job.
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# Request and job logs are JSON lines on stderr. "manage.py test" drops them,
+# since every request would otherwise print one; tests read them with assertLogs.
+
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'alx_travel_app.instrumentation.JSONFormatter'},
+    },
+    'handlers': {
+        'requests': (
+            {'class': 'logging.NullHandler'} if TESTING
+            else {'class': 'logging.StreamHandler', 'formatter': 'json'}
+        ),
+    },
+    'loggers': {
+        'alx_travel_app.requests': {
+            'handlers': ['requests'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'listings.jobs': {
+            'handlers': ['requests'],
+            'level': os.environ.get('JOB_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_BACKEND picks locmem (default, per process), file or redis; all
+# processes must share a file or redis cache for version stamps to agree.
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'alx-travel'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_DEFAULT_LOCATION),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'alx'),
     }
 }
 
+# Seconds cached listing responses live (see listings/caching.py)
+RESPONSE_CACHE_TIMEOUTS = {
+    'listing_detail': int(os.environ.get('LISTING_DETAIL_CACHE_TIMEOUT', 60 * 60)),
+    'listing_search': int(os.environ.get('LISTING_SEARCH_CACHE_TIMEOUT', 30)),
+}
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'listings.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    'DEFAULT_RENDERER_CLASSES': [
+        'listings.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -15,9 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 from django.shortcuts import redirect
 
+from .instrumentation import metrics_view
+
 def redirect_to_admin(request):
     """Redirect root URL to admin interface"""
     return redirect('admin:index')
@@ -25,4 +27,6 @@ def redirect_to_admin(request):
 urlpatterns = [
     path('', redirect_to_admin, name='home'),
     path('admin/', admin.site.urls),
+    path('api/', include('listings.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
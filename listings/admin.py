@@ -1,14 +1,166 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib import admin
-from .models import Listing, Booking, Review
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, QuerySet
+from django.utils.functional import cached_property
+
+from .caching import get_cache
+from .fulltext import get_backend
+from .models import Listing, Booking, Job, Review, PriceOverride
+
+
+def estimated_count(queryset):
+    """Rough row count of the queryset's whole table, without scanning it.
+    
+    PostgreSQL keeps an estimate in ``pg_class``; elsewhere the largest
+    primary key stands in, which overcounts only by the deleted rows.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        return queryset.model._default_manager.using(queryset.db).aggregate(top=Max('pk'))['top'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts more than ``ADMIN_EXACT_COUNT_LIMIT`` rows.
+    
+    An unfiltered changelist over a big table shows the table estimate; a
+    filtered one counts up to the limit and stops there.
+    """
+    
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
+
+
+def cached_list(key, values):
+    """``list(values)``, kept in the cache for ``ADMIN_FILTER_CACHE_TIMEOUT`` seconds"""
+    cache = get_cache()
+    found = cache.get(key)
+    if found is None:
+        found = list(values)
+        cache.set(key, found, getattr(settings, 'ADMIN_FILTER_CACHE_TIMEOUT', 600))
+    return found
+
+
+class CachedValuesListFilter(admin.AllValuesFieldListFilter):
+    """``AllValuesFieldListFilter`` whose distinct values are cached.
+    
+    The values are recomputed every ``ADMIN_FILTER_CACHE_TIMEOUT`` seconds
+    (default 10 minutes) instead of on every changelist view.
+    """
+    
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = f'admin:filter-values:{model._meta.label_lower}:{field_path}'
+        self.lookup_choices = cached_list(key, self.lookup_choices)
+
+
+class CachedDatesQuerySet(QuerySet):
+    """QuerySet whose ``dates()``/``datetimes()`` lists are cached.
+    
+    The admin date hierarchy lists the years (or months, or days) holding
+    rows with a DISTINCT over every row in range; this serves those lists
+    from the cache like ``CachedValuesListFilter``.
+    """
+    
+    def cached_key(self, *args):
+        digest = hashlib.sha1(str(self.query).encode()).hexdigest()
+        return f'admin:dates:{self.model._meta.label_lower}:{":".join(map(str, args))}:{digest}'
+    
+    def dates(self, field_name, kind, order='ASC'):
+        values = super().dates(field_name, kind, order)
+        return cached_list(self.cached_key(field_name, kind, order), values)
+    
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        values = super().datetimes(field_name, kind, order, tzinfo)
+        return cached_list(self.cached_key(field_name, kind, order, tzinfo), values)
+
+
+class ColumnsChangeList(ChangeList):
+    """Changelist loading only the admin's ``list_only`` columns"""
+    
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.model_admin.list_only:
+            queryset = queryset.only(*self.model_admin.list_only)
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count or scan per page view.
+    
+    Related objects shown in ``list_display`` are joined
+    (``list_select_related``) and only the displayed columns are read
+    (``list_only``). Counts are estimated or capped, date hierarchy lists are
+    cached, facet counts are off, and the related-object pickers in forms
+    are autocompletes.
+    """
+    
+    list_only = ()
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    
+    def get_queryset(self, request):
+        # A clone keeps the unresolved alias (``_db``), hints and prefetches;
+        # building a new one from ``.db`` would pin the router's answer now
+        queryset = super().get_queryset(request)._chain()
+        queryset.__class__ = CachedDatesQuerySet
+        return queryset
+    
+    def get_changelist(self, request, **kwargs):
+        return ColumnsChangeList
+
+
+class PriceOverrideInline(admin.TabularInline):
+    model = PriceOverride
+    extra = 0
 
 
 @admin.register(Listing)
-class ListingAdmin(admin.ModelAdmin):
+class ListingAdmin(LargeTableAdmin):
     list_display = ['title', 'city', 'country', 'property_type', 'price_per_night', 'host', 'is_active', 'is_instant_bookable']
-    list_filter = ['property_type', 'is_active', 'is_instant_bookable', 'country', 'city']
+    list_filter = [
+        'property_type', 'is_active', 'is_instant_bookable',
+        ('country', CachedValuesListFilter), ('city', CachedValuesListFilter),
+    ]
+    list_select_related = ['host']
+    list_only = [
+        'title', 'city', 'country', 'property_type', 'price_per_night',
+        'is_active', 'is_instant_bookable', 'host__username',
+    ]
     search_fields = ['title', 'description', 'address', 'city', 'country']
     list_editable = ['is_active', 'is_instant_bookable']
+    ordering = ['-created_at', '-id']
+    date_hierarchy = 'created_at'
+    autocomplete_fields = ['host']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [PriceOverrideInline]
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Search through the full-text index instead of LIKE '%term%' on every column"""
+        if not search_term.strip():
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
     
     fieldsets = (
         ('Basic Information', {
@@ -21,7 +173,7 @@ class ListingAdmin(admin.ModelAdmin):
             'fields': ('property_type', 'bedrooms', 'bathrooms', 'max_guests')
         }),
         ('Pricing', {
-            'fields': ('price_per_night', 'cleaning_fee', 'service_fee')
+            'fields': ('price_per_night', 'cleaning_fee', 'service_fee', 'weekly_discount', 'monthly_discount')
         }),
         ('Settings', {
             'fields': ('amenities', 'house_rules', 'is_active', 'is_instant_bookable')
@@ -34,10 +186,19 @@ class ListingAdmin(admin.ModelAdmin):
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ['id', 'listing', 'guest', 'check_in_date', 'check_out_date', 'number_of_guests', 'total_price', 'status']
-    list_filter = ['status', 'check_in_date', 'check_out_date']
+    # check_in_date is indexed; check_out_date is left to the search
+    list_filter = ['status', 'check_in_date']
+    list_select_related = ['listing', 'guest']
+    list_only = [
+        'check_in_date', 'check_out_date', 'number_of_guests', 'total_price', 'status',
+        'listing__title', 'listing__city', 'listing__country', 'guest__username',
+    ]
     search_fields = ['listing__title', 'guest__username', 'guest__email']
+    ordering = ['-created_at', '-id']
+    date_hierarchy = 'check_in_date'
+    autocomplete_fields = ['listing', 'guest']
     readonly_fields = ['total_price', 'created_at', 'updated_at']
     
     fieldsets = (
@@ -55,10 +216,18 @@ class BookingAdmin(admin.ModelAdmin):
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ['id', 'listing', 'guest', 'rating', 'created_at']
-    list_filter = ['rating', 'created_at']
+    list_filter = [('rating', CachedValuesListFilter), 'created_at']
+    list_select_related = ['listing', 'guest']
+    list_only = [
+        'rating', 'created_at', 'listing__title', 'listing__city', 'listing__country', 'guest__username',
+    ]
     search_fields = ['listing__title', 'guest__username', 'comment']
+    ordering = ['-created_at', '-id']
+    date_hierarchy = 'created_at'
+    autocomplete_fields = ['listing', 'guest']
+    raw_id_fields = ['booking']
     readonly_fields = ['created_at', 'updated_at']
     
     fieldsets = (
@@ -75,3 +244,15 @@ class ReviewAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['key', 'status', 'processed', 'batches', 'attempts', 'locked_by', 'run_after', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['key']
+    ordering = ['-run_after', '-id']
+    readonly_fields = [
+        'name', 'key', 'cursor', 'processed', 'batches', 'attempts', 'last_error',
+        'locked_by', 'locked_until', 'created_at', 'started_at', 'finished_at',
+    ]
@@ -0,0 +1,243 @@
+"""
+Host analytics from per-listing daily rollups.
+
+``ListingDailyStats`` holds one row per listing and day with the nights
+booked, the revenue earned that night, the bookings cancelled with that
+check-in date and the reviews written that day. Occupancy, revenue and ADR
+per month are then a ``GROUP BY`` over at most 31 rows per listing and
+month, instead of splitting every booking into nights on each page view.
+
+Rows are recomputed from the source tables rather than adjusted by deltas:
+a booking change rebuilds the booking columns of the days its old and new
+stays cover, and a review change rebuilds the review columns of its day.
+That makes every refresh idempotent, so a missed or repeated signal heals on
+the next write, and ``backfill_daily_stats`` can rebuild everything.
+"""
+import calendar
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .bulk import insert_rows, prepare_rows
+from .models import Booking, ListingDailyStats, Review
+
+# Bookings whose nights count as occupied and earn revenue
+EARNING_STATUSES = ('confirmed', 'completed')
+
+BOOKING_FIELDS = ['nights_booked', 'revenue', 'cancellations']
+REVIEW_FIELDS = ['review_count', 'rating_sum']
+
+BOOKING_COLUMNS = ('listing_id', 'check_in_date', 'check_out_date', 'status', 'total_price')
+REVIEW_COLUMNS = ('listing_id', 'created_at', 'rating')
+
+CENT = Decimal('0.01')
+
+
+def contribution(status):
+    """How a booking in ``status`` shows up in the rollups: 'earning', 'cancelled' or None"""
+    if status in EARNING_STATUSES:
+        return 'earning'
+    if status == 'cancelled':
+        return 'cancelled'
+    return None
+
+
+def nightly_revenue(total_price, nights):
+    """Split a stay's price over its nights, to the cent, earliest nights taking the remainder"""
+    if nights <= 0:
+        # Bad dates earn nothing rather than failing the whole rollup
+        return []
+    cents = int((Decimal(total_price) / CENT).to_integral_value())
+    base, extra = divmod(cents, nights)
+    return [Decimal(base + (night < extra)) * CENT for night in range(nights)]
+
+
+def booking_days(rows, start=None, end=None):
+    """Booking columns per (listing_id, day) for rows of BOOKING_COLUMNS, within [start, end)"""
+    days = defaultdict(lambda: {'nights_booked': 0, 'revenue': Decimal('0.00'), 'cancellations': 0})
+    for listing_id, check_in, check_out, status, total_price in rows:
+        if status in EARNING_STATUSES:
+            nights = (check_out - check_in).days
+            for offset, revenue in enumerate(nightly_revenue(total_price, nights)):
+                night = check_in + timedelta(days=offset)
+                if (start is None or night >= start) and (end is None or night < end):
+                    day = days[listing_id, night]
+                    day['nights_booked'] += 1
+                    day['revenue'] += revenue
+        elif status == 'cancelled':
+            if (start is None or check_in >= start) and (end is None or check_in < end):
+                days[listing_id, check_in]['cancellations'] += 1
+    return days
+
+
+def review_days(rows):
+    """Review columns per (listing_id, day) for rows of REVIEW_COLUMNS"""
+    days = defaultdict(lambda: {'review_count': 0, 'rating_sum': 0})
+    for listing_id, created_at, rating in rows:
+        day = days[listing_id, timezone.localdate(created_at)]
+        day['review_count'] += 1
+        day['rating_sum'] += rating
+    return days
+
+
+def day_row(listing_id, day, **values):
+    return ListingDailyStats(listing_id=listing_id, date=day, month=day.replace(day=1), **values)
+
+
+def upsert(rows, fields):
+    """Write ``fields`` of the rows, leaving the other columns of existing days alone"""
+    ListingDailyStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['listing', 'date'], update_fields=fields, batch_size=500,
+    )
+
+
+def refresh_stays(stays):
+    """Rebuild the booking columns of the days covered by ``stays``.
+
+    ``stays`` are (listing_id, check_in, check_out) tuples, typically a
+    booking's stay before and after a change. Costs one read and one write
+    however many stays are passed.
+    """
+    ranges = {}
+    for listing_id, check_in, check_out in stays:
+        start, end = ranges.get(listing_id, (check_in, check_out))
+        ranges[listing_id] = (min(start, check_in), max(end, check_out))
+    if not ranges:
+        return
+    overlapping = Q()
+    for listing_id, (start, end) in ranges.items():
+        overlapping |= Q(listing_id=listing_id, check_in_date__lt=end, check_out_date__gt=start)
+    days = booking_days(Booking.objects.filter(overlapping).values_list(*BOOKING_COLUMNS))
+    rows = []
+    for listing_id, (start, end) in ranges.items():
+        for offset in range((end - start).days):
+            day = start + timedelta(days=offset)
+            # Days the stays no longer cover are written as zeros
+            values = days.get((listing_id, day), {'nights_booked': 0, 'revenue': 0, 'cancellations': 0})
+            rows.append(day_row(listing_id, day, **values))
+    upsert(rows, BOOKING_FIELDS)
+
+
+def refresh_review_days(keys):
+    """Rebuild the review columns of (listing_id, day) ``keys``"""
+    keys = set(keys)
+    if not keys:
+        return
+    written = Q()
+    for listing_id, day in keys:
+        written |= Q(listing_id=listing_id, created_at__gte=day_start(day), created_at__lt=day_start(day + timedelta(days=1)))
+    days = review_days(Review.objects.filter(written).values_list(*REVIEW_COLUMNS))
+    upsert([
+        day_row(listing_id, day, **days.get((listing_id, day), {'review_count': 0, 'rating_sum': 0}))
+        for listing_id, day in keys
+    ], REVIEW_FIELDS)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def backfill(listing_ids):
+    """Replace every rollup row of ``listing_ids``; returns the rows written"""
+    listing_ids = list(listing_ids)
+    bookings = booking_days(
+        Booking.objects.filter(listing_id__in=listing_ids).order_by().values_list(*BOOKING_COLUMNS).iterator()
+    )
+    reviews = review_days(
+        Review.objects.filter(listing_id__in=listing_ids).order_by().values_list(*REVIEW_COLUMNS).iterator()
+    )
+    empty = dict.fromkeys(BOOKING_FIELDS + REVIEW_FIELDS, 0)
+    rows = []
+    for listing_id, day in bookings.keys() | reviews.keys():
+        values = {**empty, **bookings.get((listing_id, day), {}), **reviews.get((listing_id, day), {})}
+        rows.append((listing_id, day, day.replace(day=1), *(values[field] for field in BOOKING_FIELDS + REVIEW_FIELDS)))
+    columns = ('listing_id', 'date', 'month', *BOOKING_FIELDS, *REVIEW_FIELDS)
+    with transaction.atomic():
+        ListingDailyStats.objects.filter(listing_id__in=listing_ids).delete()
+        # Raw inserts: building a model instance per day dominated the backfill
+        insert_rows(ListingDailyStats, columns, prepare_rows(ListingDailyStats, columns, rows))
+    return len(rows)
+
+
+def month_starts(start, end):
+    """First day of every month overlapping [start, end)"""
+    month = start.replace(day=1)
+    while month < end:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def month_window(month, start, end):
+    """Label and number of days of ``month`` inside [start, end)"""
+    days_in_month = calendar.monthrange(month.year, month.month)[1]
+    first = max(month, start)
+    last = min(month + timedelta(days=days_in_month), end)
+    return month.strftime('%Y-%m'), (last - first).days
+
+
+def month_summary(label, days, sums, listings=1):
+    """Occupancy, revenue, ADR and rating from one month's rollup sums"""
+    nights = days * listings
+    nights_booked = sums.get('nights_booked') or 0
+    revenue = Decimal(sums.get('revenue') or 0).quantize(CENT, ROUND_HALF_UP)
+    review_count = sums.get('review_count') or 0
+    return {
+        'month': label,
+        'nights': nights,
+        'nights_booked': nights_booked,
+        'occupancy_rate': round(nights_booked / nights, 4) if nights else 0,
+        'revenue': revenue,
+        # Average daily rate: revenue per night actually sold
+        'adr': (revenue / nights_booked).quantize(CENT, ROUND_HALF_UP) if nights_booked else None,
+        'cancellations': sums.get('cancellations') or 0,
+        'review_count': review_count,
+        'rating_average': round(sums['rating_sum'] / review_count, 2) if review_count else None,
+    }
+
+
+def host_report(listings, start, end):
+    """Monthly stats over [start, end) for each of ``listings`` and in total.
+
+    ``listings`` is a sequence of (id, title). One aggregate query over the
+    rollups answers the whole report.
+    """
+    listing_ids = [listing_id for listing_id, _ in listings]
+    fields = BOOKING_FIELDS + REVIEW_FIELDS
+    sums = {
+        (row['listing_id'], row['month']): row
+        for row in ListingDailyStats.objects
+        .filter(listing_id__in=listing_ids, month__gte=start.replace(day=1), month__lt=end)
+        .filter(date__gte=start, date__lt=end)
+        .order_by()
+        .values('listing_id', 'month')
+        .annotate(**{field: Sum(field) for field in fields})
+    }
+    months = [(month, *month_window(month, start, end)) for month in month_starts(start, end)]
+    totals = {month: dict.fromkeys(fields, 0) for month, _, _ in months}
+    report = {'start': start, 'end': end, 'listings': [], 'totals': []}
+    for listing_id, title in listings:
+        rows = []
+        for month, label, days in months:
+            row = sums.get((listing_id, month), {})
+            for field in fields:
+                totals[month][field] += row.get(field) or 0
+            rows.append(month_summary(label, days, row))
+        report['listings'].append({'listing': listing_id, 'title': title, 'months': rows})
+    report['totals'] = [
+        month_summary(label, days, totals[month], listings=len(listings)) for month, label, days in months
+    ]
+    return report
+
+
+def default_window(today=None):
+    """The current month and the eleven before it"""
+    today = today or timezone.localdate()
+    end = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    start = end
+    for _ in range(12):
+        start = (start - timedelta(days=1)).replace(day=1)
+    return start, end
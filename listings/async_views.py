@@ -0,0 +1,110 @@
+"""
+Async search and availability endpoints for ASGI deployments.
+
+These views use Django's async ORM (``aget``, ``aexists``, ``async for``)
+and run independent lookups together with ``asyncio.gather``: availability
+and the geo radius first, then the listing rows and their price quotes.
+Under ASGI a request waiting on the database does not hold a worker thread.
+Under WSGI they still work; Django runs them in an event loop per request.
+
+Note that Django runs each ORM call in a thread of its own executor, one
+call at a time per request, so gathered queries overlap their waiting
+rather than executing in parallel inside the database.
+
+Responses have the same shape as the DRF endpoints, rendered with
+``FastJSONRenderer``.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+
+from alx_travel_app.instrumentation import timed
+
+from .availability import ais_available
+from .fastpath import compile_plan
+from .geo import awithin_radius
+from .models import Listing
+from .pricing import aquote_many
+from .renderers import FastJSONRenderer
+from .search import available_listings
+from .serializers import ListingSummarySerializer, NearbyAvailabilitySerializer, StayDatesSerializer
+
+
+def render(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def summary_rows(listing_ids):
+    """{listing id: summary dict} built from values() rows"""
+    plan = compile_plan(ListingSummarySerializer())
+    rows = [row async for row in plan.values(Listing.objects.filter(pk__in=listing_ids))]
+    related = await sync_to_async(plan.fetch_related)(rows)
+    with timed('serialize'):
+        return {row['id']: plan.build(row, related) for row in rows}
+
+
+async def search(request):
+    """Listings free for ?check_in=&check_out=, optionally near ?lat=&lng=&radius_km=
+
+    Also takes ?city=, ?guests= and ?limit= (default 100, at most 500).
+    Results are cheapest first; each carries a ``quote``, and a
+    ``distance_km`` when searching by location.
+    """
+    params = NearbyAvailabilitySerializer(data=request.GET)
+    if not params.is_valid():
+        return JsonResponse(params.errors, status=400)
+    data = params.validated_data
+    check_in, check_out = data['check_in'], data['check_out']
+
+    async def free_ids():
+        queryset = available_listings(check_in, check_out, city=data.get('city'), guests=data.get('guests'))
+        if data.get('lat') is None:
+            # Nothing to intersect with, so the database can stop at the limit
+            queryset = queryset[:data['limit']]
+        return [pk async for pk in queryset.values_list('pk', flat=True)]
+
+    async def distances():
+        if data.get('lat') is None:
+            return None
+        queryset = Listing.objects.filter(is_active=True)
+        return dict(await awithin_radius(queryset, data['lat'], data['lng'], data['radius_km']))
+
+    listing_ids, nearby = await asyncio.gather(free_ids(), distances())
+    if nearby is not None:
+        listing_ids = [pk for pk in listing_ids if pk in nearby]
+    listing_ids = listing_ids[:data['limit']]
+
+    rows, quotes = await asyncio.gather(
+        summary_rows(listing_ids), aquote_many(listing_ids, check_in, check_out)
+    )
+    results = []
+    for pk in listing_ids:
+        row = rows[pk]
+        row['quote'] = quotes[pk].as_dict()
+        if nearby is not None:
+            row['distance_km'] = round(nearby[pk], 3)
+        results.append(row)
+    return render(results)
+
+
+async def availability(request, pk):
+    """Whether listing ``pk`` is free for ?check_in=&check_out=, with its quote"""
+    params = StayDatesSerializer(data=request.GET)
+    if not params.is_valid():
+        return JsonResponse(params.errors, status=400)
+    check_in, check_out = params.validated_data['check_in'], params.validated_data['check_out']
+
+    listing = Listing.objects.filter(is_active=True).only('pk', 'title').aget(pk=pk)
+    try:
+        listing, available, quotes = await asyncio.gather(
+            listing, ais_available(pk, check_in, check_out), aquote_many([pk], check_in, check_out)
+        )
+    except Listing.DoesNotExist:
+        return JsonResponse({'detail': 'No Listing matches the given query.'}, status=404)
+    return render({
+        'listing': listing.pk,
+        'title': listing.title,
+        'available': available,
+        'quote': quotes[pk].as_dict(),
+    })
@@ -0,0 +1,127 @@
+"""
+Night-level availability for listings.
+
+Every active booking owns one BookedNight row per night it occupies, and a
+unique (listing, night) index backs the table. "Is listing X free for
+[check_in, check_out)" is therefore a single range probe on that index, and
+the constraint makes double-booking impossible even when the application-level
+check races.
+"""
+import time
+
+from django.db import IntegrityError, OperationalError, connections, router, transaction
+from django.db.models import F
+
+from .models import Listing, BookedNight
+
+
+# How long to keep retrying when SQLite reports the database as locked by
+# another writer, and the pause between attempts
+LOCK_WAIT_SECONDS = 5.0
+LOCK_RETRY_DELAY = 0.01
+
+
+class NightsUnavailable(Exception):
+    """Raised when some of the requested nights are already booked"""
+
+
+def held_nights(listing, check_in, check_out, exclude_booking=None):
+    """Booked nights of ``listing`` in [check_in, check_out)"""
+    nights = BookedNight.objects.filter(
+        listing=listing, night__gte=check_in, night__lt=check_out
+    )
+    if exclude_booking is not None:
+        nights = nights.exclude(booking=exclude_booking)
+    return nights
+
+
+def is_available(listing, check_in, check_out, exclude_booking=None):
+    """Return True if no active booking holds a night in [check_in, check_out)"""
+    return not held_nights(listing, check_in, check_out, exclude_booking).exists()
+
+
+async def ais_available(listing, check_in, check_out, exclude_booking=None):
+    """``is_available`` with the async ORM"""
+    return not await held_nights(listing, check_in, check_out, exclude_booking).aexists()
+
+
+def booked_nights(listing, start, end):
+    """Return the set of booked nights for a listing in [start, end)"""
+    return set(
+        BookedNight.objects.filter(
+            listing=listing, night__gte=start, night__lt=end
+        ).values_list('night', flat=True)
+    )
+
+
+def lock_listing(listing_id, using):
+    """Serialize booking writes for one listing inside the current transaction.
+    
+    Row-locking backends take ``SELECT ... FOR UPDATE`` on the listing row.
+    SQLite has no row locks, so a no-op UPDATE is issued instead to take the
+    database write lock up front; otherwise two deferred transactions can
+    both read "available" and then collide when upgrading to writers.
+    """
+    queryset = Listing.objects.using(using).filter(pk=listing_id)
+    if connections[using].features.has_select_for_update:
+        list(queryset.select_for_update().values_list('pk', flat=True))
+    else:
+        queryset.update(is_active=F('is_active'))
+
+
+def retry_on_lock(attempt, on_retry=None):
+    """Call ``attempt()`` until it gets past SQLite write-lock contention.
+    
+    SQLite reports contention as an OperationalError; anything else, or
+    still being locked out after LOCK_WAIT_SECONDS, is a real failure.
+    ``on_retry`` undoes whatever the failed attempt left behind.
+    """
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while True:
+        try:
+            return attempt()
+        except OperationalError as exc:
+            if 'locked' not in str(exc) or time.monotonic() >= deadline:
+                raise
+            if on_retry is not None:
+                on_retry()
+            time.sleep(LOCK_RETRY_DELAY)
+
+
+def forget_insert(booking):
+    """Make a booking whose INSERT was rolled back insertable again"""
+    booking.pk = None
+    booking._state.adding = True
+    # Otherwise the next save() would think its nights are already written
+    booking.__dict__.pop('_loaded_stay', None)
+
+
+def reserve(booking):
+    """Save ``booking`` if all of its nights are free, atomically.
+    
+    The listing is locked, availability is checked, and the booking plus its
+    BookedNight rows are written in one transaction. Raises NightsUnavailable
+    if any night is taken, including when a concurrent writer wins the race
+    and the unique constraint rejects our nights.
+    """
+    using = router.db_for_write(type(booking), instance=booking)
+    # The rolled-back INSERT may have assigned a primary key
+    on_retry = (lambda: forget_insert(booking)) if booking._state.adding else None
+    return retry_on_lock(lambda: _reserve_once(booking, using), on_retry)
+
+
+def _reserve_once(booking, using):
+    try:
+        with transaction.atomic(using=using):
+            lock_listing(booking.listing_id, using)
+            if booking.holds_nights and not is_available(
+                booking.listing_id,
+                booking.check_in_date,
+                booking.check_out_date,
+                exclude_booking=booking.pk,
+            ):
+                raise NightsUnavailable()
+            booking.save(using=using)
+    except IntegrityError as exc:
+        raise NightsUnavailable() from exc
+    return booking
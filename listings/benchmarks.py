@@ -0,0 +1,108 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks never touch the configured database: they run against a
+throwaway test database created for the duration of the run.
+"""
+import math
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    """Create a migrated test database, and destroy it afterwards"""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def time_calls(func, repeat):
+    """Call ``func`` ``repeat`` times and return the latencies in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    """p50/p95/max summary of latency samples in milliseconds"""
+    return {
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'max_ms': round(max(samples), 3) if samples else 0.0,
+    }
+
+
+def measure(func, repeat=1):
+    """Query count, wall time and peak Python memory of ``func``.
+    
+    The first call runs under tracemalloc to count queries and peak memory;
+    the ``repeat`` timed calls after it run without tracing. With
+    ``repeat=0`` the traced call is also the timed one, for work that can
+    only run once.
+    """
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        # Unlike connection.queries, not cleared when a test client request starts
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            func()
+            traced_ms = (time.perf_counter() - start) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    samples = time_calls(func, repeat) if repeat else [traced_ms]
+    return {
+        'queries': len(queries),
+        'wall_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def find_regressions(results, baseline, time_tolerance=0.5, memory_tolerance=0.25, min_ms=1.0, min_kib=64):
+    """Describe each way ``results`` is worse than ``baseline``.
+    
+    Query counts are deterministic, so any increase counts. Wall time may
+    grow by ``time_tolerance`` (and always by ``min_ms``) and peak memory by
+    ``memory_tolerance`` (and ``min_kib``) before it counts.
+    """
+    problems = []
+    for name, expected in baseline['scenarios'].items():
+        actual = results['scenarios'].get(name)
+        if actual is None:
+            problems.append(f'{name}: missing from the results')
+            continue
+        if actual['queries'] > expected['queries']:
+            problems.append(f'{name}: {actual["queries"]} queries, baseline {expected["queries"]}')
+        limit = max(expected['wall_ms'] * (1 + time_tolerance), expected['wall_ms'] + min_ms)
+        if actual['wall_ms'] > limit:
+            problems.append(f'{name}: {actual["wall_ms"]}ms, baseline {expected["wall_ms"]}ms')
+        limit = max(expected['peak_kib'] * (1 + memory_tolerance), expected['peak_kib'] + min_kib)
+        if actual['peak_kib'] > limit:
+            problems.append(f'{name}: peak {actual["peak_kib"]} KiB, baseline {expected["peak_kib"]} KiB')
+    return problems
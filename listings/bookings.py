@@ -0,0 +1,240 @@
+"""
+Booking creation in one short transaction, safe for clients to retry.
+
+Everything that only reads happens before the transaction, in a single
+statement: the listing's rules, an availability probe and whether the
+``Idempotency-Key`` is already stored. The price normally comes from the
+pricing cache. The transaction then only writes the booking, its nights and
+the idempotency record, and with ``BEGIN IMMEDIATE`` on SQLite holds the
+write lock for just those inserts.
+
+The availability probe turns most requests for taken nights away without
+queueing for the write lock, but it is only advisory: the unique (listing,
+night) index on BookedNight is the real check. A concurrent booking that
+took one of the nights makes our INSERT fail and the whole transaction roll
+back, so two racing requests can never both win.
+"""
+import functools
+import hashlib
+import json
+from collections import namedtuple
+
+from django.db import IntegrityError, connections, router, transaction
+
+from alx_travel_app.routers import primary_only
+
+from .availability import NightsUnavailable, forget_insert, retry_on_lock
+from .fastpath import RowPlan
+from .models import Booking, BookedNight, IdempotencyKey, Listing
+from .pricing import quote
+from .serializers import BookingSummarySerializer
+
+# What the caller sends back: ``replayed`` is set for a stored response
+BookingResult = namedtuple('BookingResult', ['status_code', 'data', 'replayed'])
+
+UNAVAILABLE = 'The listing is already booked for some of the selected dates.'
+
+# What ``read_rules`` found out before the transaction
+Rules = namedtuple('Rules', ['is_active', 'max_guests', 'taken', 'stored'])
+
+
+class BookingInvalid(Exception):
+    """Raised when the requested stay breaks one of the listing's rules"""
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when an ``Idempotency-Key`` comes back with a different request"""
+
+
+def fingerprint(fields):
+    """SHA-256 of a request's fields in a canonical JSON form"""
+    canonical = json.dumps(fields, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def stored_response(guest, key, request_hash):
+    """The result stored under ``key`` for ``guest``, or None"""
+    stored = (
+        IdempotencyKey.objects.filter(user=guest, key=key)
+        .values_list('request_hash', 'status_code', 'response')
+        .first()
+    )
+    if stored is None:
+        return None
+    if stored[0] != request_hash:
+        raise IdempotencyKeyReused(key)
+    return BookingResult(stored[1], stored[2], True)
+
+
+def rules_sql(ops):
+    """The ``read_rules`` query, quoted for one database backend"""
+    q = ops.quote_name
+    return (
+        f'SELECT listing.{q("is_active")}, listing.{q("max_guests")}, '
+        f'EXISTS (SELECT 1 FROM {q(BookedNight._meta.db_table)} night '
+        f'WHERE night.{q("listing_id")} = listing.{q("id")} '
+        f'AND night.{q("night")} >= %s AND night.{q("night")} < %s), '
+        f'EXISTS (SELECT 1 FROM {q(IdempotencyKey._meta.db_table)} stored '
+        f'WHERE stored.{q("user_id")} = %s AND stored.{q("key")} = %s) '
+        f'FROM {q(Listing._meta.db_table)} listing WHERE listing.{q("id")} = %s'
+    )
+
+
+def read_rules(guest, listing_id, check_in, check_out, idempotency_key=None):
+    """One read for everything checked before the transaction; None for unknown listings.
+
+    Returns the listing's ``is_active`` and ``max_guests``, whether any night
+    of the stay is taken, and whether ``idempotency_key`` is already stored.
+    """
+    using = connections[router.db_for_read(Listing)]
+    with using.cursor() as cursor:
+        # Raw SQL: compiling the subqueries through the ORM took longer than
+        # the rest of the request
+        cursor.execute(rules_sql(using.ops), [
+            using.ops.adapt_datefield_value(check_in),
+            using.ops.adapt_datefield_value(check_out),
+            guest.pk,
+            idempotency_key or '',
+            listing_id,
+        ])
+        row = cursor.fetchone()
+    return None if row is None else Rules(bool(row[0]), row[1], bool(row[2]), bool(row[3]))
+
+
+def check_rules(rules, listing_id, number_of_guests):
+    """Raise BookingInvalid or NightsUnavailable for a stay ``read_rules`` turned down"""
+    if rules is None:
+        raise BookingInvalid(f'Listing {listing_id} does not exist.')
+    if number_of_guests > rules.max_guests:
+        raise BookingInvalid(
+            f'Number of guests ({number_of_guests}) exceeds maximum allowed ({rules.max_guests}).'
+        )
+    if not rules.is_active:
+        raise BookingInvalid('This listing is not available for booking.')
+    if rules.taken:
+        raise NightsUnavailable()
+
+
+@functools.cache
+def summary_plan():
+    """``BookingSummarySerializer`` compiled once for ``render``"""
+    return RowPlan(BookingSummarySerializer())
+
+
+def render(booking):
+    """The response body for a new booking, as stored for replays.
+
+    Same output as ``BookingSummarySerializer``, without building a
+    serializer per request.
+    """
+    return summary_plan().render_instance(booking)
+
+
+def conflict(booking, record, using):
+    """Why an insert of ``booking`` broke a constraint, as an exception; None if unknown"""
+    if not Listing.objects.using(using).filter(pk=booking.listing_id).exists():
+        return BookingInvalid(f'Listing {booking.listing_id} does not exist.')
+    nights = BookedNight.objects.using(using).filter(
+        listing_id=booking.listing_id,
+        night__gte=booking.check_in_date,
+        night__lt=booking.check_out_date,
+    )
+    if nights.exists():
+        return NightsUnavailable()
+    if record is not None and IdempotencyKey.objects.using(using).filter(user=record.user, key=record.key).exists():
+        return NightsUnavailable()
+    return None
+
+
+def insert(booking, record=None):
+    """Write ``booking``, its nights and optionally its idempotency record in one transaction.
+
+    ``record`` is an unsaved IdempotencyKey whose response is filled in from
+    the saved booking. Raises NightsUnavailable when any night is taken, or
+    when the key was stored concurrently; the caller sorts out which. Raises
+    BookingInvalid when the listing was deleted in the meantime; any other
+    IntegrityError propagates.
+    """
+    using = router.db_for_write(Booking, instance=booking)
+    if not booking.total_price:
+        # Priced up front, so a pricing cache miss never holds the write lock
+        try:
+            booking.total_price = quote(booking.listing_id, booking.check_in_date, booking.check_out_date).total
+        except Listing.DoesNotExist as exc:
+            raise BookingInvalid(f'Listing {booking.listing_id} does not exist.') from exc
+
+    def attempt():
+        try:
+            with transaction.atomic(using=using):
+                booking.save(using=using)
+                if record is not None:
+                    record.response = render(booking)
+                    record.save(using=using, force_insert=True)
+        except IntegrityError as exc:
+            # Only the (listing, night) and (user, key) unique constraints
+            # mean "already booked"; look at what is there now to tell
+            if (reason := conflict(booking, record, using)) is None:
+                raise
+            raise reason from exc
+        return booking
+
+    def on_retry():
+        forget_insert(booking)
+        if record is not None:
+            record.pk = None
+
+    return retry_on_lock(attempt, on_retry)
+
+
+def create_booking(guest, listing_id, check_in_date, check_out_date, number_of_guests,
+                   special_requests='', idempotency_key=None):
+    """Book a stay for ``guest``; returns a BookingResult.
+
+    With ``idempotency_key`` the 201 response is stored in the same
+    transaction as the booking, and a retry with the same key and fields gets
+    it back instead of booking twice. Failures are not stored, so a retry
+    after one runs again. Raises BookingInvalid, NightsUnavailable or
+    IdempotencyKeyReused.
+    """
+    if check_out_date <= check_in_date:
+        raise BookingInvalid('Check-out date must be after check-in date.')
+    fields = {
+        'listing': listing_id,
+        'check_in_date': check_in_date.isoformat(),
+        'check_out_date': check_out_date.isoformat(),
+        'number_of_guests': number_of_guests,
+        'special_requests': special_requests,
+    }
+    request_hash = fingerprint(fields)
+    # Replicas may lag behind a key stored moments ago, or a listing change
+    with primary_only():
+        # Reads only meet the write lock on shared-cache databases, such as
+        # the in-memory test one; WAL readers never wait
+        rules = retry_on_lock(lambda: read_rules(guest, listing_id, check_in_date, check_out_date, idempotency_key))
+        # A retry, or a key for a listing deleted since: answer as the first time
+        if idempotency_key and (rules is None or rules.stored):
+            if stored := retry_on_lock(lambda: stored_response(guest, idempotency_key, request_hash)):
+                return stored
+        check_rules(rules, listing_id, number_of_guests)
+        booking = Booking(
+            listing_id=listing_id,
+            guest=guest,
+            check_in_date=check_in_date,
+            check_out_date=check_out_date,
+            number_of_guests=number_of_guests,
+            special_requests=special_requests,
+        )
+        record = None
+        if idempotency_key:
+            record = IdempotencyKey(
+                user=guest, key=idempotency_key, request_hash=request_hash, status_code=201,
+            )
+        try:
+            insert(booking, record)
+        except NightsUnavailable:
+            # A concurrent retry with the same key may have won the race
+            if idempotency_key:
+                if stored := retry_on_lock(lambda: stored_response(guest, idempotency_key, request_hash)):
+                    return stored
+            raise
+    return BookingResult(201, record.response if record else render(booking), False)
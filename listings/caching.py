@@ -0,0 +1,169 @@
+"""Versioned response caching for the public listing endpoints.
+
+Every listing has a version stamp in the cache (``version:listing:<pk>``)
+and there is one ``version:catalog`` stamp for result sets spanning many
+listings. Signals replace the stamps whenever a listing, its reviews, its
+bookings or its price overrides change, so cached responses are never
+invalidated by key: a write moves readers on to a new key and old entries
+age out. ETags are derived from the same keys, which lets a matching
+``If-None-Match`` be answered with a 304 without touching the database.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from alx_travel_app.routers import primary_only
+
+CATALOG_VERSION_KEY = 'version:catalog'
+
+STATS_PREFIX = 'response-cache:stats:'
+OUTCOMES = ('hit', 'miss', 'not_modified')
+
+DEFAULT_TIMEOUTS = {
+    'listing_detail': 60 * 60,
+    'listing_search': 30,
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def timeout_for(name):
+    """Seconds a cached ``name`` response lives; settings override the default"""
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUTS', {}).get(name, DEFAULT_TIMEOUTS[name])
+
+
+def listing_version_key(listing_id):
+    return f'version:listing:{listing_id}'
+
+
+def new_stamp():
+    return uuid.uuid4().hex[:16]
+
+
+def current_versions(keys):
+    """Version stamps for ``keys``, creating any that are missing"""
+    cache = get_cache()
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # add() keeps a stamp another process created in the meantime
+            cache.add(key, new_stamp(), None)
+            found[key] = cache.get(key) or new_stamp()
+    return found
+
+
+async def acurrent_versions(keys):
+    """``current_versions`` with the async cache API"""
+    cache = get_cache()
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, new_stamp(), None)
+            found[key] = await cache.aget(key) or new_stamp()
+    return found
+
+
+def bump_versions(keys):
+    """Give ``keys`` new stamps, now and again on commit.
+
+    The second bump stops a reader that picked up the first stamp before
+    this transaction committed from caching pre-commit rows under it.
+    """
+    def bump():
+        get_cache().set_many({key: new_stamp() for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def bump_listing_versions(listing_ids):
+    """Give listings (and the catalog) new stamps, now and again on commit"""
+    bump_versions([listing_version_key(pk) for pk in listing_ids] + [CATALOG_VERSION_KEY])
+
+
+def params_digest(params):
+    query = '&'.join(f'{name}={params[name]}' for name in sorted(params))
+    return hashlib.sha1(query.encode()).hexdigest()
+
+
+def detail_key(listing_id, variant=None):
+    """Cache key for one listing's detail response.
+    
+    ``variant`` holds query parameters that change the response shape.
+    """
+    version_key = listing_version_key(listing_id)
+    version = current_versions([version_key])[version_key]
+    return f'response:listing-detail:{listing_id}:{version}:{params_digest(variant or {})}'
+
+
+def search_key(params):
+    """Cache key for a search result page, from its validated parameters"""
+    version = current_versions([CATALOG_VERSION_KEY])[CATALOG_VERSION_KEY]
+    return f'response:listing-search:{version}:{params_digest(params)}'
+
+
+def etag_for(key):
+    return quote_etag(hashlib.sha1(key.encode()).hexdigest()[:20])
+
+
+def record(name, outcome):
+    """Count a cache outcome for ``name`` in the shared cache"""
+    cache = get_cache()
+    key = f'{STATS_PREFIX}{name}:{outcome}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    """Hit, miss and 304 counts per cached endpoint, with the hit ratio"""
+    keys = [f'{STATS_PREFIX}{name}:{outcome}' for name in DEFAULT_TIMEOUTS for outcome in OUTCOMES]
+    counts = get_cache().get_many(keys)
+    report = {}
+    for name in DEFAULT_TIMEOUTS:
+        row = {outcome: counts.get(f'{STATS_PREFIX}{name}:{outcome}', 0) for outcome in OUTCOMES}
+        served = row['hit'] + row['not_modified']
+        total = served + row['miss']
+        row['hit_ratio'] = round(served / total, 4) if total else None
+        report[name] = row
+    return report
+
+
+def reset_stats():
+    get_cache().delete_many(
+        [f'{STATS_PREFIX}{name}:{outcome}' for name in DEFAULT_TIMEOUTS for outcome in OUTCOMES]
+    )
+
+
+def cached_response(request, name, key, build):
+    """Respond with the data ``build()`` returns, cached under ``key``.
+
+    A request whose ``If-None-Match`` matches the key's ETag gets an empty
+    304. Exceptions from ``build`` (404s, validation errors) are not cached.
+    """
+    etag = etag_for(key)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        record(name, 'not_modified')
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        record(name, 'miss')
+        # A lagging replica could otherwise store old rows under the new version
+        with primary_only():
+            data = build()
+        cache.set(key, data, timeout_for(name))
+    else:
+        record(name, 'hit')
+    return Response(data, headers={'ETag': etag})
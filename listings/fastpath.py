@@ -0,0 +1,211 @@
+"""Read-only fast path for list responses.
+
+``RowPlan`` compiles a serializer (after ``?fields=``/``?expand=`` have been
+applied) into ``values()`` lookups plus one converter per field, then builds
+plain dicts from the rows. Nested objects come from the same row through
+joins; nested lists come from one extra query per relation, like a
+prefetch. Converters reproduce what each DRF field's ``to_representation``
+returns, so rendering the result gives the same bytes as the serializer.
+
+Fields the plan cannot reproduce (method fields, ``source='*'``, dotted
+sources) raise ``Unsupported``; callers fall back to the serializer.
+"""
+import decimal
+from collections import defaultdict
+
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.settings import ISO_8601, api_settings
+
+
+class Unsupported(Exception):
+    """The serializer uses a field the fast path cannot reproduce"""
+
+
+def _nullable(convert):
+    def convert_or_none(value):
+        return None if value is None else convert(value)
+    return convert_or_none
+
+
+def decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return _nullable(field.to_representation)
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return format(value.quantize(exponent, rounding=rounding, context=context), 'f')
+    return _nullable(convert)
+
+
+def datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return _nullable(field.to_representation)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return _nullable(field.to_representation)
+
+    def convert(value):
+        if not value:
+            return None
+        if timezone.is_aware(value):
+            value = value.astimezone(field_timezone)
+        else:
+            value = field.enforce_timezone(value)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return _nullable(field.to_representation)
+    return lambda value: value.isoformat() if value else None
+
+
+def choice_converter(field):
+    mapping = field.choice_strings_to_values
+
+    def convert(value):
+        if value in ('', None):
+            return value
+        return mapping.get(str(value), value)
+    return convert
+
+
+def converter_for(field):
+    """A function turning a column value into the field's representation"""
+    if isinstance(field, serializers.DecimalField):
+        return decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return datetime_converter(field)
+    if isinstance(field, serializers.DateField):
+        return date_converter(field)
+    if isinstance(field, serializers.ChoiceField) and not isinstance(field, serializers.MultipleChoiceField):
+        return choice_converter(field)
+    if isinstance(field, serializers.BooleanField):
+        return _nullable(bool)
+    if isinstance(field, serializers.IntegerField):
+        return _nullable(int)
+    if isinstance(field, serializers.FloatField):
+        return _nullable(float)
+    if isinstance(field, serializers.CharField):
+        return _nullable(str)
+    if isinstance(field, (serializers.ReadOnlyField, serializers.JSONField)):
+        return None
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    return _nullable(field.to_representation)
+
+
+class RowPlan:
+    """Compiled ``values()`` lookups and converters for one serializer"""
+
+    def __init__(self, serializer, prefix=''):
+        self.model = serializer.Meta.model
+        self.prefix = prefix
+        self.lookups = []
+        self.steps = []
+        opts = self.model._meta
+        for name, field in serializer.fields.items():
+            source = field.source
+            if source == '*' or '.' in source or isinstance(field, serializers.SerializerMethodField):
+                raise Unsupported(name)
+            if isinstance(field, serializers.ListSerializer):
+                remote = opts.get_field(source).field.attname
+                self.steps.append((name, 'many', self.lookup('pk'), (RowPlan(field.child), remote)))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = RowPlan(field, prefix=f'{prefix}{source}__')
+                self.steps.append((name, 'nested', self.lookup(source), nested))
+                for lookup in nested.lookups:
+                    self.lookup(lookup, prefixed=True)
+            else:
+                self.steps.append((name, 'value', self.lookup(source), converter_for(field)))
+
+    def lookup(self, source, prefixed=False):
+        """Register a ``values()`` lookup and return its name"""
+        lookup = source if prefixed else f'{self.prefix}{source}'
+        if lookup not in self.lookups:
+            self.lookups.append(lookup)
+        return lookup
+
+    def values(self, queryset, *extra):
+        """``queryset`` as dict rows carrying every lookup (plus ``extra``)"""
+        lookups = self.lookups + [name for name in extra if name not in self.lookups]
+        return queryset.prefetch_related(None).values(*lookups)
+
+    def list_steps(self):
+        """Nested list steps of this plan and of the objects nested in it"""
+        for step in self.steps:
+            if step[1] == 'many':
+                yield step
+            elif step[1] == 'nested':
+                yield from step[3].list_steps()
+
+    def fetch_related(self, rows):
+        """Load nested lists for ``rows``, one query per relation.
+        
+        Returns {child plan: {parent pk: [dicts]}}.
+        """
+        related = {}
+        for name, kind, lookup, (child, remote) in self.list_steps():
+            parents = {row[lookup] for row in rows}
+            parents.discard(None)
+            child_rows = []
+            if parents:
+                queryset = child.model.objects.filter(**{f'{remote}__in': parents})
+                child_rows = list(child.values(queryset, remote))
+            child_related = child.fetch_related(child_rows)
+            grouped = defaultdict(list)
+            for child_row in child_rows:
+                grouped[child_row[remote]].append(child.build(child_row, child_related))
+            related[child] = grouped
+        return related
+
+    def build(self, row, related):
+        data = {}
+        for name, kind, lookup, payload in self.steps:
+            if kind == 'value':
+                value = row[lookup]
+                data[name] = value if payload is None else payload(value)
+            elif kind == 'nested':
+                data[name] = None if row[lookup] is None else payload.build(row, related)
+            else:
+                data[name] = related[payload[0]].get(row[lookup], [])
+        return data
+
+    def render(self, rows):
+        """Dicts for ``rows`` (as returned by ``values()``), in order"""
+        rows = list(rows)
+        related = self.fetch_related(rows)
+        return [self.build(row, related) for row in rows]
+
+    def render_instance(self, instance):
+        """The dict for one model instance, from the field values it already holds"""
+        if any(kind != 'value' for _, kind, _, _ in self.steps):
+            # Nested objects would need queries
+            raise Unsupported(self.model.__name__)
+        opts = self.model._meta
+        return self.build({lookup: getattr(instance, opts.get_field(lookup).attname) for lookup in self.lookups}, {})
+
+
+def compile_plan(serializer):
+    """RowPlan for ``serializer``, or None if it needs the DRF path"""
+    if getattr(serializer, 'instance', None) is not None or getattr(serializer, 'initial_data', empty) is not empty:
+        return None
+    try:
+        return RowPlan(serializer)
+    except Unsupported:
+        return None
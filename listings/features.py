@@ -0,0 +1,131 @@
+"""Indexed amenity and house-rule lookups.
+
+``Listing.amenities`` and ``Listing.house_rules`` stay the JSON lists the API
+reads and writes. Each distinct name is also stored once as a ``Feature``
+row, and ``ListingFeature`` links listings to their features. Filters then
+become index lookups on ``(feature, listing)`` instead of a JSON scan of
+every listing.
+
+``Listing.save()`` keeps the links current. Bulk writes that skip ``save()``
+(imports, bulk seeding) call ``sync_listing_features()`` themselves.
+"""
+from django.db.models import Q
+
+from .models import Feature, Listing, ListingFeature
+
+# Listing JSON field for each feature kind
+KIND_FIELDS = {'amenity': 'amenities', 'house_rule': 'house_rules'}
+
+
+def feature_key(name):
+    """Case- and whitespace-insensitive form of a feature name"""
+    return ' '.join(str(name).split()).casefold()
+
+
+def feature_names(value):
+    """{key: name} for the string items of a JSON list; anything else has no features"""
+    if not isinstance(value, (list, tuple)):
+        return {}
+    names = {}
+    for item in value:
+        if isinstance(item, str) and item.strip():
+            names.setdefault(feature_key(item), ' '.join(item.split()))
+    return names
+
+
+def resolve_features(wanted):
+    """Map (kind, key) -> feature id, creating the features that do not exist yet"""
+    if not wanted:
+        return {}
+    lookup = Q()
+    for kind in {kind for kind, key in wanted}:
+        lookup |= Q(kind=kind, key__in=[key for wanted_kind, key in wanted if wanted_kind == kind])
+    ids = {
+        (kind, key): pk
+        for pk, kind, key in Feature.objects.filter(lookup).values_list('pk', 'kind', 'key')
+    }
+    missing = [
+        Feature(kind=kind, key=key, name=name)
+        for (kind, key), name in wanted.items() if (kind, key) not in ids
+    ]
+    if missing:
+        # A concurrent writer may create the same features; keep theirs
+        Feature.objects.bulk_create(missing, ignore_conflicts=True)
+        ids.update(
+            ((kind, key), pk)
+            for pk, kind, key in Feature.objects.filter(lookup).values_list('pk', 'kind', 'key')
+        )
+    return ids
+
+
+def sync_features(rows):
+    """Make the links of each ``(listing id, amenities, house_rules)`` row match its lists.
+    
+    Runs a fixed number of queries however many rows are passed.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    wanted_names = {}
+    wanted_links = {}
+    for pk, *values in rows:
+        links = wanted_links.setdefault(pk, set())
+        for kind, value in zip(KIND_FIELDS, values):
+            for key, name in feature_names(value).items():
+                wanted_names.setdefault((kind, key), name)
+                links.add((kind, key))
+    ids = resolve_features(wanted_names)
+    wanted = {(pk, ids[feature]) for pk, links in wanted_links.items() for feature in links}
+    
+    existing = {
+        (listing_id, feature_id): pk
+        for pk, listing_id, feature_id in ListingFeature.objects.filter(
+            listing_id__in=list(wanted_links)
+        ).values_list('pk', 'listing_id', 'feature_id')
+    }
+    stale = [pk for link, pk in existing.items() if link not in wanted]
+    if stale:
+        ListingFeature.objects.filter(pk__in=stale).delete()
+    ListingFeature.objects.bulk_create(
+        [
+            ListingFeature(listing_id=listing_id, feature_id=feature_id)
+            for listing_id, feature_id in wanted if (listing_id, feature_id) not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def sync_listing_features(listing_ids, batch_size=1000):
+    """Re-derive feature links for the given listings from their stored JSON"""
+    listing_ids = list(listing_ids)
+    for start in range(0, len(listing_ids), batch_size):
+        sync_features(
+            Listing.objects.filter(pk__in=listing_ids[start:start + batch_size])
+            .values_list('pk', *KIND_FIELDS.values())
+        )
+
+
+def filter_features(queryset, kind, names, match='all'):
+    """Listings in ``queryset`` with all (or any) of the named features.
+    
+    Every name is one semi-join on the ``(feature, listing)`` index, so
+    ``match='all'`` narrows by each feature in turn.
+    """
+    keys = {feature_key(name) for name in names if str(name).strip()}
+    if not keys:
+        return queryset
+    if match == 'any':
+        links = ListingFeature.objects.filter(feature__kind=kind, feature__key__in=keys)
+        return queryset.filter(pk__in=links.values('listing_id'))
+    for key in sorted(keys):
+        links = ListingFeature.objects.filter(feature__kind=kind, feature__key=key)
+        queryset = queryset.filter(pk__in=links.values('listing_id'))
+    return queryset
+
+
+def with_amenities(queryset, names, match='all'):
+    return filter_features(queryset, 'amenity', names, match)
+
+
+def with_house_rules(queryset, names, match='all'):
+    return filter_features(queryset, 'house_rule', names, match)
@@ -0,0 +1,347 @@
+"""Full-text search over listing title, description, amenities and address.
+
+Two interchangeable backends implement the same small interface:
+
+- ``SQLiteFTSBackend`` keeps a contentless FTS5 table next to
+  ``listings_listing``. Triggers on the listing table keep it in sync, so
+  bulk inserts and raw SQL are indexed as well as ``save()``. The triggers
+  are checked after every ``migrate`` and recreated (with a full reindex)
+  when missing, because SQLite drops them whenever Django rebuilds the
+  table.
+- ``InMemoryBackend`` is an inverted index held in the process, for other
+  databases. It loads lazily from the database and is updated by the
+  Listing signals. Each process keeps its own copy.
+
+Queries are split into words and every word is matched as a prefix, so
+"sea vie" finds "Seaside view". All words must match. Results are ranked
+with BM25, weighting title above amenities, location and description.
+"""
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Listing
+
+FTS_TABLE = 'listings_listing_fts'
+INDEXED_FIELDS = ['title', 'description', 'amenities', 'address', 'city', 'country']
+FIELD_WEIGHTS = {
+    'title': 10.0, 'description': 1.0, 'amenities': 4.0, 'address': 1.0, 'city': 2.0, 'country': 1.0,
+}
+
+WORD_RE = re.compile(r'\w+')
+
+# Rows read per round trip while checking amenity matches exactly
+FETCH_SIZE = 100
+
+
+def normalize(text):
+    """Lower-case ``text`` and strip accents, like unicode61 remove_diacritics"""
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def words(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def amenity_text(amenities):
+    """Amenities as indexable text; tolerate non-list JSON"""
+    if isinstance(amenities, (list, tuple)):
+        return ' '.join(str(item) for item in amenities)
+    return str(amenities or '')
+
+
+def has_amenities(listing_amenities, required):
+    """Case-insensitive check that ``listing_amenities`` includes all of ``required``"""
+    if not isinstance(listing_amenities, (list, tuple)):
+        return not required
+    present = {normalize(item).strip() for item in listing_amenities}
+    return all(normalize(item).strip() in present for item in required)
+
+
+class SQLiteFTSBackend:
+    """Contentless FTS5 table kept in sync by triggers on ``listings_listing``"""
+
+    # Amenities are stored as JSON; index the decoded values, not the JSON text
+    # (which escapes accents and would otherwise index "u00e9").
+    expressions = {
+        'amenities': "(SELECT group_concat(value, ' ') FROM json_each({row}.amenities))",
+    }
+    columns = ', '.join(INDEXED_FIELDS)
+
+    @classmethod
+    def values(cls, row):
+        return ', '.join(cls.expressions.get(name, '{row}.' + name).format(row=row) for name in INDEXED_FIELDS)
+
+    def triggers(self):
+        insert = f'INSERT INTO {FTS_TABLE}(rowid, {self.columns}) VALUES (new.id, {self.values("new")});'
+        delete = (
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {self.columns}) "
+            f"VALUES ('delete', old.id, {self.values('old')});"
+        )
+        return {
+            f'{FTS_TABLE}_ai': f'AFTER INSERT ON listings_listing BEGIN {insert} END',
+            f'{FTS_TABLE}_ad': f'AFTER DELETE ON listings_listing BEGIN {delete} END',
+            f'{FTS_TABLE}_au': f'AFTER UPDATE OF {self.columns} ON listings_listing BEGIN {delete} {insert} END',
+        }
+
+    def ensure_schema(self, using=connection):
+        """Create the FTS table and triggers if any are missing, then reindex"""
+        triggers = self.triggers()
+        with using.cursor() as cursor:
+            cursor.execute(
+                'SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)', [FTS_TABLE, *triggers]
+            )
+            if len(cursor.fetchall()) == len(triggers) + 1:
+                return False
+            for name, body in triggers.items():
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(f'CREATE TRIGGER {name} {body}')
+        self.rebuild(using)
+        return True
+
+    def rebuild(self, using=connection):
+        """Drop and refill the FTS table from ``listings_listing``"""
+        with using.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({self.columns}, content='', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, {self.columns}) '
+                f'SELECT id, {self.values("listings_listing")} FROM listings_listing'
+            )
+
+    def index(self, listing_ids):
+        """Triggers already indexed the rows"""
+
+    def remove(self, listing_ids):
+        """Triggers already removed the rows"""
+
+    def match_expression(self, query, amenities):
+        terms = [f'"{word}"*' for word in words(query)]
+        for amenity in amenities:
+            phrase = ' '.join(words(amenity))
+            if phrase:
+                terms.append(f'amenities : "{phrase}"')
+        return ' '.join(terms)
+
+    def search(self, query, amenities=(), limit=None, active_only=True):
+        expression = self.match_expression(query, amenities)
+        if not expression:
+            return []
+        weights = ', '.join(str(FIELD_WEIGHTS[name]) for name in INDEXED_FIELDS)
+        sql = (
+            f'SELECT l.id, -bm25({FTS_TABLE}, {weights}){", l.amenities" if amenities else ""} '
+            f'FROM {FTS_TABLE} JOIN listings_listing l ON l.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        if active_only:
+            sql += ' AND l.is_active'
+        sql += ' ORDER BY 2 DESC, l.id'
+        params = [expression]
+        if not amenities:
+            if limit is not None:
+                sql += ' LIMIT %s'
+                params.append(limit)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return [(pk, score) for pk, score in cursor.fetchall()]
+
+        # Amenity phrases can match a longer amenity, so rows are checked
+        # exactly here; read them a chunk at a time until the limit is met
+        amenity_field = Listing._meta.get_field('amenities')
+        results = []
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            while rows := cursor.fetchmany(FETCH_SIZE):
+                for pk, score, raw in rows:
+                    value = amenity_field.from_db_value(raw, None, connection)
+                    if has_amenities(value, amenities):
+                        results.append((pk, score))
+                        if limit is not None and len(results) >= limit:
+                            return results
+        return results
+
+    def filter(self, queryset, query):
+        """Restrict ``queryset`` to listings matching ``query``, in one query"""
+        expression = self.match_expression(query, ())
+        if not expression:
+            return queryset
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]
+        ))
+
+
+class InMemoryBackend:
+    """Process-local inverted index with BM25 ranking and prefix lookups"""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.reset()
+
+    def reset(self):
+        self.postings = defaultdict(dict)     # word -> {pk: weighted term frequency}
+        self.documents = {}                   # pk -> (words, length, amenities, is_active)
+        self.vocabulary = []
+        self.vocabulary_dirty = False
+        self.total_length = 0.0
+
+    def ensure_schema(self, using=connection):
+        return False
+
+    def load(self):
+        with self.lock:
+            if not self.loaded:
+                self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            self.reset()
+            queryset = Listing.objects.values_list('pk', 'is_active', *INDEXED_FIELDS)
+            for row in queryset.iterator(chunk_size=2000):
+                self.add(*row)
+            self.loaded = True
+
+    def add(self, pk, is_active, *values):
+        weighted = defaultdict(float)
+        length = 0.0
+        for name, value in zip(INDEXED_FIELDS, values):
+            text = amenity_text(value) if name == 'amenities' else value
+            for word in words(text or ''):
+                weighted[word] += FIELD_WEIGHTS[name]
+                length += FIELD_WEIGHTS[name]
+        amenities = values[INDEXED_FIELDS.index('amenities')]
+        for word, frequency in weighted.items():
+            if word not in self.postings:
+                self.vocabulary_dirty = True
+            self.postings[word][pk] = frequency
+        self.documents[pk] = (tuple(weighted), length, amenities, is_active)
+        self.total_length += length
+
+    def discard(self, pk):
+        document = self.documents.pop(pk, None)
+        if document is None:
+            return
+        for word in document[0]:
+            postings = self.postings.get(word)
+            if postings is not None:
+                postings.pop(pk, None)
+                if not postings:
+                    del self.postings[word]
+                    self.vocabulary_dirty = True
+        self.total_length -= document[1]
+
+    def index(self, listing_ids):
+        """Re-read and index the given listings"""
+        with self.lock:
+            if not self.loaded:
+                return
+            rows = Listing.objects.filter(pk__in=list(listing_ids)).values_list(
+                'pk', 'is_active', *INDEXED_FIELDS
+            )
+            for row in rows:
+                self.discard(row[0])
+                self.add(*row)
+
+    def remove(self, listing_ids):
+        with self.lock:
+            for pk in listing_ids:
+                self.discard(pk)
+
+    def expand(self, prefix):
+        """Indexed words starting with ``prefix``"""
+        if self.vocabulary_dirty:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_dirty = False
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        matches = []
+        for word in self.vocabulary[start:]:
+            if not word.startswith(prefix):
+                break
+            matches.append(word)
+        return matches
+
+    def match(self, query):
+        """{pk: score} for documents matching every word of ``query`` as a prefix"""
+        terms = words(query)
+        if not terms:
+            return None
+        count = len(self.documents) or 1
+        average = self.total_length / count or 1.0
+        scores = None
+        for term in terms:
+            term_scores = defaultdict(float)
+            for word in self.expand(term):
+                postings = self.postings[word]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for pk, frequency in postings.items():
+                    length = self.documents[pk][1]
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / average)
+                    term_scores[pk] += idf * frequency * (self.k1 + 1) / norm
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+            if not scores:
+                break
+        return scores
+
+    def search(self, query, amenities=(), limit=None, active_only=True):
+        self.load()
+        with self.lock:
+            scores = self.match(query)
+            if scores is None:
+                if not amenities:
+                    return []
+                scores = dict.fromkeys(self.documents, 0.0)
+            results = [
+                (pk, score) for pk, score in scores.items()
+                if (not active_only or self.documents[pk][3])
+                and (not amenities or has_amenities(self.documents[pk][2], amenities))
+            ]
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results if limit is None else results[:limit]
+
+    def filter(self, queryset, query):
+        self.load()
+        with self.lock:
+            scores = self.match(query)
+        if scores is None:
+            return queryset
+        return queryset.filter(pk__in=list(scores))
+
+
+_backend = None
+
+
+def get_backend():
+    """The configured backend: ``LISTING_SEARCH_BACKEND`` or one suited to the database"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'LISTING_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = InMemoryBackend()
+    return _backend
+
+
+def search(query, amenities=(), limit=None, active_only=True):
+    """Ranked [(listing id, score)] for ``query`` and required ``amenities``"""
+    return get_backend().search(query, amenities=amenities, limit=limit, active_only=active_only)
@@ -0,0 +1,135 @@
+"""
+Grid-cell geo index for listing coordinates, no PostGIS required.
+
+The globe is cut into CELL_DEGREES x CELL_DEGREES cells numbered row-major
+from (-90, -180), and every listing stores its cell number in the indexed
+``geo_cell`` column. Cells in the same latitude row are consecutive integers,
+so any bounding box becomes one ``BETWEEN`` range per row. Radius and
+bounding-box searches prune candidates with those ranges and only then apply
+exact coordinate checks and haversine ranking.
+"""
+import math
+
+from django.db.models import Q
+
+CELL_DEGREES = 0.1
+LAT_CELLS = round(180 / CELL_DEGREES)
+LON_CELLS = round(360 / CELL_DEGREES)
+
+# Boxes spanning more latitude rows than this skip the cell index and use a
+# plain coordinate range instead; the OR of ranges stops paying off.
+MAX_CELL_ROWS = 200
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def cell_for(latitude, longitude):
+    """Return the grid cell number for a coordinate, or None if unset"""
+    if latitude is None or longitude is None:
+        return None
+    # Clamped like bounding-box columns, so 180 stays in the last column
+    # rather than wrapping to -180's
+    return _row(float(latitude)) * LON_CELLS + _col(float(longitude))
+
+
+def _row(latitude):
+    return min(LAT_CELLS - 1, max(0, math.floor((latitude + 90) / CELL_DEGREES)))
+
+
+def _col(longitude):
+    return min(LON_CELLS - 1, max(0, math.floor((longitude + 180) / CELL_DEGREES)))
+
+
+def cell_ranges(min_lat, min_lon, max_lat, max_lon):
+    """Inclusive (first, last) cell ranges covering a bounding box.
+    
+    A box with ``min_lon > max_lon`` crosses the antimeridian and is split
+    in two. Returns None when the box spans too many rows to be worth it.
+    """
+    first_row, last_row = _row(min_lat), _row(max_lat)
+    if last_row - first_row + 1 > MAX_CELL_ROWS:
+        return None
+    if min_lon <= max_lon:
+        spans = [(_col(min_lon), _col(max_lon))]
+    else:
+        spans = [(_col(min_lon), LON_CELLS - 1), (0, _col(max_lon))]
+    return [
+        (row * LON_CELLS + first_col, row * LON_CELLS + last_col)
+        for row in range(first_row, last_row + 1)
+        for first_col, last_col in spans
+    ]
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Smallest (min_lat, min_lon, max_lat, max_lon) box around a circle"""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle covers a pole, so it spans every longitude
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    lon_delta = math.degrees(
+        math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))))
+    )
+    if lon_delta >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    min_lon = (longitude - lon_delta + 180) % 360 - 180
+    max_lon = (longitude + lon_delta + 180) % 360 - 180
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two coordinates in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def within_bbox(queryset, min_lat, min_lon, max_lat, max_lon):
+    """Filter a Listing queryset to coordinates inside a bounding box"""
+    ranges = cell_ranges(min_lat, min_lon, max_lat, max_lon)
+    if ranges is not None:
+        pruned = Q()
+        for first, last in ranges:
+            pruned |= Q(geo_cell__range=(first, last))
+        queryset = queryset.filter(pruned)
+
+    queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon <= max_lon:
+        return queryset.filter(longitude__gte=min_lon, longitude__lte=max_lon)
+    return queryset.filter(Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+
+def radius_candidates(queryset, latitude, longitude, radius_km):
+    """Coordinates of the listings in the radius's bounding box"""
+    candidates = within_bbox(queryset, *bounding_box(latitude, longitude, radius_km))
+    return candidates.values_list('pk', 'latitude', 'longitude')
+
+
+def nearest(rows, latitude, longitude, radius_km, limit=None):
+    """``[(pk, distance_km), ...]`` for the ``(pk, lat, lon)`` rows inside the radius"""
+    matches = []
+    for pk, lat, lon in rows:
+        distance = haversine_km(latitude, longitude, float(lat), float(lon))
+        if distance <= radius_km:
+            matches.append((pk, distance))
+    matches.sort(key=lambda match: (match[1], match[0]))
+    return matches[:limit] if limit is not None else matches
+
+
+def within_radius(queryset, latitude, longitude, radius_km, limit=None):
+    """Return ``[(pk, distance_km), ...]`` within a radius, nearest first.
+    
+    Only the pruned candidates' coordinates are loaded; exact distances are
+    computed in Python so this works on any database backend.
+    """
+    rows = radius_candidates(queryset, latitude, longitude, radius_km)
+    return nearest(rows, latitude, longitude, radius_km, limit)
+
+
+async def awithin_radius(queryset, latitude, longitude, radius_km, limit=None):
+    """``within_radius`` with the async ORM"""
+    rows = [row async for row in radius_candidates(queryset, latitude, longitude, radius_km)]
+    return nearest(rows, latitude, longitude, radius_km, limit)
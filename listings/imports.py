@@ -0,0 +1,331 @@
+"""
+Bulk import of partner listing feeds.
+
+Feeds are streamed record by record from CSV or JSONL and processed in
+batches. Each batch is validated column by column with parsers derived from
+the Listing model fields (not one DRF serializer per row), then upserted on
+``external_id`` with a single ``INSERT ... ON CONFLICT DO UPDATE`` per
+transaction. Bad rows are reported with their record number and skipped
+without failing the batch, and the number of records processed is
+checkpointed after every committed batch so an interrupted import can
+resume where it stopped.
+"""
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import models, transaction
+
+from . import caching, fulltext, pricing
+from .features import sync_listing_features
+from .geo import cell_for
+from .models import Listing
+
+# Columns a feed may provide; everything else in a record is ignored
+IMPORT_FIELDS = [
+    'external_id', 'title', 'description', 'address', 'city', 'state',
+    'country', 'postal_code', 'latitude', 'longitude', 'property_type',
+    'bedrooms', 'bathrooms', 'max_guests', 'price_per_night', 'cleaning_fee',
+    'service_fee', 'amenities', 'house_rules', 'is_active', 'is_instant_bookable',
+]
+
+COORDINATE_RANGES = {'latitude': 90, 'longitude': 180}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+def parse_text(field):
+    def parse(value):
+        value = str(value).strip()
+        if field.max_length and len(value) > field.max_length:
+            raise ValueError(f'longer than {field.max_length} characters')
+        return value
+    return parse
+
+
+def parse_choice(field):
+    choices = {choice for choice, _ in field.choices}
+    
+    def parse(value):
+        value = str(value).strip().lower()
+        if value not in choices:
+            raise ValueError(f'must be one of {", ".join(sorted(choices))}')
+        return value
+    return parse
+
+
+def parse_decimal(field):
+    quantum = Decimal(1).scaleb(-field.decimal_places)
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    bound = COORDINATE_RANGES.get(field.name)
+    
+    def parse(value):
+        try:
+            number = Decimal(str(value).strip()).quantize(quantum)
+        except InvalidOperation:
+            raise ValueError('not a number')
+        if not number.is_finite() or abs(number) >= limit:
+            raise ValueError('out of range')
+        if bound is not None and abs(number) > bound:
+            raise ValueError(f'must be between -{bound} and {bound}')
+        if bound is None and number < 0:
+            raise ValueError('must not be negative')
+        return number
+    return parse
+
+
+def parse_positive_integer(field):
+    def parse(value):
+        try:
+            number = int(str(value).strip())
+        except ValueError:
+            raise ValueError('not a whole number')
+        if number < 0:
+            raise ValueError('must not be negative')
+        return number
+    return parse
+
+
+def parse_boolean(field):
+    def parse(value):
+        if isinstance(value, bool):
+            return value
+        value = str(value).strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError('not a boolean')
+    return parse
+
+
+def parse_string_list(field):
+    """JSON lists, or ``|``-separated strings as CSV feeds send them"""
+    def parse(value):
+        if isinstance(value, str):
+            value = value.strip()
+            if value.startswith('['):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    raise ValueError('not a valid JSON list')
+            else:
+                value = value.split('|')
+        if not isinstance(value, list):
+            raise ValueError('must be a list')
+        return [str(item).strip() for item in value if str(item).strip()]
+    return parse
+
+
+def field_parser(field):
+    """Column parser for a Listing model field"""
+    if field.choices:
+        return parse_choice(field)
+    if isinstance(field, models.BooleanField):
+        return parse_boolean(field)
+    if isinstance(field, models.DecimalField):
+        return parse_decimal(field)
+    if isinstance(field, models.PositiveIntegerField):
+        return parse_positive_integer(field)
+    if isinstance(field, models.JSONField):
+        return parse_string_list(field)
+    return parse_text(field)
+
+
+PARSERS = {name: field_parser(Listing._meta.get_field(name)) for name in IMPORT_FIELDS}
+
+REQUIRED_FIELDS = ['external_id'] + [
+    name for name in IMPORT_FIELDS
+    if not Listing._meta.get_field(name).has_default()
+    and not Listing._meta.get_field(name).blank
+]
+
+
+# Columns overwritten when a record matches an existing listing
+UPSERT_FIELDS = [name for name in IMPORT_FIELDS if name != 'external_id'] + ['geo_cell', 'updated_at']
+
+
+def read_records(stream, file_format):
+    """Yield ``(number, record, error)`` for each record of a CSV/JSONL stream"""
+    if file_format == 'csv':
+        for number, record in enumerate(csv.DictReader(stream), start=1):
+            yield number, record, None
+        return
+    number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None, 'not valid JSON'
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'not a JSON object'
+            continue
+        yield number, record, None
+
+
+def validate_batch(records):
+    """Parse a batch column by column.
+    
+    Returns ``(rows, errors)``: parsed dicts for the valid records and
+    ``(number, message)`` pairs for the rest.
+    """
+    parsed = [{} for _ in records]
+    problems = [[] for _ in records]
+    for name, parser in PARSERS.items():
+        for index, (number, record) in enumerate(records):
+            value = record.get(name)
+            if value is None or value == '':
+                if name in REQUIRED_FIELDS:
+                    problems[index].append(f'{name}: required')
+                continue
+            try:
+                parsed[index][name] = parser(value)
+            except ValueError as exc:
+                problems[index].append(f'{name}: {exc}')
+    
+    rows, errors = [], []
+    for (number, _), row, messages in zip(records, parsed, problems):
+        if messages:
+            errors.append((number, '; '.join(messages)))
+        else:
+            rows.append(row)
+    return rows, errors
+
+
+def upsert_listings(rows, host):
+    """Create or update listings by external_id; return (created, updated) counts.
+    
+    Each record is the full state of a listing: optional columns it omits
+    are reset to their defaults. Later rows win when a batch repeats an
+    external_id. The write is one ``INSERT ... ON CONFLICT DO UPDATE``;
+    ``host`` only applies to newly created listings. The bulk write skips
+    ``Listing.save()`` and model signals, so cached pricing and responses are
+    invalidated and the feature links and search index refreshed here.
+    """
+    by_key = {row['external_id']: row for row in rows}
+    existing = dict(
+        Listing.objects.filter(external_id__in=list(by_key))
+        .values_list('external_id', 'pk')
+    )
+    listings = []
+    for row in by_key.values():
+        listing = Listing(host=host, **row)
+        listing.geo_cell = cell_for(listing.latitude, listing.longitude)
+        listings.append(listing)
+    
+    Listing.objects.bulk_create(
+        listings,
+        update_conflicts=True,
+        unique_fields=['external_id'],
+        update_fields=UPSERT_FIELDS,
+    )
+    pricing.invalidate(existing.values())
+    caching.bump_listing_versions(existing.values())
+    listing_ids = list(
+        Listing.objects.filter(external_id__in=list(by_key)).values_list('pk', flat=True)
+    )
+    sync_listing_features(listing_ids)
+    fulltext.get_backend().index(listing_ids)
+    return len(by_key) - len(existing), len(existing)
+
+
+class ImportReport:
+    """Running totals for an import"""
+    
+    def __init__(self, skipped=0):
+        self.skipped = skipped
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.started = time.perf_counter()
+    
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+    
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+    
+    def as_dict(self, max_errors=None):
+        errors = self.errors if max_errors is None else self.errors[:max_errors]
+        return {
+            'processed': self.processed,
+            'skipped': self.skipped,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': len(self.errors),
+            'errors': [{'record': number, 'error': message} for number, message in errors],
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def read_checkpoint(path):
+    """Number of records already committed according to a checkpoint file"""
+    try:
+        with open(path) as checkpoint:
+            return json.load(checkpoint)['records']
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, records):
+    """Atomically record how many records have been committed"""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as checkpoint:
+        json.dump({'records': records}, checkpoint)
+    os.replace(temporary, path)
+
+
+def import_listings(stream, file_format, host, batch_size=1000, checkpoint=None,
+                    resume=False, on_batch=None):
+    """Import a listing feed; return an ImportReport.
+    
+    With ``checkpoint`` set, progress is saved there after every batch and,
+    if ``resume`` is true, records up to the saved position are skipped.
+    ``on_batch`` is called with the report after each batch.
+    """
+    skip = read_checkpoint(checkpoint) if checkpoint and resume else 0
+    report = ImportReport(skipped=skip)
+    batch, last_number = [], skip
+    
+    def flush():
+        rows, errors = validate_batch(batch)
+        if rows:
+            with transaction.atomic():
+                created, updated = upsert_listings(rows, host)
+            report.created += created
+            report.updated += updated
+        report.errors.extend(errors)
+        report.processed += len(batch)
+        batch.clear()
+        if checkpoint:
+            write_checkpoint(checkpoint, last_number)
+        if on_batch:
+            on_batch(report)
+    
+    for number, record, error in read_records(stream, file_format):
+        if number <= skip:
+            continue
+        last_number = number
+        if error:
+            report.errors.append((number, error))
+            report.processed += 1
+            continue
+        batch.append((number, record))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    elif checkpoint:
+        write_checkpoint(checkpoint, last_number)
+    return report
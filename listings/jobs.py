@@ -0,0 +1,368 @@
+"""
+Booking lifecycle jobs and the database-backed worker that runs them.
+
+Jobs are rows in the Job table, so any number of ``run_worker`` processes
+can share them without a broker. A worker claims a due job with a
+conditional UPDATE that only one process can win and holds it under a lease
+that it renews after every batch. Each batch is one short transaction that
+also saves the job's cursor, so a crash loses at most the batch in flight,
+and whichever worker claims the expired lease resumes from the cursor.
+
+Every step is idempotent. The booking transitions select rows by the state
+they are leaving (pending past the TTL, confirmed past check-out) through
+the ``(status, ...)`` indexes, so a rerun only finds what is left to do; the
+aggregate rebuild walks listing ids after its cursor.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from alx_travel_app.routers import primary_only
+
+from .analytics import contribution, refresh_stays
+from .caching import bump_listing_versions
+from .models import Booking, BookedNight, IdempotencyKey, Job, Listing
+
+logger = logging.getLogger('listings.jobs')
+
+# A failed run is retried this much later, times its attempt number
+RETRY_DELAY = timedelta(minutes=1)
+
+
+class LeaseLost(Exception):
+    """Raised when another worker took over a job whose lease had run out"""
+
+
+class BookingTransition:
+    """Move bookings that have aged out of ``source`` into ``target``, in batches"""
+
+    name = None
+    source = None
+    target = None
+    order_field = None
+    # How often the scheduler enqueues a run
+    every = timedelta(minutes=5)
+
+    def eligible(self, now):
+        """Bookings due to move at ``now``; subclasses narrow this down"""
+        return Booking.objects.filter(status=self.source)
+
+    def age(self, value, now):
+        """Seconds since ``value`` of ``order_field`` was reached at ``now``.
+
+        Subclasses that wait a grace period after it measure from there.
+        """
+        if isinstance(value, datetime):
+            return (now - value).total_seconds()
+        return (timezone.localdate(now) - value).days * 86400
+
+    def lag(self, now):
+        """Seconds the oldest eligible booking has been waiting, or 0"""
+        oldest = self.eligible(now).order_by(self.order_field).values_list(self.order_field, flat=True).first()
+        return 0 if oldest is None else max(self.age(oldest, now), 0)
+
+    def step(self, cursor, batch_size, now):
+        """Transition one batch; returns (processed, cursor, finished)"""
+        rows = list(
+            self.eligible(now)
+            .order_by(self.order_field, 'id')
+            # Row-locking backends skip bookings a guest request is writing;
+            # SQLite ignores this and serializes on the write lock instead.
+            .select_for_update(skip_locked=True)
+            .values_list('pk', 'listing_id', 'check_in_date', 'check_out_date')[:batch_size]
+        )
+        if rows:
+            ids = [row[0] for row in rows]
+            Booking.objects.filter(pk__in=ids).update(status=self.target, updated_at=now)
+            if self.target not in Booking.ACTIVE_STATUSES:
+                BookedNight.objects.filter(booking_id__in=ids).delete()
+            # The bulk update skips the post_save signals that would do these
+            if contribution(self.source) != contribution(self.target):
+                refresh_stays([row[1:] for row in rows])
+            bump_listing_versions({row[1] for row in rows})
+        return len(rows), cursor, len(rows) < batch_size
+
+
+class ExpirePendingBookings(BookingTransition):
+    """Cancel pending bookings nobody confirmed within BOOKING_PENDING_TTL_HOURS,
+    releasing their nights"""
+
+    name = 'expire_pending_bookings'
+    source = 'pending'
+    target = 'cancelled'
+    order_field = 'created_at'
+
+    def cutoff(self, now):
+        return now - timedelta(hours=getattr(settings, 'BOOKING_PENDING_TTL_HOURS', 24))
+
+    def eligible(self, now):
+        return Booking.objects.filter(status=self.source, created_at__lt=self.cutoff(now))
+
+    def age(self, created_at, now):
+        return (self.cutoff(now) - created_at).total_seconds()
+
+
+class CompletePastStays(BookingTransition):
+    """Mark confirmed bookings completed once their check-out date arrives"""
+
+    name = 'complete_past_stays'
+    source = 'confirmed'
+    target = 'completed'
+    order_field = 'check_out_date'
+    every = timedelta(hours=1)
+
+    def eligible(self, now):
+        return Booking.objects.filter(status=self.source, check_out_date__lte=timezone.localdate(now))
+
+
+class RefreshListingAggregates:
+    """Rebuild every listing's stored review aggregates, a batch of listings at a time"""
+
+    name = 'refresh_listing_aggregates'
+    every = timedelta(days=1)
+
+    def lag(self, now):
+        return 0
+
+    def step(self, cursor, batch_size, now):
+        after = cursor.get('after', 0)
+        ids = list(
+            Listing.objects.filter(pk__gt=after).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if ids:
+            Listing.refresh_rating_aggregates(ids, batch_size=batch_size)
+            bump_listing_versions(ids)
+            cursor = {'after': ids[-1]}
+        return len(ids), cursor, len(ids) < batch_size
+
+
+class PurgeIdempotencyKeys:
+    """Delete stored booking responses older than IDEMPOTENCY_KEY_TTL_HOURS"""
+
+    name = 'purge_idempotency_keys'
+    every = timedelta(hours=1)
+
+    def cutoff(self, now):
+        return now - timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+    def expired(self, now):
+        return IdempotencyKey.objects.filter(created_at__lt=self.cutoff(now))
+
+    def lag(self, now):
+        oldest = self.expired(now).order_by('created_at').values_list('created_at', flat=True).first()
+        return 0 if oldest is None else (self.cutoff(now) - oldest).total_seconds()
+
+    def step(self, cursor, batch_size, now):
+        ids = list(self.expired(now).order_by('created_at', 'id').values_list('pk', flat=True)[:batch_size])
+        if ids:
+            IdempotencyKey.objects.filter(pk__in=ids).delete()
+        return len(ids), cursor, len(ids) < batch_size
+
+
+JOBS = {
+    job.name: job
+    for job in (ExpirePendingBookings(), CompletePastStays(), RefreshListingAggregates(), PurgeIdempotencyKeys())
+}
+
+
+def enqueue(name, key=None, run_after=None):
+    """Queue a run of ``name``; a second call with the same key is a no-op"""
+    if name not in JOBS:
+        raise KeyError(f'Unknown job {name!r}')
+    run_after = run_after or timezone.now()
+    job, _ = Job.objects.get_or_create(
+        key=key or f'{name}:{run_after.isoformat()}',
+        defaults={'name': name, 'run_after': run_after},
+    )
+    return job
+
+
+def enqueue_due(now=None):
+    """Queue the current slot of each periodic job not already queued or running"""
+    now = now or timezone.now()
+    busy = set(
+        Job.objects.filter(status__in=['queued', 'running']).values_list('name', flat=True).distinct()
+    )
+    queued = []
+    for name, job in JOBS.items():
+        if name in busy:
+            continue
+        every = job.every.total_seconds()
+        # The slot only names the run; it is due as soon as it is queued
+        slot = int(now.timestamp() // every)
+        queued.append(enqueue(name, key=f'{name}:{slot}', run_after=now))
+    return queued
+
+
+def due_jobs(now):
+    """Queued jobs that are due, and running jobs whose worker lost its lease"""
+    return Q(status='queued', run_after__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+class Worker:
+    """Claims due jobs and runs them batch by batch under a renewed lease"""
+
+    def __init__(self, name=None, batch_size=None, lease_seconds=None, max_attempts=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = batch_size or getattr(settings, 'JOB_BATCH_SIZE', 500)
+        self.lease = timedelta(seconds=lease_seconds or getattr(settings, 'JOB_LEASE_SECONDS', 300))
+        self.max_attempts = max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+
+    def claim(self, now=None):
+        """Take the next due job, or return None"""
+        now = now or timezone.now()
+        candidates = Job.objects.filter(due_jobs(now)).order_by('run_after', 'id').values_list('pk', flat=True)
+        for pk in candidates[:10]:
+            # Only one worker's UPDATE can match while the job is still due
+            claimed = Job.objects.filter(due_jobs(now), pk=pk).update(
+                status='running',
+                locked_by=self.name,
+                locked_until=now + self.lease,
+                attempts=F('attempts') + 1,
+                started_at=Coalesce('started_at', Value(now)),
+            )
+            if claimed:
+                return Job.objects.get(pk=pk)
+        return None
+
+    def run_pending(self, max_batches=None):
+        """Run due jobs until none are left; returns a report per run"""
+        reports = []
+        while (job := self.claim()) is not None:
+            reports.append(self.run(job, max_batches=max_batches))
+        return reports
+
+    def run(self, job, max_batches=None):
+        """Run ``job``'s batches until it finishes, fails or loses its lease.
+
+        With ``max_batches`` the job is handed back to the queue after that
+        many batches, cursor and all, so long runs take turns with others.
+        Returns a report of the run: rows, batches, throughput and lag. Its
+        ``status`` is the job's, or ``lost`` when another worker took the
+        lease; the job row is then that worker's to update.
+        """
+        spec = JOBS[job.name]
+        started = time.perf_counter()
+        processed = batches = 0
+        lease_lost = False
+        with primary_only():
+            now = timezone.now()
+            report = {
+                'job': job.key,
+                'worker': self.name,
+                'attempt': job.attempts,
+                # How late the run started, and how far behind its bookings are
+                'queue_lag_s': round((now - job.run_after).total_seconds(), 3),
+                'backlog_lag_s': round(spec.lag(now), 3),
+            }
+            logger.info('%s claimed', job.key, extra={'fields': report})
+            try:
+                while True:
+                    batch_started = time.perf_counter()
+                    count, finished = self.run_batch(job, spec)
+                    processed += count
+                    batches += 1
+                    elapsed = time.perf_counter() - batch_started
+                    logger.info('%s batch %d: %d rows', job.key, job.batches, count, extra={'fields': {
+                        'job': job.key,
+                        'batch': job.batches,
+                        'rows': count,
+                        'batch_ms': round(elapsed * 1000, 2),
+                        'rows_per_s': round(count / elapsed, 1) if elapsed else None,
+                    }})
+                    if finished:
+                        break
+                    if max_batches and batches >= max_batches:
+                        self.release(job)
+                        break
+            except LeaseLost:
+                lease_lost = True
+                logger.warning('%s: lease lost to another worker', job.key, extra={'fields': report})
+            except Exception:
+                self.fail(job, traceback.format_exc())
+                logger.exception('%s failed', job.key, extra={'fields': report})
+
+        elapsed = time.perf_counter() - started
+        report.update({
+            'status': 'lost' if lease_lost else job.status,
+            'rows': processed,
+            'batches': batches,
+            'duration_s': round(elapsed, 3),
+            'rows_per_s': round(processed / elapsed, 1) if elapsed else None,
+        })
+        if job.status in ('done', 'queued'):
+            logger.info('%s %s: %d rows', job.key, job.status, processed, extra={'fields': report})
+        return report
+
+    def run_batch(self, job, spec):
+        """One batch and its checkpoint, committed together"""
+        with transaction.atomic():
+            now = timezone.now()
+            count, cursor, finished = spec.step(job.cursor, self.batch_size, now)
+            fields = {
+                'cursor': cursor,
+                'processed': F('processed') + count,
+                'batches': F('batches') + 1,
+                'locked_until': now + self.lease,
+            }
+            if finished:
+                fields.update(status='done', finished_at=now, locked_by='', locked_until=None)
+            if not Job.objects.filter(pk=job.pk, status='running', locked_by=self.name).update(**fields):
+                # Roll the batch back; the new owner redoes it from the cursor
+                raise LeaseLost(job.key)
+        job.cursor = cursor
+        job.processed += count
+        job.batches += 1
+        if finished:
+            job.status = 'done'
+        return count, finished
+
+    def release(self, job):
+        """Hand a job that still has work back to the queue"""
+        # Claiming counted an attempt; handing back on time is not one
+        Job.objects.filter(pk=job.pk, locked_by=self.name).update(
+            status='queued', locked_by='', locked_until=None, attempts=F('attempts') - 1,
+        )
+        job.status = 'queued'
+        job.attempts -= 1
+
+    def fail(self, job, error):
+        """Requeue after a delay, or give up once attempts run out"""
+        status = 'failed' if job.attempts >= self.max_attempts else 'queued'
+        Job.objects.filter(pk=job.pk, locked_by=self.name).update(
+            status=status,
+            last_error=error,
+            locked_by='',
+            locked_until=None,
+            run_after=timezone.now() + RETRY_DELAY * job.attempts,
+        )
+        job.status = status
+        job.last_error = error
+
+
+def status():
+    """Per job name: queued/running/failed counts and the oldest due run's lag in seconds"""
+    now = timezone.now()
+    summary = {}
+    for name in JOBS:
+        jobs = Job.objects.filter(name=name)
+        oldest = jobs.filter(status='queued', run_after__lte=now).order_by('run_after').first()
+        last = jobs.filter(status='done').order_by('-finished_at').first()
+        summary[name] = {
+            'queued': jobs.filter(status='queued').count(),
+            'running': jobs.filter(status='running').count(),
+            'failed': jobs.filter(status='failed').count(),
+            'queue_lag_s': round((now - oldest.run_after).total_seconds(), 1) if oldest else 0,
+            'backlog_lag_s': round(JOBS[name].lag(now), 1),
+            'last_finished': last.finished_at if last else None,
+        }
+    return summary
@@ -0,0 +1,106 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from listings.benchmarks import isolated_database, summarize, time_calls
+from listings.models import Listing, Booking
+
+CITIES = ['New York', 'Los Angeles', 'Chicago', 'Miami', 'San Francisco',
+          'Paris', 'London', 'Tokyo', 'Sydney', 'Toronto']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark date-range availability search on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=10000,
+                            help='Number of listings to generate (default: 10000)')
+        parser.add_argument('--bookings', type=int, default=1000000,
+                            help='Number of bookings to generate (default: 1000000)')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Number of timed searches (default: 200)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk insert (default: 5000)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with isolated_database():
+            start = time.perf_counter()
+            self.generate(rng, options)
+            self.stdout.write(f'Generated data in {time.perf_counter() - start:.1f}s')
+
+            today = date.today()
+            windows = set()
+            while len(windows) < options['queries']:
+                check_in = today + timedelta(days=rng.randint(0, 365))
+                windows.add((
+                    check_in,
+                    check_in + timedelta(days=rng.randint(1, 7)),
+                    rng.choice(CITIES),
+                    rng.randint(1, 6),
+                ))
+            iterator = iter(sorted(windows))
+            url = reverse('listing-search')
+            browser = Client(HTTP_HOST='localhost')
+            # Every window is distinct, so each request misses the response cache
+            cache.clear()
+
+            def search():
+                check_in, check_out, city, guests = next(iterator)
+                # The first page of the endpoint: search, serialize, quote, render
+                response = browser.get(url, {
+                    'check_in': check_in, 'check_out': check_out, 'city': city, 'guests': guests,
+                })
+                if response.status_code != 200:
+                    raise CommandError(f'GET {url} returned {response.status_code}')
+
+            stats = summarize(time_calls(search, len(windows)))
+            self.stdout.write(self.style.SUCCESS(
+                f'search over {options["listings"]} listings / '
+                f'{options["bookings"]} bookings: '
+                f'p50={stats["p50_ms"]}ms p95={stats["p95_ms"]}ms max={stats["max_ms"]}ms'
+            ))
+
+    def generate(self, rng, options):
+        """Bulk insert listings and non-overlapping bookings"""
+        host = User.objects.create(username='bench-host')
+        guest = User.objects.create(username='bench-guest')
+        batch_size = options['batch_size']
+        Listing.objects.bulk_create([
+            Listing(
+                title=f'Listing {i}', description='', address='',
+                city=rng.choice(CITIES), state='', country='', postal_code='',
+                property_type='apartment', bedrooms=1, bathrooms=1,
+                max_guests=rng.randint(1, 8),
+                price_per_night=Decimal(rng.randint(50, 500)), host=host,
+            )
+            for i in range(options['listings'])
+        ], batch_size=batch_size)
+        listing_ids = list(Listing.objects.values_list('id', flat=True))
+
+        # Lay bookings end to end per listing, starting a year back, so the
+        # window being searched is partly booked for most listings.
+        cursors = {pk: date.today() - timedelta(days=365) for pk in listing_ids}
+        statuses = ['confirmed', 'completed', 'pending', 'cancelled']
+        batch = []
+        for _ in range(options['bookings']):
+            listing_id = rng.choice(listing_ids)
+            check_in = cursors[listing_id] + timedelta(days=rng.randint(0, 3))
+            check_out = check_in + timedelta(days=rng.randint(1, 7))
+            cursors[listing_id] = check_out
+            batch.append(Booking(
+                listing_id=listing_id, guest=guest, check_in_date=check_in,
+                check_out_date=check_out, number_of_guests=1,
+                total_price=Decimal('100.00'), status=rng.choice(statuses),
+            ))
+            if len(batch) >= batch_size:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        Booking.objects.bulk_create(batch)
@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from listings.benchmarks import isolated_database, summarize, time_calls
+from listings.fastpath import compile_plan
+from listings.models import Listing, Booking, Review
+from listings.renderers import FastJSONRenderer
+from listings.serializers import (
+    BookingSummarySerializer, ListingSerializer, ListingSummarySerializer, ReviewSerializer,
+)
+
+# (label, model, serializer class, serializer kwargs)
+VARIANTS = [
+    ('listings summary', Listing, ListingSummarySerializer, {}),
+    ('listings full', Listing, ListingSerializer, {}),
+    ('bookings expanded', Booking, BookingSummarySerializer, {'expand': ['listing', 'guest']}),
+    ('reviews', Review, ReviewSerializer, {}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF serializers with the values() fast path on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                            help='Objects per response (default: 100 1000 10000)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per size and path (default: 5)')
+
+    def handle(self, *args, **options):
+        largest = max(options['sizes'])
+        with isolated_database():
+            # Bulk seed enough rows that every size fills up for every model
+            call_command(
+                'seed', bulk=True, seed=0, users=100, listings=largest,
+                bookings=largest * 2, reviews=largest, stdout=StringIO(),
+            )
+            for label, model, serializer_class, kwargs in VARIANTS:
+                for size in options['sizes']:
+                    self.compare(label, model, serializer_class, kwargs, size, options['repeat'])
+
+    def compare(self, label, model, serializer_class, kwargs, size, repeat):
+        serializer = serializer_class(**kwargs)
+        only, joins, prefetches = serializer.query_plan()
+        base = model.objects.order_by('-created_at', '-id')
+        drf_queryset = base.prefetch_related(*prefetches).only(*only)
+        if joins:
+            drf_queryset = drf_queryset.select_related(*joins)
+        plan = compile_plan(serializer)
+
+        def drf():
+            data = serializer_class(drf_queryset[:size], many=True, **kwargs).data
+            return JSONRenderer().render(data)
+
+        def fast():
+            return FastJSONRenderer().render(plan.render(plan.values(base)[:size]))
+
+        drf_body, fast_body = drf(), fast()
+        if drf_body != fast_body:
+            raise CommandError(f'{label} x{size}: fast path output differs from DRF')
+        drf_stats = summarize(time_calls(drf, repeat))
+        fast_stats = summarize(time_calls(fast, repeat))
+        speedup = drf_stats['p50_ms'] / fast_stats['p50_ms'] if fast_stats['p50_ms'] else 0
+        self.stdout.write(
+            f'{label:18} x{size:<6} drf p50={drf_stats["p50_ms"]:9.1f}ms  '
+            f'fast p50={fast_stats["p50_ms"]:9.1f}ms  {speedup:5.1f}x  '
+            f'({len(fast_body):,} bytes, identical)'
+        )
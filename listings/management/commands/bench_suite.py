@@ -0,0 +1,166 @@
+import itertools
+import json
+import logging
+import platform
+import sqlite3
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from listings.benchmarks import find_regressions, isolated_database, measure
+from listings.bookings import check_rules, create_booking, read_rules
+from listings.exports import iter_export
+from listings.models import Listing, Booking
+from listings.serializers import ListingSerializer
+
+# Seed arguments per dataset, named after the number of bookings
+DATASETS = {
+    '1k': {'users': 50, 'listings': 100, 'bookings': 1_000, 'reviews': 300},
+    '100k': {'users': 1_000, 'listings': 5_000, 'bookings': 100_000, 'reviews': 20_000},
+    '1m': {'users': 10_000, 'listings': 20_000, 'bookings': 1_000_000, 'reviews': 100_000},
+}
+
+# Seeded data is generated relative to this date, so every run sees the same rows
+AS_OF = date(2025, 1, 1)
+
+BASELINE_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+
+class Command(BaseCommand):
+    help = 'Measure queries, wall time and peak memory of key paths on a seeded dataset, against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=list(DATASETS), default='1k',
+                            help='Dataset to seed (default: 1k)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per scenario (default: 5)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Seed worker processes (default: 1)')
+        parser.add_argument('--output', '-o',
+                            help='Write the results to this JSON file')
+        parser.add_argument('--baseline',
+                            help='Baseline JSON to compare with (default: benchmarks/baseline-<size>.json)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Store the results as the new baseline instead of comparing')
+        parser.add_argument('--time-tolerance', type=float, default=0.5,
+                            help='Allowed wall time growth over the baseline (default: 0.5 = 50%%)')
+        parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                            help='Allowed peak memory growth over the baseline (default: 0.25)')
+
+    def handle(self, *args, **options):
+        size = options['size']
+        baseline_path = Path(options['baseline'] or BASELINE_DIR / f'baseline-{size}.json')
+        # Request logs (every tiny request is "slow" on a busy box) would drown the report
+        logging.disable(logging.WARNING)
+        timeouts = {'listing_detail': 0, 'listing_search': 0}
+        try:
+            with isolated_database(), override_settings(RESPONSE_CACHE_TIMEOUTS=timeouts):
+                results = self.run(size, options)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        for name, row in results['scenarios'].items():
+            self.stdout.write(
+                f'{name:26} queries={row["queries"]:<5} p50={row["wall_ms"]:10.2f}ms '
+                f'p95={row["p95_ms"]:10.2f}ms  peak={row["peak_kib"]:10.1f} KiB'
+            )
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+        if not baseline_path.exists():
+            self.stderr.write(f'No baseline at {baseline_path}; run with --update-baseline to create one')
+            return
+        baseline = json.loads(baseline_path.read_text())
+        problems = find_regressions(
+            results, baseline, options['time_tolerance'], options['memory_tolerance']
+        )
+        if problems:
+            raise CommandError('Regressions against the baseline:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
+
+    def run(self, size, options):
+        scenarios = {}
+
+        def seed():
+            call_command('seed', bulk=True, seed=0, as_of=AS_OF, workers=options['workers'],
+                         stdout=StringIO(), **DATASETS[size])
+
+        # Seeding runs once, so its timing comes from the traced run
+        scenarios['seed'] = measure(seed, repeat=0)
+        for name, func in self.scenarios():
+            scenarios[name] = measure(func, options['repeat'])
+        return {
+            'size': size,
+            'dataset': DATASETS[size],
+            'repeat': options['repeat'],
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'machine': platform.machine(),
+            },
+            'scenarios': scenarios,
+        }
+
+    def scenarios(self):
+        """(name, callable) for each measured path, on the seeded data"""
+        admin = User.objects.create_superuser('bench-admin', 'admin@example.com', 'bench')
+        guest = User.objects.exclude(pk=admin.pk).order_by('pk').first()
+        browser = Client(HTTP_HOST='localhost')
+        browser.force_login(admin)
+        listing = Listing.objects.filter(is_active=True).order_by('-review_count', 'pk').first()
+        detail_url = reverse('listing-detail', args=[listing.pk])
+
+        serializer = ListingSerializer()
+        only, joins, prefetches = serializer.query_plan()
+        page = Listing.objects.select_related(*joins).prefetch_related(*prefetches).only(*only)
+
+        # Far enough ahead that no seeded booking is in the way
+        starts = (date.today() + timedelta(days=3 * 365 + 3 * number) for number in itertools.count())
+
+        def validate_booking():
+            # The checks create_booking makes before its transaction
+            check_in = date.today() + timedelta(days=3 * 365 - 10)
+            rules = read_rules(guest, listing.pk, check_in, check_in + timedelta(days=2))
+            check_rules(rules, listing.pk, 1)
+
+        def book():
+            check_in = next(starts)
+            create_booking(guest, listing.pk, check_in, check_in + timedelta(days=2), 1)
+
+        def get(url):
+            def fetch():
+                response = browser.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f'GET {url} returned {response.status_code}')
+                response.content
+            return fetch
+
+        def export_bookings():
+            for _ in iter_export('bookings', 'csv'):
+                pass
+
+        return [
+            ('listing.list_page', get(reverse('listing-list'))),
+            ('listing.detail', get(detail_url)),
+            ('listing.serialize_100', lambda: ListingSerializer(page.order_by('pk')[:100], many=True).data),
+            ('booking.validate', validate_booking),
+            ('booking.create', book),
+            ('admin.listing_changelist', get(reverse('admin:listings_listing_changelist'))),
+            ('admin.booking_changelist', get(reverse('admin:listings_booking_changelist'))),
+            ('admin.review_changelist', get(reverse('admin:listings_review_changelist'))),
+            ('export.bookings_csv', export_bookings),
+        ]
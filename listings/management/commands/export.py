@@ -0,0 +1,48 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.exports import EXPORT_COLUMNS, EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, iter_export
+from listings.models import Booking
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings or listings to CSV or JSONL without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORT_COLUMNS),
+                            help='What to export')
+        parser.add_argument('--format', dest='file_format', choices=EXPORT_FORMATS, default='csv',
+                            help='Output format (default: csv)')
+        parser.add_argument('--output', '-o',
+                            help='File to write to (default: stdout)')
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='Earliest date to include, YYYY-MM-DD')
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help='Date to stop before, YYYY-MM-DD')
+        parser.add_argument('--status', action='append', dest='statuses',
+                            choices=[choice for choice, _ in Booking.STATUS_CHOICES],
+                            help='Only bookings with this status (may be repeated)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f'Rows fetched per database round trip (default: {DEFAULT_CHUNK_SIZE})')
+
+    def handle(self, *args, **options):
+        try:
+            lines = iter_export(
+                options['kind'], options['file_format'],
+                start=options['start'], end=options['end'],
+                statuses=options['statuses'], chunk_size=options['chunk_size'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        
+        count = 0
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stderr.write(f'Exported {count} lines to {options["output"]}')
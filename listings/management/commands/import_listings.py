@@ -0,0 +1,68 @@
+import json
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.imports import import_listings
+
+
+class Command(BaseCommand):
+    help = 'Import a partner listing feed (CSV or JSONL), upserting on external_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file to import')
+        parser.add_argument('--host', required=True,
+                            help='Username that owns newly created listings')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'],
+                            help='Feed format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Records validated and written per transaction (default: 1000)')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file (default: <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip records already committed according to the checkpoint')
+        parser.add_argument('--errors',
+                            help='Write rejected records to this JSONL file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in ('csv', 'jsonl'):
+            raise CommandError('Cannot tell the feed format; pass --format csv or --format jsonl')
+        try:
+            host = User.objects.get(username=options['host'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named {options["host"]!r}')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+
+        def progress(report):
+            self.stdout.write(
+                f'{report.skipped + report.processed} records: {report.created} created, '
+                f'{report.updated} updated, {len(report.errors)} failed '
+                f'({report.rows_per_second:,.0f} rows/s)'
+            )
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            report = import_listings(
+                stream, file_format, host,
+                batch_size=options['batch_size'],
+                checkpoint=checkpoint,
+                resume=options['resume'],
+                on_batch=progress,
+            )
+
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8') as errors:
+                for number, message in report.errors:
+                    errors.write(json.dumps({'record': number, 'error': message}) + '\n')
+        for number, message in report.errors[:10]:
+            self.stderr.write(f'Record {number}: {message}')
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.processed} records in {report.elapsed:.1f}s '
+            f'({report.rows_per_second:,.0f} rows/s): {report.created} created, '
+            f'{report.updated} updated, {len(report.errors)} failed'
+        ))
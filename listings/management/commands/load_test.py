@@ -0,0 +1,157 @@
+import http.client
+import importlib.util
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from listings.benchmarks import isolated_database, summarize
+from listings.seeding import CITIES
+
+# name -> (server module, how to start it, search path it serves)
+TARGETS = {
+    'wsgi': ('gunicorn', ['alx_travel_app.wsgi:application', '--worker-class', 'gthread'],
+             '/api/listings/search/'),
+    'asgi': ('uvicorn', ['alx_travel_app.asgi:application', '--log-level', 'warning'],
+             '/api/async/listings/search/'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Load test listing search under gunicorn (WSGI, sync views) and uvicorn (ASGI, async views)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Requests per target (default: 400)')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Concurrent client connections (default: 16)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Server processes (default: 1)')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Threads per gunicorn worker (default: 4)')
+        parser.add_argument('--listings', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=20000)
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('load_test seeds a throwaway SQLite file; the default database is not SQLite')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'load.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = path
+            with isolated_database():
+                call_command('seed', bulk=True, seed=0, users=200, listings=options['listings'],
+                             bookings=options['bookings'], reviews=0, stdout=StringIO())
+                connection.close()
+                for name in options['targets']:
+                    self.run_target(name, path, options)
+
+    def run_target(self, name, path, options):
+        module, arguments, search_path = TARGETS[name]
+        if importlib.util.find_spec(module) is None:
+            self.stderr.write(f'{name}: skipped, {module} is not installed')
+            return
+        command = [sys.executable, '-m', module, *arguments, '--workers', str(options['workers'])]
+        if module == 'gunicorn':
+            command += ['--threads', str(options['threads']), '--bind', f'127.0.0.1:{options["port"]}']
+        else:
+            command += ['--host', '127.0.0.1', '--port', str(options['port'])]
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings'),
+            'DATABASE_PATH': path,
+            'DATABASE_REPLICAS': '',
+            # Measure the views, not the response cache
+            'LISTING_SEARCH_CACHE_TIMEOUT': '0',
+        }
+        server = subprocess.Popen(command, env=env, cwd=settings.BASE_DIR,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            self.wait_for_port(options['port'], server)
+            self.request_all(options, search_path, warmup=True)
+            started = time.perf_counter()
+            latencies, errors = self.request_all(options, search_path)
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+        stats = summarize(latencies)
+        self.stdout.write(
+            f'{name:5} {len(latencies) / elapsed:8.1f} req/s  p50={stats["p50_ms"]}ms '
+            f'p95={stats["p95_ms"]}ms max={stats["max_ms"]}ms  errors={errors}'
+        )
+
+    def wait_for_port(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited: {server.stderr.read().decode()[-2000:]}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server did not start listening on port {port}')
+
+    def request_all(self, options, search_path, warmup=False):
+        """Send the requests over ``concurrency`` keep-alive connections"""
+        total = options['concurrency'] if warmup else options['requests']
+        rng = random.Random(0)
+        today = date.today()
+        paths = []
+        for _ in range(total):
+            check_in = today + timedelta(days=rng.randint(0, 365))
+            query = urlencode({
+                'check_in': check_in,
+                'check_out': check_in + timedelta(days=rng.randint(1, 7)),
+                'city': rng.choice(CITIES)[0],
+                'guests': rng.randint(1, 4),
+            })
+            paths.append(f'{search_path}?{query}')
+        work = iter(paths)
+        lock = threading.Lock()
+        latencies, errors = [], [0]
+
+        def client():
+            conn = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=60)
+            while True:
+                with lock:
+                    path = next(work, None)
+                if path is None:
+                    break
+                started = time.perf_counter()
+                try:
+                    conn.request('GET', path)
+                    response = conn.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=60)
+                    ok = False
+                with lock:
+                    if ok:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    else:
+                        errors[0] += 1
+            conn.close()
+
+        threads = [threading.Thread(target=client) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors[0]
@@ -0,0 +1,42 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from listings.caching import bump_listing_versions
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored rating aggregates on every listing from its reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of listings to refresh per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--listing',
+            type=int,
+            action='append',
+            dest='listing_ids',
+            help='Only rebuild the given listing id (may be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        updated = Listing.refresh_rating_aggregates(
+            listing_ids=options['listing_ids'],
+            batch_size=options['batch_size'],
+        )
+        
+        # The aggregates were written with bulk_update, which skips signals
+        listing_ids = iter(
+            options['listing_ids'] or Listing.objects.values_list('pk', flat=True).iterator()
+        )
+        while batch := list(islice(listing_ids, options['batch_size'])):
+            bump_listing_versions(batch)
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} listings')
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from listings.fulltext import get_backend
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the listing full-text search index from the listings table'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt {type(backend).__name__} index for {Listing.objects.count()} listings'
+            )
+        )
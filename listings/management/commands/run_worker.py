@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from listings.jobs import JOBS, Worker, enqueue, enqueue_due, status
+
+
+def work(options, stdout=None):
+    """One worker process: schedule, drain the queue, sleep, repeat"""
+    worker = Worker(batch_size=options['batch_size'], lease_seconds=options['lease'])
+    while True:
+        if options['schedule']:
+            enqueue_due()
+        for report in worker.run_pending(max_batches=options['max_batches']):
+            if stdout is not None:
+                stdout.write(
+                    f'{report["job"]}: {report["status"]}, {report["rows"]} rows in '
+                    f'{report["batches"]} batches, {report["duration_s"]}s '
+                    f'({report["rows_per_s"]} rows/s); queue lag {report["queue_lag_s"]}s, '
+                    f'backlog lag {report["backlog_lag_s"]}s'
+                )
+        if options['once']:
+            return
+        connections.close_all()
+        time.sleep(options['interval'])
+
+
+class Command(BaseCommand):
+    help = 'Run booking lifecycle jobs (expire pending, complete past stays, refresh aggregates, purge idempotency keys) from the Job table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run whatever is due, then exit')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='Seconds between polls of the job table (default: 10)')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Worker processes sharing the queue (default: 1)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per batch transaction (default: JOB_BATCH_SIZE)')
+        parser.add_argument('--lease', type=int, default=None,
+                            help='Seconds a claimed job stays locked without progress (default: JOB_LEASE_SECONDS)')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Requeue a job after this many batches so others get a turn')
+        parser.add_argument('--no-schedule', action='store_false', dest='schedule',
+                            help='Only run queued jobs; do not enqueue the periodic ones')
+        parser.add_argument('--enqueue', choices=list(JOBS), action='append', default=[],
+                            help='Queue a run of this job now (may be repeated)')
+        parser.add_argument('--status', action='store_true',
+                            help='Print queue depth and lag per job, then exit')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            for name, row in status().items():
+                self.stdout.write(
+                    f'{name:28} queued={row["queued"]} running={row["running"]} failed={row["failed"]} '
+                    f'queue_lag={row["queue_lag_s"]}s backlog_lag={row["backlog_lag_s"]}s '
+                    f'last_finished={row["last_finished"]}'
+                )
+            return
+        for name in options['enqueue']:
+            job = enqueue(name)
+            self.stdout.write(f'Queued {job.key}')
+
+        if options['processes'] <= 1:
+            work(options, self.stdout)
+            return
+        # Forked children must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['processes'], initializer=django.setup) as pool:
+            for future in [pool.submit(work, options) for _ in range(options['processes'])]:
+                future.result()
@@ -1,10 +1,27 @@
-from django.core.management.base import BaseCommand
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
 from django.utils import timezone
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, timedelta
+import hashlib
 import random
+import time
 from decimal import Decimal
 from listings.models import Listing, Booking, Review
+from listings.availability import NightsUnavailable, reserve
+from listings.features import sync_listing_features
+from listings.bulk import insert_rows
+from listings.seeding import (
+    AMENITIES_OPTIONS, CITIES, COMMENTS, DEFAULT_PASSWORD, HOUSE_RULES_OPTIONS,
+    PREMIUM_CITIES, PROPERTY_TYPES, SPECIAL_REQUESTS, STREETS,
+    USER_COLUMNS, build_user, generate_shard, password_salt, seed_timestamp, update_digest,
+)
 
 
 class Command(BaseCommand):
@@ -35,8 +52,49 @@ class Command(BaseCommand):
             default=50,
             help='Number of reviews to create (default: 50)'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Insert users with bulk_create and the other rows with raw '
+                 'executemany inserts in batched transactions, without '
+                 'per-row output (for load-test sized data)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert and transaction in --bulk mode (default: 5000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed; the same seed produces the same data'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating rows in --bulk mode (default: 1)'
+        )
+        parser.add_argument(
+            '--as-of',
+            type=date.fromisoformat,
+            help='Date the --bulk data is generated relative to (default: today)'
+        )
+        parser.add_argument(
+            '--checksum',
+            action='store_true',
+            help='Print a SHA-256 of the generated --bulk rows, users included'
+        )
 
     def handle(self, *args, **options):
+        if options['bulk']:
+            return self.handle_bulk(options)
+        if options['workers'] > 1 or options['as_of'] or options['checksum']:
+            raise CommandError('--workers, --as-of and --checksum require --bulk')
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        
         self.stdout.write('Starting database seeding...')
         
         # Create users
@@ -78,7 +136,7 @@ class Command(BaseCommand):
             )
             
             if created:
-                user.set_password('password123')
+                user.set_password(DEFAULT_PASSWORD)
                 user.save()
                 self.stdout.write(f'Created user: {username}')
             
@@ -88,56 +146,24 @@ class Command(BaseCommand):
 
     def create_listings(self, count, users):
         """Create sample listings"""
-        cities = [
-            ('New York', 'NY', 'USA'),
-            ('Los Angeles', 'CA', 'USA'),
-            ('Chicago', 'IL', 'USA'),
-            ('Miami', 'FL', 'USA'),
-            ('San Francisco', 'CA', 'USA'),
-            ('Paris', 'Île-de-France', 'France'),
-            ('London', 'England', 'UK'),
-            ('Tokyo', 'Tokyo', 'Japan'),
-            ('Sydney', 'NSW', 'Australia'),
-            ('Toronto', 'ON', 'Canada'),
-        ]
-        
-        property_types = ['apartment', 'house', 'villa', 'cabin', 'condo', 'loft', 'studio']
-        
-        amenities_options = [
-            ['WiFi', 'Kitchen', 'Free parking'],
-            ['WiFi', 'Kitchen', 'Pool', 'Gym'],
-            ['WiFi', 'Kitchen', 'Air conditioning', 'Heating'],
-            ['WiFi', 'Kitchen', 'Washer', 'Dryer'],
-            ['WiFi', 'Kitchen', 'Balcony', 'Garden'],
-            ['WiFi', 'Kitchen', 'Hot tub', 'Fireplace'],
-        ]
-        
-        house_rules_options = [
-            ['No smoking', 'No pets'],
-            ['No smoking', 'No parties'],
-            ['No smoking', 'Quiet hours after 10 PM'],
-            ['No smoking', 'No shoes inside'],
-            ['No smoking', 'No loud music'],
-        ]
-        
         listings = []
         for i in range(count):
-            city, state, country = random.choice(cities)
-            property_type = random.choice(property_types)
+            city, state, country = random.choice(CITIES)
+            property_type = random.choice(PROPERTY_TYPES)
             host = random.choice(users)
             
             # Generate realistic pricing based on property type and location
             base_price = random.randint(50, 300)
             if property_type in ['villa', 'house']:
                 base_price *= 1.5
-            if city in ['New York', 'San Francisco', 'Paris', 'London']:
+            if city in PREMIUM_CITIES:
                 base_price *= 1.8
             
             listing = Listing.objects.create(
                 title=f'Beautiful {property_type.title()} in {city}',
                 description=f'Stunning {property_type} located in the heart of {city}. '
                            f'Perfect for your next vacation with all the amenities you need.',
-                address=f'{random.randint(100, 9999)} {random.choice(["Main St", "Oak Ave", "Pine Rd", "Elm St"])}',
+                address=f'{random.randint(100, 9999)} {random.choice(STREETS)}',
                 city=city,
                 state=state,
                 country=country,
@@ -151,8 +177,8 @@ class Command(BaseCommand):
                 price_per_night=Decimal(str(base_price)),
                 cleaning_fee=Decimal(str(random.randint(20, 100))),
                 service_fee=Decimal(str(random.randint(10, 50))),
-                amenities=random.choice(amenities_options),
-                house_rules=random.choice(house_rules_options),
+                amenities=random.choice(AMENITIES_OPTIONS),
+                house_rules=random.choice(HOUSE_RULES_OPTIONS),
                 host=host,
                 is_active=random.choice([True, True, True, False]),  # 75% active
                 is_instant_bookable=random.choice([True, False]),
@@ -176,19 +202,23 @@ class Command(BaseCommand):
             start_date = date.today() + timedelta(days=random.randint(-30, 60))
             end_date = start_date + timedelta(days=random.randint(1, 14))
             
-            booking = Booking.objects.create(
+            booking = Booking(
                 listing=listing,
                 guest=guest,
                 check_in_date=start_date,
                 check_out_date=end_date,
                 number_of_guests=random.randint(1, listing.max_guests),
                 status=random.choice(statuses),
-                special_requests=random.choice([
-                    '', 'Early check-in if possible', 'Late check-out requested',
-                    'Extra towels needed', 'Quiet room preferred'
-                ])
+                special_requests=random.choice(SPECIAL_REQUESTS)
             )
             
+            # Skip dates that collide with an earlier seeded booking
+            try:
+                reserve(booking)
+            except NightsUnavailable:
+                self.stdout.write(f'Skipped overlapping booking for: {listing.title}')
+                continue
+            
             bookings.append(booking)
             self.stdout.write(f'Created booking: {booking}')
         
@@ -196,24 +226,6 @@ class Command(BaseCommand):
 
     def create_reviews(self, count, bookings, users):
         """Create sample reviews"""
-        comments = [
-            'Great place to stay! Very clean and comfortable.',
-            'Perfect location, easy access to everything.',
-            'The host was very responsive and helpful.',
-            'Beautiful property, exactly as described.',
-            'Highly recommend this place for your stay.',
-            'Excellent value for money.',
-            'The amenities were top-notch.',
-            'Very peaceful and quiet neighborhood.',
-            'The check-in process was smooth.',
-            'Would definitely stay here again!',
-            'The place was spotless and well-maintained.',
-            'Great communication with the host.',
-            'Perfect for our family vacation.',
-            'The location was ideal for exploring the city.',
-            'Very comfortable beds and good amenities.',
-        ]
-        
         for i in range(count):
             if not bookings:
                 break
@@ -229,7 +241,7 @@ class Command(BaseCommand):
                     guest=booking.guest,
                     booking=booking,
                     rating=rating,
-                    comment=random.choice(comments),
+                    comment=random.choice(COMMENTS),
                     cleanliness_rating=random.randint(3, 5),
                     communication_rating=random.randint(3, 5),
                     check_in_rating=random.randint(3, 5),
@@ -241,4 +253,128 @@ class Command(BaseCommand):
                 self.stdout.write(f'Created review: {review}')
             
             # Remove this booking to avoid duplicates
-            bookings.remove(booking) 
\ No newline at end of file
+            bookings.remove(booking) 
+
+    def handle_bulk(self, options):
+        """Seed with prepared bulk inserts, one transaction per shard"""
+        started = time.perf_counter()
+        seed = options['seed']
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 32)
+        as_of = options['as_of'] or date.today()
+        self.stdout.write(f'Bulk seeding with --seed {seed} --as-of {as_of}')
+        
+        digest = hashlib.sha256() if options['checksum'] else None
+        user_ids = self.bulk_create_users(seed, options['users'], options['batch_size'], as_of, digest)
+        counts = {key: options[key] for key in ('listings', 'bookings', 'reviews')}
+        totals = dict.fromkeys(['listings', 'bookings', 'nights', 'reviews'], 0)
+        if counts['listings'] and user_ids:
+            jobs = self.shard_jobs(seed, counts, user_ids, as_of, options['batch_size'])
+            for tables in self.generate(jobs, options['workers']):
+                self.write_shard(tables, totals)
+                if digest is not None:
+                    update_digest(digest, tables)
+        
+        # Derived primary keys bypass the sequences on backends that have them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Listing, Booking, Review]):
+                cursor.execute(sql)
+        
+        elapsed = time.perf_counter() - started
+        rows = len(user_ids) + sum(totals.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully bulk seeded database in {elapsed:.1f}s '
+                f'({rows / elapsed:,.0f} rows/s) with:\n'
+                f'- {len(user_ids)} users\n'
+                f'- {totals["listings"]} listings\n'
+                f'- {totals["bookings"]} bookings ({totals["nights"]} booked nights)\n'
+                f'- {totals["reviews"]} reviews'
+            )
+        )
+        if digest is not None:
+            self.stdout.write(f'Checksum: {digest.hexdigest()}')
+
+    def bulk_create_users(self, seed, count, batch_size, as_of, digest=None):
+        """Create sample users sharing one password hash; return all their ids.
+        
+        The hash is salted from ``seed``, so the same seed stores the same
+        users. With ``digest`` the generated rows are folded into it.
+        """
+        password_hash = make_password(DEFAULT_PASSWORD, salt=password_salt(seed))
+        timestamp = seed_timestamp(as_of)
+        usernames = []
+        for start in range(0, count, batch_size):
+            batch = [
+                build_user(i, password_hash, timestamp)
+                for i in range(start, min(count, start + batch_size))
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(batch, ignore_conflicts=True)
+            usernames.extend(user.username for user in batch)
+            if digest is not None:
+                update_digest(digest, [(User, USER_COLUMNS, [
+                    [getattr(user, column) for column in USER_COLUMNS] for user in batch
+                ])])
+        
+        user_ids = []
+        for start in range(0, len(usernames), 500):
+            user_ids.extend(
+                User.objects.filter(username__in=usernames[start:start + 500])
+                .order_by('id').values_list('id', flat=True)
+            )
+        self.stdout.write(f'Users ready: {len(user_ids)}')
+        return user_ids
+
+    def shard_jobs(self, seed, counts, user_ids, as_of, batch_size):
+        """Split listing indexes into shards of roughly ``batch_size`` rows"""
+        base_pks = {
+            'listing': (Listing.objects.aggregate(top=Max('pk'))['top'] or 0) + 1,
+            'booking': (Booking.objects.aggregate(top=Max('pk'))['top'] or 0) + 1,
+        }
+        rows_per_listing = 1 + counts['bookings'] // counts['listings']
+        shard_size = max(1, batch_size // rows_per_listing)
+        return [
+            {
+                'seed': seed,
+                'first': first,
+                'last': min(counts['listings'], first + shard_size),
+                'counts': counts,
+                'base_pks': base_pks,
+                'user_ids': user_ids,
+                'as_of': as_of,
+            }
+            for first in range(0, counts['listings'], shard_size)
+        ]
+
+    def generate(self, jobs, workers):
+        """Yield generated shards in job order, building them on ``workers`` processes"""
+        if workers <= 1:
+            yield from map(generate_shard, jobs)
+            return
+        
+        # Keep a bounded number of shards in flight so a slow writer does not
+        # let finished shards pile up in memory.
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            pending = deque()
+            for job in jobs:
+                pending.append(pool.submit(generate_shard, job))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def write_shard(self, tables, totals):
+        """Insert one shard's rows in foreign key order inside one transaction"""
+        with transaction.atomic():
+            for model, columns, rows in tables:
+                insert_rows(model, columns, rows)
+            # Raw inserts skip Listing.save(), which maintains the feature links
+            model, columns, rows = tables[0]
+            sync_listing_features([row[columns.index('id')] for row in rows])
+        for (model, columns, rows), key in zip(tables, ['listings', 'bookings', 'nights', 'reviews']):
+            totals[key] += len(rows)
+        self.stdout.write(
+            f'Inserted {totals["listings"]} listings, {totals["bookings"]} bookings, '
+            f'{totals["reviews"]} reviews'
+        )
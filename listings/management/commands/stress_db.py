@@ -0,0 +1,133 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from alx_travel_app.database import SQLITE_PRAGMAS, pragma_statements
+from listings.benchmarks import isolated_database, summarize
+from listings.models import Listing
+
+CITIES = ['New York', 'Paris', 'London', 'Tokyo', 'Sydney']
+
+# name -> (journal mode, per-connection statements, statement opening a write)
+MODES = {
+    # What a bare sqlite3 DATABASES entry gives: rollback journal, full
+    # sync, deferred transactions and the driver's 5 second busy wait
+    'default': ('DELETE', [], 'BEGIN'),
+    'tuned': ('WAL', pragma_statements(SQLITE_PRAGMAS), 'BEGIN IMMEDIATE'),
+}
+
+
+def run_worker(job):
+    """Mix reads and read-then-write transactions until the deadline.
+
+    Runs in a worker process against the database file with plain sqlite3,
+    so every worker holds its own connection like a server process would.
+    """
+    rng = random.Random(job['seed'])
+    conn = sqlite3.connect(job['path'], timeout=5, isolation_level=None)
+    journal_mode, statements, begin = MODES[job['mode']]
+    for statement in statements:
+        conn.execute(statement)
+
+    result = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0, 'write_ms': []}
+    time.sleep(max(0, job['start'] - time.time()))
+    deadline = job['start'] + job['seconds']
+    while time.time() < deadline:
+        pk = rng.choice(job['listing_ids'])
+        started = time.perf_counter()
+        if rng.random() < job['write_ratio']:
+            try:
+                conn.execute(begin)
+                price, = conn.execute(
+                    'SELECT price_per_night FROM listings_listing WHERE id = ?', [pk]
+                ).fetchone()
+                conn.execute(
+                    'UPDATE listings_listing SET price_per_night = ?, updated_at = ? WHERE id = ?',
+                    [str(price), datetime.now(timezone.utc).isoformat(), pk],
+                )
+                conn.execute('COMMIT')
+            except sqlite3.OperationalError:
+                result['write_errors'] += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+            else:
+                result['writes'] += 1
+                result['write_ms'].append((time.perf_counter() - started) * 1000)
+        else:
+            try:
+                conn.execute(
+                    'SELECT COUNT(*) FROM listings_listing WHERE city = ? AND is_active AND max_guests >= ?',
+                    [rng.choice(CITIES), rng.randint(1, 6)],
+                ).fetchone()
+            except sqlite3.OperationalError:
+                result['read_errors'] += 1
+            else:
+                result['reads'] += 1
+    conn.close()
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Compare SQLite write throughput and lock errors with default and tuned settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Concurrent processes, like server workers (default: 4)')
+        parser.add_argument('--seconds', type=float, default=5,
+                            help='Duration of each run (default: 5)')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Share of transactions that write (default: 0.2)')
+        parser.add_argument('--listings', type=int, default=500,
+                            help='Listings to seed (default: 500)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('stress_db measures SQLite settings; the default database is not SQLite')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stress.sqlite3')
+            # A file-backed test database, since workers need a shared file
+            connection.settings_dict['TEST']['NAME'] = path
+            with isolated_database():
+                call_command('seed', bulk=True, seed=0, users=20, listings=options['listings'],
+                             bookings=0, reviews=0, stdout=StringIO())
+                listing_ids = list(Listing.objects.values_list('pk', flat=True))
+                connection.close()
+                for mode in MODES:
+                    self.run(mode, path, listing_ids, options)
+
+    def run(self, mode, path, listing_ids, options):
+        with sqlite3.connect(path) as conn:
+            conn.execute(f'PRAGMA journal_mode={MODES[mode][0]}')
+        start = time.time() + 1
+        jobs = [
+            {
+                'path': path, 'mode': mode, 'seed': number, 'start': start,
+                'seconds': options['seconds'], 'write_ratio': options['write_ratio'],
+                'listing_ids': listing_ids,
+            }
+            for number in range(options['workers'])
+        ]
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            results = list(pool.map(run_worker, jobs))
+
+        totals = {key: sum(result[key] for result in results)
+                  for key in ('reads', 'writes', 'read_errors', 'write_errors')}
+        latencies = summarize([ms for result in results for ms in result['write_ms']])
+        attempts = totals['writes'] + totals['write_errors']
+        locked = totals['write_errors'] / attempts * 100 if attempts else 0
+        self.stdout.write(
+            f'{mode:8} writes={totals["writes"] / options["seconds"]:8.1f}/s  '
+            f'reads={totals["reads"] / options["seconds"]:9.1f}/s  '
+            f'locked writes={locked:5.1f}%  read errors={totals["read_errors"]}  '
+            f'write p50={latencies["p50_ms"]}ms p95={latencies["p95_ms"]}ms max={latencies["max_ms"]}ms'
+        )
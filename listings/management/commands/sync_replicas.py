@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from alx_travel_app.database import replica_aliases
+from alx_travel_app.routers import beat
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto the replica files (local stand-in for replication)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep syncing every N seconds instead of once')
+
+    def handle(self, *args, **options):
+        aliases = replica_aliases(connections.settings)
+        if not aliases:
+            raise CommandError('No replicas configured; set DATABASE_REPLICAS')
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('sync_replicas only copies SQLite files; use real replication elsewhere')
+        while True:
+            self.sync(aliases)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self, aliases):
+        # The heartbeat travels with the copy, which is how replicas report lag
+        beat()
+        primary = sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        try:
+            for alias in aliases:
+                started = time.perf_counter()
+                replica = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    primary.backup(replica)
+                finally:
+                    replica.close()
+                self.stdout.write(f'{alias}: synced in {(time.perf_counter() - started) * 1000:.0f}ms')
+        finally:
+            primary.close()
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:24
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+
+CATEGORY_FIELDS = [
+    'cleanliness_rating', 'communication_rating', 'check_in_rating',
+    'accuracy_rating', 'location_rating', 'value_rating',
+]
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    rows = (
+        Review.objects.order_by()
+        .values('listing_id')
+        .annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{field: Avg(field) for field in CATEGORY_FIELDS},
+        )
+    )
+    for row in rows:
+        values = {
+            'review_count': row['review_count'],
+            'rating_sum': row['rating_sum'],
+            'rating_average': row['rating_sum'] / row['review_count'],
+        }
+        for field in CATEGORY_FIELDS:
+            values[field.replace('_rating', '_average')] = row[field]
+        Listing.objects.filter(pk=row['listing_id']).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='accuracy_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='check_in_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='cleanliness_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='communication_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='location_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_average',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='value_average',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:26
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_booked_nights(apps, schema_editor):
+    """Occupy nights for existing active bookings, oldest booking first.
+    
+    Overlaps that slipped in before the constraint existed keep the night
+    with the earlier booking; the later one is left without that night.
+    """
+    Booking = apps.get_model('listings', 'Booking')
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    bookings = (
+        Booking.objects.filter(status__in=['pending', 'confirmed', 'completed'])
+        .order_by('created_at', 'id')
+        .values_list('id', 'listing_id', 'check_in_date', 'check_out_date')
+    )
+    batch = []
+    for booking_id, listing_id, check_in, check_out in bookings.iterator():
+        for offset in range((check_out - check_in).days):
+            batch.append(BookedNight(
+                listing_id=listing_id,
+                booking_id=booking_id,
+                night=check_in + timedelta(days=offset),
+            ))
+        if len(batch) >= 1000:
+            BookedNight.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    BookedNight.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_listing_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='listings.booking')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='listings.listing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('listing', 'night'), name='unique_listing_night')],
+            },
+        ),
+        migrations.RunPython(backfill_booked_nights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_booked_nights'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'check_in_date', 'check_out_date', 'status'], name='booking_overlap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['city', 'is_active', 'max_guests', 'price_per_night'], name='listing_search_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:33
+
+import math
+
+from django.db import migrations, models
+
+
+def backfill_geo_cells(apps, schema_editor):
+    """Number listings on the 0.1 degree grid used by listings.geo"""
+    Listing = apps.get_model('listings', 'Listing')
+    listings = Listing.objects.exclude(latitude=None).exclude(longitude=None)
+    batch = []
+    for listing in listings.only('pk', 'latitude', 'longitude').iterator():
+        row = min(1799, max(0, math.floor((float(listing.latitude) + 90) / 0.1)))
+        col = min(3599, max(0, math.floor((float(listing.longitude) + 180) / 0.1)))
+        listing.geo_cell = row * 3600 + col
+        batch.append(listing)
+        if len(batch) >= 1000:
+            Listing.objects.bulk_update(batch, ['geo_cell'])
+            batch = []
+    Listing.objects.bulk_update(batch, ['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='geo_cell',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_geo_cells, migrations.RunPython.noop),
+    ]
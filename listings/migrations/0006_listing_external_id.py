@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
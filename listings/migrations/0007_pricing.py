@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:56
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_listing_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='monthly_discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='weekly_discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.CreateModel(
+            name='PriceOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('price_per_night', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('label', models.CharField(blank=True, max_length=100)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_overrides', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'start_date'],
+                'indexes': [models.Index(fields=['listing', 'start_date'], name='price_override_listing_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_features(apps, schema_editor):
+    """Create a feature per distinct amenity and house rule and link listings to them"""
+    Listing = apps.get_model('listings', 'Listing')
+    Feature = apps.get_model('listings', 'Feature')
+    ListingFeature = apps.get_model('listings', 'ListingFeature')
+    features = {}
+    
+    def feature_id(kind, name):
+        key = ' '.join(name.split()).casefold()
+        if (kind, key) not in features:
+            feature, _ = Feature.objects.get_or_create(
+                kind=kind, key=key, defaults={'name': ' '.join(name.split())}
+            )
+            features[kind, key] = feature.pk
+        return features[kind, key]
+    
+    batch = set()
+    rows = Listing.objects.order_by('pk').values_list('pk', 'amenities', 'house_rules')
+    for pk, amenities, house_rules in rows.iterator(chunk_size=1000):
+        for kind, value in (('amenity', amenities), ('house_rule', house_rules)):
+            if isinstance(value, list):
+                for name in value:
+                    if isinstance(name, str) and name.strip():
+                        batch.add((pk, feature_id(kind, name)))
+        if len(batch) >= 1000:
+            ListingFeature.objects.bulk_create(
+                [ListingFeature(listing_id=pk, feature_id=fid) for pk, fid in batch],
+                ignore_conflicts=True,
+            )
+            batch = set()
+    ListingFeature.objects.bulk_create(
+        [ListingFeature(listing_id=pk, feature_id=fid) for pk, fid in batch],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('amenity', 'Amenity'), ('house_rule', 'House rule')], max_length=20)),
+                ('key', models.CharField(max_length=200)),
+                ('name', models.CharField(max_length=200)),
+            ],
+            options={
+                'ordering': ['kind', 'key'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='unique_feature_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ListingFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='listing_links', to='listings.feature')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feature_links', to='listings.listing')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='features',
+            field=models.ManyToManyField(blank=True, related_name='listings', through='listings.ListingFeature', to='listings.feature'),
+        ),
+        migrations.AddConstraint(
+            model_name='listingfeature',
+            constraint=models.UniqueConstraint(fields=('feature', 'listing'), name='unique_listing_feature'),
+        ),
+        migrations.RunPython(backfill_features, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_booking_lifecycle_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('month', models.DateField(editable=False)),
+                ('nights_booked', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('listing', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listing', 'month', 'date', 'nights_booked', 'revenue', 'cancellations', 'review_count', 'rating_sum'], name='listing_daily_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'date'), name='unique_listing_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+import math
+
+from django.db import migrations
+
+
+def resync_antimeridian_cells(apps, schema_editor):
+    """Move listings at longitude 180 from the first grid column to the last"""
+    Listing = apps.get_model('listings', 'Listing')
+    listings = Listing.objects.exclude(latitude=None).filter(longitude__gte=180)
+    batch = []
+    for listing in listings.only('pk', 'latitude').iterator():
+        row = min(1799, max(0, math.floor((float(listing.latitude) + 90) / 0.1)))
+        listing.geo_cell = row * 3600 + 3599
+        batch.append(listing)
+    Listing.objects.bulk_update(batch, ['geo_cell'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(resync_antimeridian_cells, migrations.RunPython.noop),
+    ]
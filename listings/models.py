@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Avg, Count, Sum
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from datetime import timedelta
+
+from .geo import cell_for
 
 
 class Listing(models.Model):
@@ -17,6 +21,9 @@ class Listing(models.Model):
         ('studio', 'Studio'),
     ]
     
+    # Partner feed key that imports upsert on; null for listings created here
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    
     title = models.CharField(max_length=200)
     description = models.TextField()
     address = models.CharField(max_length=500)
@@ -26,6 +33,8 @@ class Listing(models.Model):
     postal_code = models.CharField(max_length=20)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Grid cell of (latitude, longitude), see listings.geo
+    geo_cell = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
     
     property_type = models.CharField(max_length=20, choices=PROPERTY_TYPES)
     bedrooms = models.PositiveIntegerField()
@@ -35,36 +44,136 @@ class Listing(models.Model):
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
     cleaning_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     service_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Percentages taken off the nightly subtotal for stays of 7+ / 28+ nights
+    weekly_discount = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    monthly_discount = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
     
     amenities = models.JSONField(default=list, blank=True)
     house_rules = models.JSONField(default=list, blank=True)
+    # Indexed copy of amenities and house_rules, maintained on save; see listings.features
+    features = models.ManyToManyField(
+        'Feature', through='ListingFeature', related_name='listings', blank=True
+    )
     
     host = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
     
     is_active = models.BooleanField(default=True)
     is_instant_bookable = models.BooleanField(default=False)
     
+    # Denormalized review aggregates, maintained by listings.signals
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.FloatField(default=0, editable=False)
+    cleanliness_average = models.FloatField(null=True, blank=True, editable=False)
+    communication_average = models.FloatField(null=True, blank=True, editable=False)
+    check_in_average = models.FloatField(null=True, blank=True, editable=False)
+    accuracy_average = models.FloatField(null=True, blank=True, editable=False)
+    location_average = models.FloatField(null=True, blank=True, editable=False)
+    value_average = models.FloatField(null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Guest search: equality on city/is_active, range on max_guests
+            models.Index(
+                fields=['city', 'is_active', 'max_guests', 'price_per_night'],
+                name='listing_search_idx',
+            ),
+            # Keyset pagination on the default ordering
+            models.Index(fields=['created_at', 'id'], name='listing_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.city}, {self.country}"
     
+    def save(self, *args, **kwargs):
+        """Keep the geo grid cell and the feature links in step with the row"""
+        self.geo_cell = cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geo_cell'}
+        features_changed = update_fields is None or bool(FEATURE_FIELDS.intersection(update_fields))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if features_changed:
+                from .features import sync_features
+                sync_features([(self.pk, self.amenities, self.house_rules)])
+    
     @property
     def average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / reviews.count()
-        return 0
+        """Average overall rating, read from the stored aggregate"""
+        return self.rating_average
     
     @property
     def total_reviews(self):
-        """Get total number of reviews"""
-        return self.reviews.count()
+        """Total number of reviews, read from the stored aggregate"""
+        return self.review_count
+    
+    @classmethod
+    def refresh_rating_aggregates(cls, listing_ids=None, batch_size=1000):
+        """Recompute stored review aggregates from the Review table.
+        
+        Only the given listings are refreshed when ``listing_ids`` is passed;
+        otherwise every listing is rebuilt in batches. Only listings whose
+        aggregates changed are written. Returns the number of listings
+        checked.
+        """
+        queryset = cls.objects.order_by('pk')
+        if listing_ids is not None:
+            queryset = queryset.filter(pk__in=list(listing_ids))
+        
+        updated = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                # Lock the batch so concurrent review writes cannot interleave
+                # between the aggregate read and the update.
+                batch = list(
+                    queryset.select_for_update()
+                    .filter(pk__gt=last_pk)
+                    .only('pk', *RATING_AGGREGATE_FIELDS)[:batch_size]
+                )
+                if not batch:
+                    return updated
+                last_pk = batch[-1].pk
+                
+                stats = {
+                    row['listing_id']: row
+                    for row in Review.objects.filter(listing__in=batch)
+                    .order_by()
+                    .values('listing_id')
+                    .annotate(**REVIEW_AGGREGATES)
+                }
+                changed = []
+                for listing in batch:
+                    before = [getattr(listing, field) for field in RATING_AGGREGATE_FIELDS]
+                    listing.apply_rating_aggregates(stats.get(listing.pk))
+                    if [getattr(listing, field) for field in RATING_AGGREGATE_FIELDS] != before:
+                        changed.append(listing)
+                # A sweep over consistent listings writes nothing
+                if changed:
+                    cls.objects.bulk_update(changed, RATING_AGGREGATE_FIELDS)
+            updated += len(batch)
+    
+    def apply_rating_aggregates(self, stats=None):
+        """Copy a row of REVIEW_AGGREGATES onto the aggregate fields"""
+        stats = stats or {}
+        self.review_count = stats.get('review_count') or 0
+        self.rating_sum = stats.get('rating_sum') or 0
+        self.rating_average = (
+            self.rating_sum / self.review_count if self.review_count else 0
+        )
+        for field in RATING_CATEGORY_FIELDS:
+            setattr(self, field.replace('_rating', '_average'), stats.get(field))
 
 
 class Booking(models.Model):
@@ -77,6 +186,9 @@ class Booking(models.Model):
         ('completed', 'Completed'),
     ]
     
+    # Statuses that occupy the booked nights
+    ACTIVE_STATUSES = ('pending', 'confirmed', 'completed')
+    
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='bookings')
     guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
     
@@ -94,21 +206,180 @@ class Booking(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Overlap probes: listing equality, then a range on the stay
+            models.Index(
+                fields=['listing', 'check_in_date', 'check_out_date', 'status'],
+                name='booking_overlap_idx',
+            ),
+            # Keyset pagination, overall and within one guest's history
+            models.Index(fields=['created_at', 'id'], name='booking_created_idx'),
+            models.Index(fields=['guest', 'created_at', 'id'], name='booking_guest_created_idx'),
+            # Date ranges on their own: admin date hierarchy and filters, exports
+            models.Index(fields=['check_in_date'], name='booking_check_in_idx'),
+            # Lifecycle jobs: stays past check-out, and stale pending bookings
+            models.Index(fields=['status', 'check_out_date', 'id'], name='booking_status_checkout_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='booking_status_created_idx'),
+        ]
     
     def __str__(self):
         return f"Booking {self.id} - {self.listing.title} ({self.check_in_date} to {self.check_out_date})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded stay so unchanged bookings skip the night sync"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stay = instance.stay_key()
+        return instance
+    
+    def stay_key(self):
+        """The fields that decide which nights this booking occupies"""
+        return (
+            self.__dict__.get('listing_id'),
+            self.__dict__.get('check_in_date'),
+            self.__dict__.get('check_out_date'),
+            self.__dict__.get('status'),
+        )
+    
+    @property
+    def holds_nights(self):
+        """Whether this booking blocks its nights for other guests"""
+        return self.status in self.ACTIVE_STATUSES
+    
+    def night_dates(self):
+        """Every night of the stay, check-in inclusive and check-out exclusive"""
+        return [
+            self.check_in_date + timedelta(days=offset)
+            for offset in range((self.check_out_date - self.check_in_date).days)
+        ]
+    
     def save(self, *args, **kwargs):
-        """Calculate total price before saving"""
+        """Price the stay and sync occupied nights before saving.
+        
+        Raises IntegrityError when another active booking already holds one
+        of the nights; listings.availability.reserve() turns that into
+        NightsUnavailable.
+        """
         if not self.total_price:
-            nights = (self.check_out_date - self.check_in_date).days
-            self.total_price = (
-                self.listing.price_per_night * nights +
-                self.listing.cleaning_fee +
-                self.listing.service_fee
-            )
-        super().save(*args, **kwargs)
+            from .pricing import quote
+            self.total_price = quote(self.listing_id, self.check_in_date, self.check_out_date).total
+        update_fields = kwargs.get('update_fields')
+        stay_changed = getattr(self, '_loaded_stay', None) != self.stay_key()
+        if update_fields is not None and not STAY_FIELDS.intersection(update_fields):
+            stay_changed = False
+        adding = self._state.adding
+        # No savepoint: like Model.save(), an error inside an outer
+        # transaction is left for that transaction to roll back
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if stay_changed:
+                self.sync_booked_nights(replace=not adding)
+        self._loaded_stay = self.stay_key()
+    
+    def sync_booked_nights(self, replace=True):
+        """Replace this booking's rows in the night occupancy table.
+        
+        ``replace=False`` skips deleting the old rows, for a booking that has
+        just been inserted and cannot have any yet.
+        """
+        if replace:
+            BookedNight.objects.filter(booking=self).delete()
+        if self.holds_nights:
+            BookedNight.objects.bulk_create([
+                BookedNight(listing_id=self.listing_id, booking=self, night=night)
+                for night in self.night_dates()
+            ])
+
+
+class PriceOverride(models.Model):
+    """Nightly price for a listing over [start_date, end_date).
+    
+    A single-night range overrides one date; longer ranges model seasons.
+    """
+    
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='price_overrides')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
+    label = models.CharField(max_length=100, blank=True)
+    
+    class Meta:
+        ordering = ['listing', 'start_date']
+        indexes = [
+            models.Index(fields=['listing', 'start_date'], name='price_override_listing_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing_id}: {self.price_per_night} from {self.start_date} to {self.end_date}"
+
+
+STAY_FIELDS = {'listing', 'listing_id', 'check_in_date', 'check_out_date', 'status'}
+
+FEATURE_FIELDS = {'amenities', 'house_rules'}
+
+
+class Feature(models.Model):
+    """A canonical amenity or house rule, shared by every listing that has it.
+    
+    ``key`` is the case- and whitespace-folded name that filters match on;
+    ``name`` keeps the spelling first seen.
+    """
+    
+    KINDS = [
+        ('amenity', 'Amenity'),
+        ('house_rule', 'House rule'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KINDS)
+    key = models.CharField(max_length=200)
+    name = models.CharField(max_length=200)
+    
+    class Meta:
+        ordering = ['kind', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='unique_feature_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.name}"
+
+
+class ListingFeature(models.Model):
+    """Links a listing to one of the features in its JSON lists"""
+    
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='feature_links')
+    # Covered by the (feature, listing) unique index below
+    feature = models.ForeignKey(Feature, on_delete=models.CASCADE, related_name='listing_links', db_index=False)
+    
+    class Meta:
+        constraints = [
+            # Also the lookup index: feature equality, then listing ids in order
+            models.UniqueConstraint(fields=['feature', 'listing'], name='unique_listing_feature'),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing_id} has {self.feature_id}"
+
+
+class BookedNight(models.Model):
+    """One night of a listing occupied by an active booking.
+    
+    The unique (listing, night) constraint is what guarantees that two
+    bookings can never hold the same night, whatever the database backend.
+    """
+    
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='booked_nights')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='booked_nights')
+    night = models.DateField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'night'], name='unique_listing_night'),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing_id} @ {self.night} (booking {self.booking_id})"
 
 
 class Review(models.Model):
@@ -152,8 +423,164 @@ class Review(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
         unique_together = ['listing', 'guest', 'booking']
+        indexes = [
+            # Keyset pagination, overall and within one listing's reviews
+            models.Index(fields=['created_at', 'id'], name='review_created_idx'),
+            models.Index(fields=['listing', 'created_at', 'id'], name='review_listing_created_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded listing so a move can refresh both listings"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_listing_id = instance.__dict__.get('listing_id')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Save and refresh listing aggregates in a single transaction"""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        """Delete and refresh listing aggregates in a single transaction"""
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
     
     def __str__(self):
         return f"Review by {self.guest.username} for {self.listing.title} - {self.rating}/5"
+
+
+RATING_CATEGORY_FIELDS = [
+    'cleanliness_rating', 'communication_rating', 'check_in_rating',
+    'accuracy_rating', 'location_rating', 'value_rating',
+]
+
+RATING_AGGREGATE_FIELDS = [
+    'review_count', 'rating_sum', 'rating_average',
+] + [field.replace('_rating', '_average') for field in RATING_CATEGORY_FIELDS]
+
+# Aggregate expressions over a Review queryset, keyed like the Listing fields
+# they feed (category averages keep the Review field name).
+REVIEW_AGGREGATES = {
+    'review_count': Count('id'),
+    'rating_sum': Sum('rating'),
+    **{field: Avg(field) for field in RATING_CATEGORY_FIELDS},
+}
+
+
+class Job(models.Model):
+    """A run of a background job, claimed by one worker process at a time.
+    
+    ``key`` makes enqueueing idempotent: each scheduled slot of a periodic
+    job gets one row however many workers race to create it. ``cursor`` is
+    saved with every batch, so a run whose worker died resumes where that
+    worker stopped once its lease (``locked_until``) runs out.
+    """
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=200, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    run_after = models.DateTimeField(default=timezone.now)
+    
+    cursor = models.JSONField(default=dict, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            # Claiming: due queued jobs, and running jobs whose lease ran out
+            models.Index(fields=['status', 'run_after'], name='job_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+class ListingDailyStats(models.Model):
+    """One listing's bookings, revenue and reviews on one day.
+    
+    A rollup for host analytics, kept current by listings.signals and
+    rebuilt by ``manage.py backfill_daily_stats``; see listings/analytics.py.
+    """
+    
+    # Covered by the (listing, date) unique index below
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='daily_stats', db_index=False)
+    date = models.DateField()
+    # First day of ``date``'s month, so monthly reports group on a plain column
+    month = models.DateField(editable=False)
+    
+    # Confirmed or completed stays occupying the night, and their share of the price
+    nights_booked = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Cancelled bookings that would have checked in on this day
+    cancellations = models.PositiveIntegerField(default=0)
+    # Reviews written on this day
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            # Also the index the incremental upserts conflict on
+            models.UniqueConstraint(fields=['listing', 'date'], name='unique_listing_day'),
+        ]
+        indexes = [
+            # Monthly reports: covering, and already in GROUP BY (listing, month) order
+            models.Index(
+                fields=[
+                    'listing', 'month', 'date', 'nights_booked', 'revenue',
+                    'cancellations', 'review_count', 'rating_sum',
+                ],
+                name='listing_daily_month_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing_id} on {self.date}"
+
+
+class IdempotencyKey(models.Model):
+    """The response to a request sent with an ``Idempotency-Key`` header.
+    
+    A client retrying with the same key gets this response back instead of
+    a second booking. ``request_hash`` fingerprints the request body, so a
+    key reused for a different request is refused rather than replayed.
+    """
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_index=False)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            # Keys are chosen by clients, so they are only unique per user
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            # Purging keys past IDEMPOTENCY_KEY_TTL_HOURS
+            models.Index(fields=['created_at', 'id'], name='idempotency_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
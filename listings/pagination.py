@@ -0,0 +1,135 @@
+"""Keyset (cursor) pagination on ``(created_at, id)``, or another sort key.
+
+Pages are found with ``WHERE (created_at, id) < (cursor)`` against a
+composite index instead of ``OFFSET``, so page N costs the same as page 1
+and rows inserted while a client pages through do not shift later pages.
+"""
+from base64 import b64decode, b64encode
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first cursor pagination with ``next``/``previous`` links"""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Sort key and unique tie-breaker; both must be covered by one index
+    ordering = ('-created_at', '-id')
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 20
+        value = request.query_params.get(self.page_size_query_param, '')
+        if value.isdigit() and int(value) > 0:
+            page_size = min(int(value), self.max_page_size)
+        return page_size
+
+    def parse_key(self, value):
+        """The sort key from its cursor form"""
+        return datetime.fromisoformat(value)
+
+    def format_key(self, value):
+        """The sort key in cursor form"""
+        return value.isoformat()
+
+    def decode_cursor(self, request):
+        """Return (reverse, sort key, pk), or None on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            direction, value, pk = force_str(b64decode(encoded.encode('ascii'))).split('|')
+            return direction == 'p', self.parse_key(value), int(pk)
+        except (TypeError, ValueError, UnicodeError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, reverse, instance):
+        """Link to the page after (or before) ``instance``, a model or a values() dict"""
+        key, tie = (name.lstrip('-') for name in self.ordering)
+        if isinstance(instance, dict):
+            value, pk = instance[key], instance[tie]
+        else:
+            value, pk = getattr(instance, key), getattr(instance, tie)
+        raw = f"{'p' if reverse else 'n'}|{self.format_key(value)}|{pk}"
+        encoded = b64encode(raw.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        key, tie = (name.lstrip('-') for name in self.ordering)
+        descending = self.ordering[0].startswith('-')
+        reverse = cursor is not None and cursor[0]
+
+        # Walking backwards flips both the sort and the comparison
+        ordering = self.ordering if not reverse else tuple(
+            name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            _, value, pk = cursor
+            op = 'lt' if descending != reverse else 'gt'
+            # The first condition is a plain range on the index; the second
+            # only breaks ties between rows sharing the cursor's sort key.
+            queryset = queryset.filter(**{f'{key}__{op}e': value}).filter(
+                Q(**{f'{key}__{op}': value}) | Q(**{f'{tie}__{op}': pk})
+            )
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_url = self.previous_url = None
+        if rows:
+            if has_more or reverse:
+                self.next_url = self.encode_cursor(False, rows[-1])
+            if (has_more and reverse) or (cursor is not None and not reverse):
+                self.previous_url = self.encode_cursor(True, rows[0])
+        elif cursor is not None:
+            # Paged past the end (or start): offer a way back to the first page
+            self.previous_url = remove_query_param(self.base_url, self.cursor_query_param)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_url,
+            'previous': self.previous_url,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CheapestFirstPagination(KeysetPagination):
+    """Cursor pagination on ``(price_per_night, id)``, cheapest first, for search results"""
+
+    ordering = ('price_per_night', 'id')
+
+    def parse_key(self, value):
+        return Decimal(value)
+
+    def format_key(self, value):
+        return str(value)
@@ -0,0 +1,215 @@
+"""Price quotes for stays, computed in batch from cached per-listing pricing.
+
+A listing's pricing data (base nightly rate, fees, length-of-stay discounts
+and its PriceOverride ranges) is loaded once and kept in the response cache
+under ``pricing:listing:<pk>:<stamp>``, with ``version:pricing:<pk>`` holding
+the current stamp like the listing versions in ``caching``. Signals replace
+the stamp whenever the listing or one of its overrides changes; bulk writers
+call ``invalidate`` directly. Readers key what they load on the stamp they
+read first, so pricing loaded before a write commits is never served after.
+"""
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from alx_travel_app.routers import primary_only
+
+from .caching import acurrent_versions, bump_versions, current_versions, get_cache
+from .models import Listing, PriceOverride
+
+CACHE_PREFIX = 'pricing:listing:'
+CACHE_TIMEOUT = 60 * 60
+
+WEEKLY_NIGHTS = 7
+MONTHLY_NIGHTS = 28
+
+CENTS = Decimal('0.01')
+
+PRICING_FIELDS = [
+    'id', 'price_per_night', 'cleaning_fee', 'service_fee',
+    'weekly_discount', 'monthly_discount',
+]
+
+# Cached per listing; ``overrides`` is a tuple of (start, end, price) sorted by start
+Pricing = namedtuple('Pricing', PRICING_FIELDS[1:] + ['overrides'])
+
+
+class Quote(namedtuple('Quote', [
+    'check_in', 'check_out', 'nights', 'nightly_subtotal', 'discount',
+    'cleaning_fee', 'service_fee', 'total',
+])):
+    """Price breakdown for one stay"""
+
+    __slots__ = ()
+
+    def as_dict(self):
+        """JSON-ready breakdown with decimals as strings, like DRF renders them"""
+        return {
+            'check_in': self.check_in.isoformat(),
+            'check_out': self.check_out.isoformat(),
+            'nights': self.nights,
+            'nightly_subtotal': str(self.nightly_subtotal),
+            'discount': str(self.discount),
+            'cleaning_fee': str(self.cleaning_fee),
+            'service_fee': str(self.service_fee),
+            'total': str(self.total),
+        }
+
+
+def version_key(listing_id):
+    return f'version:pricing:{listing_id}'
+
+
+def cache_key(listing_id, version):
+    return f'{CACHE_PREFIX}{listing_id}:{version}'
+
+
+def pricing_keys(listing_ids, versions):
+    """{cache key: listing id} under the stamps in ``versions``"""
+    return {cache_key(pk, versions[version_key(pk)]): pk for pk in listing_ids}
+
+
+def invalidate(listing_ids):
+    """Move the given listings' pricing to new stamps, now and on commit.
+    
+    A reader that loaded pricing before this transaction committed stores
+    it under a stamp the commit replaces, so nobody reads it back.
+    """
+    bump_versions([version_key(pk) for pk in listing_ids])
+
+
+def pricing_rows(listing_ids):
+    """The two querysets pricing is built from: listings and their overrides"""
+    listings = Listing.objects.filter(pk__in=listing_ids).order_by().values_list(*PRICING_FIELDS)
+    overrides = (
+        PriceOverride.objects.filter(listing_id__in=listing_ids)
+        .order_by('listing_id', 'start_date')
+        .values_list('listing_id', 'start_date', 'end_date', 'price_per_night')
+    )
+    return listings, overrides
+
+
+def build_pricing(listing_ids, listing_rows, override_rows):
+    """{listing id: Pricing} from rows of the querysets in pricing_rows()"""
+    overrides = {pk: [] for pk in listing_ids}
+    for listing_id, start, end, price in override_rows:
+        overrides[listing_id].append((start, end, price))
+    return {
+        row[0]: Pricing(*row[1:], overrides=tuple(overrides[row[0]]))
+        for row in listing_rows
+    }
+
+
+def load_pricing(listing_ids):
+    """Read pricing for ``listing_ids`` from the database, two queries total"""
+    listings, overrides = pricing_rows(listing_ids)
+    return build_pricing(listing_ids, list(listings), list(overrides))
+
+
+async def aload_pricing(listing_ids):
+    """``load_pricing`` with the async ORM"""
+    listings, overrides = pricing_rows(listing_ids)
+    return build_pricing(
+        listing_ids, [row async for row in listings], [row async for row in overrides]
+    )
+
+
+def get_pricing(listing_ids):
+    """Pricing for each listing id, from the cache where possible"""
+    cache = get_cache()
+    listing_ids = set(listing_ids)
+    # Stamps first: rows loaded below are stored under these, never newer ones
+    keys = pricing_keys(listing_ids, current_versions([version_key(pk) for pk in listing_ids]))
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = {pk: key for key, pk in keys.items() if pk not in found}
+    if missing:
+        # Read from the primary: pricing stays cached until the next write
+        with primary_only():
+            loaded = load_pricing(list(missing))
+        cache.set_many({missing[pk]: value for pk, value in loaded.items()}, CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+async def aget_pricing(listing_ids):
+    """``get_pricing`` with the async cache and ORM"""
+    cache = get_cache()
+    listing_ids = set(listing_ids)
+    keys = pricing_keys(listing_ids, await acurrent_versions([version_key(pk) for pk in listing_ids]))
+    found = {keys[key]: value for key, value in (await cache.aget_many(keys)).items()}
+    missing = {pk: key for key, pk in keys.items() if pk not in found}
+    if missing:
+        with primary_only():
+            loaded = await aload_pricing(list(missing))
+        await cache.aset_many({missing[pk]: value for pk, value in loaded.items()}, CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+def nightly_rates(pricing, check_in, check_out):
+    """Price of each night in [check_in, check_out); later overrides win"""
+    nights = (check_out - check_in).days
+    rates = [pricing.price_per_night] * nights
+    for start, end, price in pricing.overrides:
+        if end <= check_in or start >= check_out:
+            continue
+        first = max((start - check_in).days, 0)
+        last = min((end - check_in).days, nights)
+        rates[first:last] = [price] * (last - first)
+    return rates
+
+
+def discount_rate(pricing, nights):
+    """Length-of-stay discount as a percentage"""
+    if nights >= MONTHLY_NIGHTS and pricing.monthly_discount:
+        return pricing.monthly_discount
+    if nights >= WEEKLY_NIGHTS:
+        return pricing.weekly_discount
+    return Decimal('0')
+
+
+def price_stay(pricing, check_in, check_out):
+    """Build the Quote for one listing's pricing and stay"""
+    nights = (check_out - check_in).days
+    if nights <= 0:
+        raise ValueError('Check-out date must be after check-in date')
+    subtotal = sum(nightly_rates(pricing, check_in, check_out), Decimal('0'))
+    discount = (subtotal * discount_rate(pricing, nights) / 100).quantize(CENTS, ROUND_HALF_UP)
+    total = subtotal - discount + pricing.cleaning_fee + pricing.service_fee
+    return Quote(
+        check_in=check_in,
+        check_out=check_out,
+        nights=nights,
+        nightly_subtotal=subtotal.quantize(CENTS, ROUND_HALF_UP),
+        discount=discount,
+        cleaning_fee=pricing.cleaning_fee,
+        service_fee=pricing.service_fee,
+        total=total.quantize(CENTS, ROUND_HALF_UP),
+    )
+
+
+def quote_many(listing_ids, check_in, check_out):
+    """Quotes for many listings over one date window, keyed by listing id.
+
+    Listings that do not exist are left out of the result.
+    """
+    return {
+        pk: price_stay(pricing, check_in, check_out)
+        for pk, pricing in get_pricing(listing_ids).items()
+    }
+
+
+async def aquote_many(listing_ids, check_in, check_out):
+    """``quote_many`` with the async cache and ORM"""
+    return {
+        pk: price_stay(pricing, check_in, check_out)
+        for pk, pricing in (await aget_pricing(listing_ids)).items()
+    }
+
+
+def quote(listing_id, check_in, check_out):
+    """Quote a single stay; raises Listing.DoesNotExist for unknown ids"""
+    try:
+        return quote_many([listing_id], check_in, check_out)[listing_id]
+    except KeyError:
+        raise Listing.DoesNotExist(f'Listing {listing_id} does not exist') from None
+
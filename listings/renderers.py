@@ -0,0 +1,47 @@
+"""JSON renderer that encodes with orjson when it is installed.
+
+The output is the same bytes ``rest_framework.renderers.JSONRenderer``
+produces for compact responses. Anything orjson cannot reproduce exactly
+(indented output, ASCII-only output, values it rejects) goes through the
+stock renderer instead.
+
+One known difference: orjson writes floats below 1e-4 or from 1e16 up
+without the exponent sign and padding Python uses (``1e-5`` vs ``1e-05``).
+The API's floats are rating averages and rounded distances, which never
+fall in those ranges.
+"""
+from rest_framework.renderers import JSONRenderer
+
+from alx_travel_app.instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+if orjson is not None:
+    # Datetimes go through the DRF encoder, which writes UTC as "Z"
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in ``JSONRenderer`` backed by orjson for compact output"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Match JSONRenderer, which always escapes these two separators
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,39 @@
+"""
+Query layer for guest search over listings and their bookings.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import Listing, Booking
+
+
+def overlapping_bookings(check_in, check_out):
+    """Active bookings of the outer listing that overlap [check_in, check_out).
+    
+    Meant to be used as a correlated subquery; it is served by
+    ``booking_overlap_idx`` on (listing, check_in_date, check_out_date, status).
+    """
+    return Booking.objects.filter(
+        listing=OuterRef('pk'),
+        check_in_date__lt=check_out,
+        check_out_date__gt=check_in,
+        status__in=Booking.ACTIVE_STATUSES,
+    )
+
+
+def available_listings(check_in, check_out, city=None, guests=None, queryset=None):
+    """Return active listings free for every night in [check_in, check_out).
+    
+    Filters on ``city`` and ``max_guests`` use ``listing_search_idx`` and the
+    date window becomes an indexed anti-join against overlapping bookings.
+    Results are ordered cheapest first.
+    """
+    if queryset is None:
+        queryset = Listing.objects.all()
+    queryset = queryset.filter(is_active=True)
+    if city:
+        queryset = queryset.filter(city=city)
+    if guests:
+        queryset = queryset.filter(max_guests__gte=guests)
+    return queryset.filter(
+        ~Exists(overlapping_bookings(check_in, check_out))
+    ).order_by('price_per_night', 'id')
@@ -0,0 +1,314 @@
+"""
+Sample data shared by the seed command, and row builders for its bulk mode.
+
+Bulk mode is deterministic and shardable: every listing draws from its own
+``random.Random`` keyed by (seed, listing index), primary keys and
+timestamps are derived rather than assigned by the database, and each
+listing's share of bookings and reviews is fixed up front. A shard of
+listing indexes therefore produces the same rows whichever process builds
+it, and the writer inserting shards in order yields an identical dataset
+for any number of workers.
+"""
+import random
+from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils.crypto import RANDOM_STRING_CHARS
+
+from .bulk import prepare_rows
+from .geo import cell_for
+from .models import Listing, Booking, BookedNight, Review, RATING_CATEGORY_FIELDS
+
+DEFAULT_PASSWORD = 'password123'
+
+CITIES = [
+    ('New York', 'NY', 'USA'),
+    ('Los Angeles', 'CA', 'USA'),
+    ('Chicago', 'IL', 'USA'),
+    ('Miami', 'FL', 'USA'),
+    ('San Francisco', 'CA', 'USA'),
+    ('Paris', 'Île-de-France', 'France'),
+    ('London', 'England', 'UK'),
+    ('Tokyo', 'Tokyo', 'Japan'),
+    ('Sydney', 'NSW', 'Australia'),
+    ('Toronto', 'ON', 'Canada'),
+]
+
+PREMIUM_CITIES = ['New York', 'San Francisco', 'Paris', 'London']
+
+PROPERTY_TYPES = ['apartment', 'house', 'villa', 'cabin', 'condo', 'loft', 'studio']
+
+AMENITIES_OPTIONS = [
+    ['WiFi', 'Kitchen', 'Free parking'],
+    ['WiFi', 'Kitchen', 'Pool', 'Gym'],
+    ['WiFi', 'Kitchen', 'Air conditioning', 'Heating'],
+    ['WiFi', 'Kitchen', 'Washer', 'Dryer'],
+    ['WiFi', 'Kitchen', 'Balcony', 'Garden'],
+    ['WiFi', 'Kitchen', 'Hot tub', 'Fireplace'],
+]
+
+HOUSE_RULES_OPTIONS = [
+    ['No smoking', 'No pets'],
+    ['No smoking', 'No parties'],
+    ['No smoking', 'Quiet hours after 10 PM'],
+    ['No smoking', 'No shoes inside'],
+    ['No smoking', 'No loud music'],
+]
+
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Elm St']
+
+SPECIAL_REQUESTS = [
+    '', 'Early check-in if possible', 'Late check-out requested',
+    'Extra towels needed', 'Quiet room preferred',
+]
+
+COMMENTS = [
+    'Great place to stay! Very clean and comfortable.',
+    'Perfect location, easy access to everything.',
+    'The host was very responsive and helpful.',
+    'Beautiful property, exactly as described.',
+    'Highly recommend this place for your stay.',
+    'Excellent value for money.',
+    'The amenities were top-notch.',
+    'Very peaceful and quiet neighborhood.',
+    'The check-in process was smooth.',
+    'Would definitely stay here again!',
+    'The place was spotless and well-maintained.',
+    'Great communication with the host.',
+    'Perfect for our family vacation.',
+    'The location was ideal for exploring the city.',
+    'Very comfortable beds and good amenities.',
+]
+
+
+def share(total, parts, index):
+    """Split ``total`` as evenly as possible over ``parts``; return part ``index``"""
+    return total // parts + (1 if index < total % parts else 0)
+
+
+def share_offset(total, parts, index):
+    """Sum of share() for every part before ``index``"""
+    return index * (total // parts) + min(index, total % parts)
+
+
+# User fields set by build_user, in checksum order
+USER_COLUMNS = ['username', 'email', 'first_name', 'last_name', 'password', 'date_joined']
+
+
+def password_salt(seed):
+    """A full-length password salt derived from the seed, for reproducible hashes"""
+    rng = random.Random(f'{seed}:password')
+    return ''.join(rng.choice(RANDOM_STRING_CHARS) for _ in range(22))
+
+
+def build_user(index, password_hash, timestamp):
+    """Sample user number ``index`` (0-based) with a precomputed password hash"""
+    return User(
+        username=f'user{index+1}',
+        email=f'user{index+1}@example.com',
+        first_name=f'First{index+1}',
+        last_name=f'Last{index+1}',
+        password=password_hash,
+        date_joined=timestamp,
+    )
+
+
+def build_listing(rng, pk, host_id):
+    """Sample listing with realistic pricing for its type and city"""
+    city, state, country = rng.choice(CITIES)
+    property_type = rng.choice(PROPERTY_TYPES)
+    
+    base_price = rng.randint(50, 300)
+    if property_type in ['villa', 'house']:
+        base_price *= 1.5
+    if city in PREMIUM_CITIES:
+        base_price *= 1.8
+    
+    latitude = Decimal(f'{rng.uniform(20, 60):.6f}')
+    longitude = Decimal(f'{rng.uniform(-180, 180):.6f}')
+    return Listing(
+        pk=pk,
+        title=f'Beautiful {property_type.title()} in {city}',
+        description=f'Stunning {property_type} located in the heart of {city}. '
+                    f'Perfect for your next vacation with all the amenities you need.',
+        address=f'{rng.randint(100, 9999)} {rng.choice(STREETS)}',
+        city=city,
+        state=state,
+        country=country,
+        postal_code=f'{rng.randint(10000, 99999)}',
+        latitude=latitude,
+        longitude=longitude,
+        geo_cell=cell_for(latitude, longitude),
+        property_type=property_type,
+        bedrooms=rng.randint(1, 5),
+        bathrooms=rng.randint(1, 3),
+        max_guests=rng.randint(2, 8),
+        price_per_night=Decimal(str(base_price)).quantize(Decimal('0.01')),
+        cleaning_fee=Decimal(rng.randint(20, 100)),
+        service_fee=Decimal(rng.randint(10, 50)),
+        amenities=rng.choice(AMENITIES_OPTIONS),
+        house_rules=rng.choice(HOUSE_RULES_OPTIONS),
+        host_id=host_id,
+        is_active=rng.choice([True, True, True, False]),  # 75% active
+        is_instant_bookable=rng.choice([True, False]),
+    )
+
+
+def stay_status(rng, check_in, check_out, today):
+    """Status consistent with where the stay falls relative to today"""
+    if check_out <= today:
+        return 'completed' if rng.random() < 0.85 else 'cancelled'
+    if check_in <= today:
+        return 'confirmed'
+    return rng.choices(['confirmed', 'pending', 'cancelled'], weights=[60, 25, 15])[0]
+
+
+def build_stays(rng, listing, count, review_quota, booking_pk, guest_ids, today):
+    """Non-overlapping bookings for one listing, with their nights and reviews.
+    
+    Bookings are laid end to end from a year before ``today`` with small
+    random gaps, so they never collide in the night occupancy table. Up to
+    ``review_quota`` completed bookings get a review. ``total_price`` is
+    computed here rather than in Booking.save(). Returns
+    ``(bookings, nights, reviews)``, with nights as ``NIGHT_COLUMNS`` tuples.
+    """
+    bookings, nights, reviews = [], [], []
+    cursor = today - timedelta(days=365)
+    for offset in range(count):
+        check_in = cursor + timedelta(days=rng.randint(0, 7))
+        stay = rng.randint(1, 14)
+        check_out = check_in + timedelta(days=stay)
+        cursor = check_out
+        
+        guest_id = rng.choice(guest_ids)
+        if guest_id == listing.host_id and len(guest_ids) > 1:
+            guest_id = guest_ids[(guest_ids.index(guest_id) + 1) % len(guest_ids)]
+        
+        booking = Booking(
+            pk=booking_pk + offset,
+            listing_id=listing.pk,
+            guest_id=guest_id,
+            check_in_date=check_in,
+            check_out_date=check_out,
+            number_of_guests=rng.randint(1, listing.max_guests),
+            total_price=listing.price_per_night * stay + listing.cleaning_fee + listing.service_fee,
+            status=stay_status(rng, check_in, check_out, today),
+            special_requests=rng.choice(SPECIAL_REQUESTS),
+        )
+        bookings.append(booking)
+        
+        if booking.holds_nights:
+            nights.extend(
+                (listing.pk, booking.pk, night) for night in booking.night_dates()
+            )
+        
+        if booking.status == 'completed' and len(reviews) < review_quota:
+            reviews.append(Review(
+                listing_id=listing.pk,
+                guest_id=guest_id,
+                booking_id=booking.pk,
+                rating=rng.randint(3, 5),  # Mostly positive reviews
+                comment=rng.choice(COMMENTS),
+                cleanliness_rating=rng.randint(3, 5),
+                communication_rating=rng.randint(3, 5),
+                check_in_rating=rng.randint(3, 5),
+                accuracy_rating=rng.randint(3, 5),
+                location_rating=rng.randint(3, 5),
+                value_rating=rng.randint(3, 5),
+            ))
+    return bookings, nights, reviews
+
+
+def review_stats(reviews):
+    """Rating aggregates for a listing's reviews, shaped like REVIEW_AGGREGATES"""
+    stats = {
+        'review_count': len(reviews),
+        'rating_sum': sum(review.rating for review in reviews),
+    }
+    for field in RATING_CATEGORY_FIELDS:
+        values = [getattr(review, field) for review in reviews if getattr(review, field) is not None]
+        stats[field] = sum(values) / len(values) if values else None
+    return stats
+
+
+# Column order of the night tuples produced by build_stays()
+NIGHT_COLUMNS = ['listing_id', 'booking_id', 'night']
+
+
+def table_columns(model, exclude=()):
+    """Attribute names of a model's concrete columns, in declaration order"""
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname not in exclude
+    ]
+
+
+# Tables written per shard, in foreign key order. Listings and bookings carry
+# derived primary keys; reviews and nights use the database's.
+SHARD_TABLES = [
+    (Listing, table_columns(Listing)),
+    (Booking, table_columns(Booking)),
+    (BookedNight, NIGHT_COLUMNS),
+    (Review, table_columns(Review, exclude={'id'})),
+]
+
+
+def instance_rows(instances, columns, timestamp):
+    """Tuples of column values, filling unset timestamps with ``timestamp``"""
+    rows = []
+    for instance in instances:
+        values = []
+        for column in columns:
+            value = getattr(instance, column)
+            if value is None and column in ('created_at', 'updated_at'):
+                value = timestamp
+            values.append(value)
+        rows.append(tuple(values))
+    return rows
+
+
+def seed_timestamp(as_of):
+    """The created/updated timestamp stamped on rows seeded as of a date"""
+    return datetime.combine(as_of, time(12), tzinfo=timezone.utc)
+
+
+def generate_shard(job):
+    """Build prepared rows for listing indexes ``job['first']`` to ``job['last']``.
+    
+    Runs in worker processes, so it takes and returns only picklable data and
+    never touches the database. Returns ``[(model, columns, rows), ...]`` in
+    SHARD_TABLES order.
+    """
+    counts, base = job['counts'], job['base_pks']
+    timestamp = seed_timestamp(job['as_of'])
+    listings, bookings, nights, reviews = [], [], [], []
+    for index in range(job['first'], job['last']):
+        rng = random.Random(f"{job['seed']}:{index}")
+        listing = build_listing(rng, base['listing'] + index, rng.choice(job['user_ids']))
+        stays, stay_nights, stay_reviews = build_stays(
+            rng, listing,
+            share(counts['bookings'], counts['listings'], index),
+            share(counts['reviews'], counts['listings'], index),
+            base['booking'] + share_offset(counts['bookings'], counts['listings'], index),
+            job['user_ids'], job['as_of'],
+        )
+        listing.apply_rating_aggregates(review_stats(stay_reviews))
+        listings.append(listing)
+        bookings.extend(stays)
+        nights.extend(stay_nights)
+        reviews.extend(stay_reviews)
+    
+    tables = []
+    for (model, columns), instances in zip(SHARD_TABLES, [listings, bookings, nights, reviews]):
+        rows = instances if model is BookedNight else instance_rows(instances, columns, timestamp)
+        tables.append((model, columns, prepare_rows(model, columns, rows)))
+    return tables
+
+
+def update_digest(digest, tables):
+    """Fold a shard's prepared rows into a running checksum"""
+    for model, columns, rows in tables:
+        digest.update(model._meta.label.encode())
+        for row in rows:
+            digest.update(repr(row).encode())
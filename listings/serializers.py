@@ -1,9 +1,93 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
 from .models import Listing, Booking, Review
+from .analytics import default_window
+
+
+def split_param(value):
+    """Split a comma separated query parameter into names"""
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class DynamicFieldsMixin:
+    """Sparse fieldsets for model serializers.
+    
+    ``fields`` keeps only the named fields. ``expand`` swaps in the nested
+    serializers listed in ``Meta.expandable_fields`` (name -> (class, kwargs));
+    dotted names such as ``listing.host`` expand further down. Both can be
+    passed as keyword arguments or, for the top-level serializer of a view,
+    as ``?fields=`` and ``?expand=`` query parameters.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        
+        request = self.context.get('request')
+        if request is not None:
+            if fields is None:
+                fields = split_param(request.query_params.get('fields'))
+            if expand is None:
+                expand = split_param(request.query_params.get('expand'))
+        
+        # Expand nested serializers, passing deeper names down
+        nested = {}
+        for name in expand or ():
+            head, _, rest = name.partition('.')
+            nested.setdefault(head, [])
+            if rest:
+                nested[head].append(rest)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name, deeper in nested.items():
+            if name in expandable:
+                serializer_class, options = expandable[name]
+                if deeper and issubclass(serializer_class, DynamicFieldsMixin):
+                    options = dict(options, expand=deeper)
+                self.fields[name] = serializer_class(read_only=True, **options)
+        
+        # Keep only the requested fields (expanded ones are implied)
+        if fields:
+            keep = set(fields) | (nested.keys() & expandable.keys())
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+    
+    def query_plan(self, prefix=''):
+        """Columns, joins and prefetches needed to render the current fields.
+        
+        Returns ``(only, select_related, prefetch_related)`` lists for the
+        queryset. Fields must read model columns or relations directly.
+        """
+        opts = self.Meta.model._meta
+        columns = {field.name for field in opts.concrete_fields}
+        only, joins, prefetches = [], [], []
+        for field in self.fields.values():
+            source = field.source
+            if isinstance(field, serializers.ListSerializer):
+                child = field.child
+                related = opts.get_field(source).field.name
+                child_only, child_joins, child_prefetches = child.query_plan()
+                queryset = child.Meta.model.objects.all()
+                if child_joins:
+                    queryset = queryset.select_related(*child_joins)
+                queryset = queryset.prefetch_related(*child_prefetches).only(related, *child_only)
+                prefetches.append(Prefetch(f'{prefix}{source}', queryset=queryset))
+            elif source in columns:
+                only.append(source)
+                if isinstance(field, DynamicFieldsMixin):
+                    joins.append(source)
+                    child_only, child_joins, child_prefetches = field.query_plan(f'{prefix}{source}__')
+                    only.extend(f'{source}__{name}' for name in child_only)
+                    joins.extend(f'{source}__{name}' for name in child_joins)
+                    prefetches.extend(child_prefetches)
+        return only, joins, prefetches
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     
     class Meta:
@@ -12,7 +96,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Review model"""
     
     guest = UserSerializer(read_only=True)
@@ -27,13 +111,13 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Listing model"""
     
     host = UserSerializer(read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.ReadOnlyField()
-    total_reviews = serializers.ReadOnlyField()
+    average_rating = serializers.ReadOnlyField(source='rating_average')
+    total_reviews = serializers.ReadOnlyField(source='review_count')
     
     class Meta:
         model = Listing
@@ -42,6 +126,7 @@ class ListingSerializer(serializers.ModelSerializer):
             'country', 'postal_code', 'latitude', 'longitude',
             'property_type', 'bedrooms', 'bathrooms', 'max_guests',
             'price_per_night', 'cleaning_fee', 'service_fee',
+            'weekly_discount', 'monthly_discount',
             'amenities', 'house_rules', 'host', 'is_active',
             'is_instant_bookable', 'created_at', 'updated_at',
             'reviews', 'average_rating', 'total_reviews'
@@ -49,6 +134,26 @@ class ListingSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'host']
 
 
+class ListingSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Compact listing for list views: ids and summary fields only"""
+    
+    average_rating = serializers.ReadOnlyField(source='rating_average')
+    total_reviews = serializers.ReadOnlyField(source='review_count')
+    
+    class Meta:
+        model = Listing
+        fields = [
+            'id', 'title', 'city', 'country', 'property_type', 'bedrooms',
+            'max_guests', 'price_per_night', 'host', 'is_instant_bookable',
+            'average_rating', 'total_reviews'
+        ]
+        read_only_fields = fields
+        expandable_fields = {
+            'host': (UserSerializer, {}),
+            'reviews': (ReviewSerializer, {'many': True}),
+        }
+
+
 class ListingCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating Listing model"""
     
@@ -59,6 +164,7 @@ class ListingCreateSerializer(serializers.ModelSerializer):
             'country', 'postal_code', 'latitude', 'longitude',
             'property_type', 'bedrooms', 'bathrooms', 'max_guests',
             'price_per_night', 'cleaning_fee', 'service_fee',
+            'weekly_discount', 'monthly_discount',
             'amenities', 'house_rules', 'is_instant_bookable'
         ]
     
@@ -68,7 +174,7 @@ class ListingCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Booking model"""
     
     listing = ListingSerializer(read_only=True)
@@ -84,44 +190,197 @@ class BookingSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'total_price', 'created_at', 'updated_at', 'guest']
 
 
-class BookingCreateSerializer(serializers.ModelSerializer):
-    """Serializer for creating Booking model"""
+class BookingSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Compact booking for list views, with the listing and guest as ids"""
     
     class Meta:
         model = Booking
         fields = [
-            'listing', 'check_in_date', 'check_out_date',
-            'number_of_guests', 'special_requests'
+            'id', 'listing', 'guest', 'check_in_date', 'check_out_date',
+            'number_of_guests', 'total_price', 'status', 'created_at'
         ]
+        read_only_fields = fields
+        expandable_fields = {
+            'listing': (ListingSummarySerializer, {}),
+            'guest': (UserSerializer, {}),
+        }
+
+
+class BookingRequestSerializer(serializers.Serializer):
+    """Fields of ``POST /api/bookings/``, checked without touching the database.
     
-    def create(self, validated_data):
-        """Set the guest to the current user"""
-        validated_data['guest'] = self.context['request'].user
-        return super().create(validated_data)
+    The listing's rules and availability are enforced by
+    ``listings.bookings.create_booking``.
+    """
+    
+    listing = serializers.IntegerField(min_value=1, source='listing_id')
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+    number_of_guests = serializers.IntegerField(min_value=1)
+    special_requests = serializers.CharField(required=False, allow_blank=True, default='')
     
     def validate(self, data):
-        """Validate booking data"""
-        listing = data['listing']
-        check_in = data['check_in_date']
-        check_out = data['check_out_date']
-        guests = data['number_of_guests']
-        
-        # Check if check-out is after check-in
-        if check_out <= check_in:
+        """Validate the date window"""
+        if data['check_out_date'] <= data['check_in_date']:
             raise serializers.ValidationError(
                 "Check-out date must be after check-in date."
             )
-        
-        # Check if number of guests is within limit
-        if guests > listing.max_guests:
+        return data
+
+
+class StayDatesSerializer(serializers.Serializer):
+    """Validates a ``check_in``/``check_out`` date window"""
+    
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    
+    def validate(self, data):
+        """Validate the date window"""
+        if data['check_out'] <= data['check_in']:
             raise serializers.ValidationError(
-                f"Number of guests ({guests}) exceeds maximum allowed ({listing.max_guests})."
+                "Check-out date must be after check-in date."
             )
-        
-        # Check if listing is active
-        if not listing.is_active:
+        return data
+
+
+class ListingFilterSerializer(serializers.Serializer):
+    """Validates the comma-separated amenity and house-rule filters"""
+    
+    amenities = serializers.CharField(required=False, default='')
+    any_amenities = serializers.CharField(required=False, default='')
+    house_rules = serializers.CharField(required=False, default='')
+    
+    def to_internal_value(self, data):
+        """Split every filter into names"""
+        values = super().to_internal_value(data)
+        return {name: split_param(value) for name, value in values.items()}
+
+
+class ListingSearchSerializer(StayDatesSerializer):
+    """Validates query parameters for listing search"""
+    
+    city = serializers.CharField(required=False, max_length=100)
+    guests = serializers.IntegerField(required=False, min_value=1)
+
+
+class TextSearchSerializer(serializers.Serializer):
+    """Validates query parameters for full-text search"""
+    
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200, default='')
+    amenities = serializers.CharField(required=False, default='')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    
+    def validate_amenities(self, value):
+        """Split the comma-separated amenity names"""
+        return split_param(value)
+    
+    def validate(self, data):
+        """Require search words or an amenity"""
+        if not data['q'].strip() and not data['amenities']:
             raise serializers.ValidationError(
-                "This listing is not available for booking."
+                "Provide search words (q) or amenities."
             )
-        
-        return data 
\ No newline at end of file
+        return data
+
+
+class NearbyAvailabilitySerializer(ListingSearchSerializer):
+    """Validates availability search optionally limited to a radius"""
+    
+    lat = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    lng = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(min_value=0, max_value=500, default=10)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
+    
+    def validate(self, data):
+        """Require lat and lng together"""
+        data = super().validate(data)
+        if ('lat' in data) != ('lng' in data):
+            raise serializers.ValidationError("Provide both lat and lng, or neither.")
+        return data
+
+
+class NearbySearchSerializer(serializers.Serializer):
+    """Validates query parameters for radius search"""
+    
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(min_value=0, max_value=500, default=10)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
+
+
+class BoundingBoxSerializer(serializers.Serializer):
+    """Validates a ``bbox=min_lat,min_lng,max_lat,max_lng`` query parameter"""
+    
+    bbox = serializers.CharField()
+    
+    def validate_bbox(self, value):
+        """Parse the four comma-separated coordinates"""
+        try:
+            min_lat, min_lng, max_lat, max_lng = (float(part) for part in value.split(','))
+        except ValueError:
+            raise serializers.ValidationError(
+                "Expected four numbers: min_lat,min_lng,max_lat,max_lng."
+            )
+        if not -90 <= min_lat <= max_lat <= 90:
+            raise serializers.ValidationError("Latitudes must satisfy -90 <= min <= max <= 90.")
+        if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+            raise serializers.ValidationError("Longitudes must be between -180 and 180.")
+        return min_lat, min_lng, max_lat, max_lng
+
+
+class ExportFilterSerializer(serializers.Serializer):
+    """Validates query parameters for the export endpoint.
+    
+    Pass the export ``kind`` in the context; only bookings take ``status``.
+    """
+    
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = serializers.MultipleChoiceField(choices=Booking.STATUS_CHOICES, required=False)
+    
+    def validate_status(self, value):
+        if value and self.context.get('kind') != 'bookings':
+            raise serializers.ValidationError('Only booking exports can be filtered by status.')
+        return value
+
+
+class ListingImportSerializer(serializers.Serializer):
+    """Validates a listing feed upload"""
+    
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
+    batch_size = serializers.IntegerField(min_value=1, max_value=10000, default=1000)
+    
+    def validate(self, data):
+        """Infer the format from the file name when it is not given"""
+        if 'file_format' not in data:
+            extension = data['file'].name.rsplit('.', 1)[-1].lower()
+            if extension not in ('csv', 'jsonl'):
+                raise serializers.ValidationError(
+                    "Cannot tell the feed format; pass file_format=csv or jsonl."
+                )
+            data['file_format'] = extension
+        return data
+
+
+class HostAnalyticsSerializer(serializers.Serializer):
+    """Validates the ``start``/``end`` window and ``listing`` filter of host analytics"""
+    
+    # Longest window, so one report stays a bounded scan of the rollups
+    MAX_DAYS = 731
+    
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    listing = serializers.IntegerField(required=False, min_value=1)
+    
+    def validate(self, data):
+        """Default to the twelve months up to this one, and bound the window"""
+        if 'end' not in data:
+            data['end'] = default_window()[1]
+        if 'start' not in data:
+            data['start'] = default_window(data['end'] - timedelta(days=1))[0]
+        if data['end'] <= data['start']:
+            raise serializers.ValidationError("End date must be after start date.")
+        if (data['end'] - data['start']).days > self.MAX_DAYS:
+            raise serializers.ValidationError(f"The window can span at most {self.MAX_DAYS} days.")
+        return data
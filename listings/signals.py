@@ -0,0 +1,123 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import analytics, caching, fulltext, pricing
+from .models import Booking, Listing, PriceOverride, Review
+
+
+@receiver(post_save, sender=Review)
+def refresh_aggregates_on_review_save(sender, instance, raw=False, **kwargs):
+    """Keep listing rating aggregates, daily rollups and cached responses current when a review is written"""
+    if raw:
+        return
+    listing_ids = {instance.listing_id}
+    previous = getattr(instance, '_loaded_listing_id', None)
+    if previous is not None:
+        listing_ids.add(previous)
+    Listing.refresh_rating_aggregates(listing_ids)
+    caching.bump_listing_versions(listing_ids)
+    day = timezone.localdate(instance.created_at)
+    analytics.refresh_review_days((listing_id, day) for listing_id in listing_ids)
+    instance._loaded_listing_id = instance.listing_id
+
+
+@receiver(post_delete, sender=Review)
+def refresh_aggregates_on_review_delete(sender, instance, **kwargs):
+    """Keep listing rating aggregates, daily rollups and cached responses current when a review is removed"""
+    Listing.refresh_rating_aggregates({instance.listing_id})
+    caching.bump_listing_versions([instance.listing_id])
+    day = timezone.localdate(instance.created_at)
+    refresh_unless_listing_deleted(
+        instance.listing_id, lambda: analytics.refresh_review_days([(instance.listing_id, day)])
+    )
+
+
+@receiver(post_save, sender=Booking)
+def refresh_daily_stats_on_booking_save(sender, instance, raw=False, **kwargs):
+    """Rebuild the rollup days of the booking's stay, before and after the change"""
+    if raw:
+        return
+    stays = []
+    previous = getattr(instance, '_loaded_stay', None)
+    if previous and None not in previous and analytics.contribution(previous[3]):
+        stays.append(previous[:3])
+    if analytics.contribution(instance.status):
+        stays.append((instance.listing_id, instance.check_in_date, instance.check_out_date))
+    # New pending bookings, the common case, cost nothing here
+    analytics.refresh_stays(stays)
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_daily_stats_on_booking_delete(sender, instance, **kwargs):
+    """Drop a deleted booking's nights, revenue or cancellation from the rollups"""
+    if analytics.contribution(instance.status):
+        stay = (instance.listing_id, instance.check_in_date, instance.check_out_date)
+        refresh_unless_listing_deleted(instance.listing_id, lambda: analytics.refresh_stays([stay]))
+
+
+def refresh_unless_listing_deleted(listing_id, refresh):
+    """Run a rollup refresh after commit, unless the delete took the listing with it.
+    
+    Deleting a listing (or its host) cascades to its bookings and reviews;
+    refreshing in the middle of that would write rollup rows for a listing
+    that is about to disappear.
+    """
+    def run():
+        if Listing.objects.filter(pk=listing_id).exists():
+            refresh()
+    transaction.on_commit(run)
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_pricing_on_listing_change(sender, instance, **kwargs):
+    """Drop cached pricing when a listing's rates or fees may have changed"""
+    pricing.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=PriceOverride)
+@receiver(post_delete, sender=PriceOverride)
+def invalidate_pricing_on_override_change(sender, instance, **kwargs):
+    """Drop cached pricing when a nightly or seasonal override changes"""
+    pricing.invalidate([instance.listing_id])
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def bump_cached_listing_responses(sender, instance, **kwargs):
+    """Move cached responses for a listing on to new keys after it changes"""
+    caching.bump_listing_versions([instance.pk])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=PriceOverride)
+@receiver(post_delete, sender=PriceOverride)
+def bump_cached_responses_for_listing(sender, instance, **kwargs):
+    """Bookings and price overrides change search results and quotes"""
+    caching.bump_listing_versions([instance.listing_id])
+
+
+@receiver(post_save, sender=Listing)
+def index_listing_text(sender, instance, raw=False, **kwargs):
+    """Reindex a listing's searchable text after it is written"""
+    if raw:
+        return
+    fulltext.get_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing_text(sender, instance, **kwargs):
+    """Drop a deleted listing from the search index"""
+    fulltext.get_backend().remove([instance.pk])
+
+
+@receiver(post_migrate)
+def ensure_search_schema(sender, using='default', **kwargs):
+    """Recreate the search table and triggers that rebuilding ``listings_listing`` drops"""
+    if sender.name != 'listings':
+        return
+    if connections[using].vendor == 'sqlite':
+        fulltext.get_backend().ensure_schema(connections[using])
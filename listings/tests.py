@@ -1,3 +1,2138 @@
-from django.test import TestCase
+import contextvars
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import StreamingHttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from alx_travel_app.database import databases_from_env
+from alx_travel_app.instrumentation import JSONFormatter, registry
+from alx_travel_app.routers import (
+    PrimaryPinningMiddleware, ReplicaMonitor, ReplicaRouter, beat, heartbeat_lag, is_pinned,
+    primary_only,
+)
+
+from . import fulltext
+from .admin import ListingAdmin
+from .analytics import booking_days, nightly_revenue
+from .availability import NightsUnavailable, is_available, reserve
+from .benchmarks import find_regressions, measure
+from .bookings import BookingInvalid, create_booking, insert, read_rules
+from .fastpath import compile_plan
+from .exports import export_rows
+from .features import sync_listing_features, with_amenities, with_house_rules
+from .geo import cell_for, haversine_km, within_bbox, within_radius
+from .imports import import_listings, read_checkpoint
+from .jobs import JOBS, BookingTransition, Worker, enqueue, enqueue_due
+from .models import (
+    Listing, Booking, BookedNight, Feature, IdempotencyKey, Job, ListingDailyStats, ListingFeature,
+    PriceOverride, Review,
+)
+from .pricing import invalidate, load_pricing, quote, quote_many
+from .renderers import FastJSONRenderer
+from .search import available_listings
+from .serializers import (
+    BookingSerializer, BookingSummarySerializer, ListingSerializer,
+    ListingSummarySerializer, ReviewSerializer,
+)
+
+
+def make_listing(host, **overrides):
+    """Create a listing with sensible defaults for tests"""
+    fields = {
+        'title': 'Test Apartment',
+        'description': 'A place to stay',
+        'address': '1 Main St',
+        'city': 'Paris',
+        'state': 'Île-de-France',
+        'country': 'France',
+        'postal_code': '75001',
+        'property_type': 'apartment',
+        'bedrooms': 1,
+        'bathrooms': 1,
+        'max_guests': 4,
+        'price_per_night': Decimal('100.00'),
+        'host': host,
+    }
+    fields.update(overrides)
+    return Listing.objects.create(**fields)
+
+
+def make_booking(listing, guest, offset=0, nights=2, **overrides):
+    """Create a booking starting ``offset`` days from today"""
+    check_in = date.today() + timedelta(days=offset)
+    fields = {
+        'listing': listing,
+        'guest': guest,
+        'check_in_date': check_in,
+        'check_out_date': check_in + timedelta(days=nights),
+        'number_of_guests': 1,
+        'status': 'completed',
+    }
+    fields.update(overrides)
+    return Booking.objects.create(**fields)
+
+
+def make_review(booking, rating, **overrides):
+    """Create a review for a booking"""
+    fields = {
+        'listing': booking.listing,
+        'guest': booking.guest,
+        'booking': booking,
+        'rating': rating,
+        'comment': 'Nice stay',
+    }
+    fields.update(overrides)
+    return Review.objects.create(**fields)
+
+
+class RatingAggregateTests(TestCase):
+    """Stored rating aggregates on Listing"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.listing = make_listing(cls.host)
+        cls.other = make_listing(cls.host, title='Other')
+
+    def test_create_updates_aggregates(self):
+        make_review(make_booking(self.listing, self.guest), 4, cleanliness_rating=5)
+        make_review(make_booking(self.listing, self.guest, offset=5), 2)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.review_count, 2)
+        self.assertEqual(self.listing.rating_sum, 6)
+        self.assertEqual(self.listing.average_rating, 3)
+        self.assertEqual(self.listing.cleanliness_average, 5)
+        self.assertIsNone(self.listing.value_average)
+
+    def test_edit_and_delete_update_aggregates(self):
+        review = make_review(make_booking(self.listing, self.guest), 4)
+        review.rating = 5
+        review.save()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.average_rating, 5)
+
+        review.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.total_reviews, 0)
+        self.assertEqual(self.listing.average_rating, 0)
+
+    def test_moving_review_refreshes_both_listings(self):
+        make_review(make_booking(self.listing, self.guest), 4)
+        review = Review.objects.get()
+        review.listing = self.other
+        review.save()
+        self.listing.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.listing.review_count, 0)
+        self.assertEqual(self.other.review_count, 1)
+
+    def test_rebuild_command_repairs_drift(self):
+        make_review(make_booking(self.listing, self.guest), 3)
+        Listing.objects.update(review_count=0, rating_sum=0, rating_average=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.review_count, 1)
+        self.assertEqual(self.listing.average_rating, 3)
+
+    def test_reading_ratings_needs_no_queries(self):
+        make_review(make_booking(self.listing, self.guest), 4)
+        listing = Listing.objects.get(pk=self.listing.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(listing.average_rating, 4)
+            self.assertEqual(listing.total_reviews, 1)
+
+
+def bulk_listings_with_reviews(host, guest, count):
+    """Bulk create ``count`` listings, each with one completed booking and review"""
+    listings = Listing.objects.bulk_create([
+        Listing(
+            title=f'Listing {i}', description='', address='', city='Paris',
+            state='', country='France', postal_code='', property_type='loft',
+            bedrooms=1, bathrooms=1, max_guests=2,
+            price_per_night=Decimal('80.00'), host=host,
+        )
+        for i in range(count)
+    ])
+    check_in = date.today() - timedelta(days=10)
+    bookings = Booking.objects.bulk_create([
+        Booking(
+            listing=listing, guest=guest, check_in_date=check_in,
+            check_out_date=check_in + timedelta(days=2), number_of_guests=1,
+            total_price=Decimal('160.00'), status='completed',
+        )
+        for listing in listings
+    ])
+    Review.objects.bulk_create([
+        Review(
+            listing=booking.listing, guest=guest, booking=booking,
+            rating=5, comment='Great',
+        )
+        for booking in bookings
+    ])
+    Listing.refresh_rating_aggregates()
+    return listings
+
+
+class ReadApiQueryCountTests(APITestCase):
+    """The read API issues a fixed number of queries regardless of row count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+
+    def assertListQueries(self, url, rows, num, user=None):
+        """Add ``rows`` listings (with a booking and review each), then check ``url``"""
+        bulk_listings_with_reviews(self.host, self.guest, rows)
+        if user is not None:
+            self.client.force_authenticate(user)
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), min(Listing.objects.count(), 20))
+        return response
+
+    def test_listing_list(self):
+        for rows in (1, 50, 500):
+            with self.subTest(rows=rows):
+                Listing.objects.all().delete()
+                response = self.assertListQueries(reverse('listing-list'), rows, 1)
+                self.assertEqual(response.data['results'][0]['total_reviews'], 1)
+                self.assertNotIn('reviews', response.data['results'][0])
+
+    def test_expanded_listing_list(self):
+        for rows in (1, 50, 500):
+            with self.subTest(rows=rows):
+                Listing.objects.all().delete()
+                url = reverse('listing-list') + '?expand=host,reviews'
+                response = self.assertListQueries(url, rows, 2)
+                row = response.data['results'][0]
+                self.assertEqual(row['host']['username'], 'host')
+                self.assertEqual(row['reviews'][0]['guest']['username'], 'guest')
+
+    def test_booking_list(self):
+        for rows in (1, 50, 500):
+            with self.subTest(rows=rows):
+                Listing.objects.all().delete()
+                self.assertListQueries(reverse('booking-list'), rows, 1, user=self.guest)
+                url = reverse('booking-list') + '?expand=guest,listing.host,listing.reviews'
+                response = self.assertListQueries(url, 0, 2, user=self.guest)
+                listing = response.data['results'][0]['listing']
+                self.assertEqual(listing['host']['username'], 'host')
+                self.assertEqual(len(listing['reviews']), 1)
+
+    def test_review_list(self):
+        for rows in (1, 50, 500):
+            with self.subTest(rows=rows):
+                Listing.objects.all().delete()
+                self.assertListQueries(reverse('review-list'), rows, 1)
+
+    def test_bookings_are_scoped_to_the_user(self):
+        bulk_listings_with_reviews(self.host, self.guest, 2)
+        stranger = User.objects.create(username='stranger')
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(reverse('booking-list')).data['results'], [])
+        self.client.force_authenticate(self.host)
+        self.assertEqual(len(self.client.get(reverse('booking-list')).data['results']), 2)
+
+
+class SparseFieldsTests(APITestCase):
+    """?fields= and ?expand= on the read endpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.listing = bulk_listings_with_reviews(cls.host, cls.guest, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fields_trim_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('listing-list'), {'fields': 'id,title'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+        select = queries.captured_queries[0]['sql'].split(' FROM ')[0]
+        self.assertNotIn('description', select)
+        self.assertNotIn('price_per_night', select)
+
+    def test_expand_implies_field(self):
+        response = self.client.get(reverse('listing-list'), {'fields': 'id', 'expand': 'host'})
+        self.assertEqual(response.data['results'][0]['host']['username'], 'host')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'host'})
+
+    def test_detail_variants_are_cached_separately(self):
+        url = reverse('listing-detail', args=[self.listing.pk])
+        full = self.client.get(url)
+        slim = self.client.get(url, {'fields': 'title,average_rating'})
+        self.assertIn('reviews', full.data)
+        self.assertEqual(slim.data, {'title': 'Listing 0', 'average_rating': 5.0})
+        self.assertNotEqual(slim['ETag'], full['ETag'])
+
+    def test_unknown_names_are_ignored(self):
+        response = self.client.get(reverse('review-list'), {'fields': 'rating,nope', 'expand': 'nope'})
+        self.assertEqual(response.data['results'], [{'rating': 5}])
+
+
+class KeysetPaginationTests(APITestCase):
+    """Cursor pagination on (created_at, id) for the list endpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        bulk_listings_with_reviews(cls.host, cls.guest, 45)
+        # Shared timestamps force the id tie-breaker to do the work
+        Listing.objects.filter(pk__in=Listing.objects.order_by('pk').values('pk')[10:30]).update(
+            created_at=timezone.now() - timedelta(days=365)
+        )
+        cls.expected = list(Listing.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages, response
+
+    def test_pages_cover_every_row_once_in_order(self):
+        pages, last = self.walk(reverse('listing-list') + '?page_size=20', 'next')
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        back, _ = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_deep_page_costs_the_same_as_the_first(self):
+        url = reverse('listing-list') + '?page_size=10'
+        for _ in range(4):
+            with self.assertNumQueries(1):
+                url = self.client.get(url).data['next']
+
+    def test_page_size_is_capped_and_cursor_validated(self):
+        response = self.client.get(reverse('review-list'), {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 45)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(reverse('review-list'), {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 404)
+
+    @skipUnless(connection.vendor == 'sqlite', 'checks an SQLite query plan')
+    def test_ordering_uses_composite_index(self):
+        with connection.cursor() as cursor:
+            sql, params = Listing.objects.filter(
+                created_at__lte=timezone.now()
+            ).order_by('-created_at', '-id')[:21].query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('listing_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class AvailabilityTests(TestCase):
+    """Night occupancy and the overlap-free booking engine"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.listing = make_listing(cls.host)
+
+    def new_booking(self, offset, nights, **overrides):
+        check_in = date.today() + timedelta(days=offset)
+        fields = {
+            'listing': self.listing,
+            'guest': self.guest,
+            'check_in_date': check_in,
+            'check_out_date': check_in + timedelta(days=nights),
+            'number_of_guests': 1,
+        }
+        fields.update(overrides)
+        return Booking(**fields)
+
+    def test_booking_occupies_its_nights(self):
+        booking = reserve(self.new_booking(0, 3))
+        self.assertEqual(booking.booked_nights.count(), 3)
+        today = date.today()
+        self.assertFalse(is_available(self.listing, today + timedelta(days=2), today + timedelta(days=5)))
+        # Check-out day is free for the next guest
+        self.assertTrue(is_available(self.listing, today + timedelta(days=3), today + timedelta(days=5)))
+
+    def test_overlap_is_rejected(self):
+        reserve(self.new_booking(0, 3))
+        with self.assertRaises(NightsUnavailable):
+            reserve(self.new_booking(2, 2))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_cancelling_releases_nights(self):
+        booking = reserve(self.new_booking(0, 3))
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertFalse(BookedNight.objects.exists())
+        reserve(self.new_booking(1, 1))
+
+    def test_moving_dates_resyncs_nights(self):
+        booking = reserve(self.new_booking(0, 2))
+        booking.check_in_date += timedelta(days=10)
+        booking.check_out_date += timedelta(days=10)
+        reserve(booking)
+        self.assertTrue(is_available(self.listing, date.today(), date.today() + timedelta(days=2)))
+        self.assertEqual(booking.booked_nights.count(), 2)
+
+    def test_constraint_backs_up_the_check(self):
+        reserve(self.new_booking(0, 3))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.new_booking(1, 1).save()
+
+    def test_create_booking_rejects_overlap(self):
+        reserve(self.new_booking(0, 3))
+        check_in = date.today() + timedelta(days=1)
+        with self.assertRaises(NightsUnavailable):
+            create_booking(self.guest, self.listing.pk, check_in, check_in + timedelta(days=1), 1)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Racing reservations for the same nights produce exactly one booking"""
+
+    def test_exactly_one_concurrent_booking_wins(self):
+        host = User.objects.create(username='host')
+        guest = User.objects.create(username='guest')
+        listing = make_listing(host)
+        check_in = date.today() + timedelta(days=7)
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def attempt(offset):
+            try:
+                barrier.wait()
+                reserve(Booking(
+                    listing=listing, guest=guest,
+                    check_in_date=check_in + timedelta(days=offset % 2),
+                    check_out_date=check_in + timedelta(days=3),
+                    number_of_guests=1,
+                ))
+                outcomes.append('won')
+            except NightsUnavailable:
+                outcomes.append('lost')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('won'), 1)
+        self.assertEqual(outcomes.count('lost'), 7)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class SearchTests(APITestCase):
+    """Date-range availability search"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.free = make_listing(cls.host, title='Free', price_per_night=Decimal('90.00'))
+        cls.booked = make_listing(cls.host, title='Booked')
+        cls.small = make_listing(cls.host, title='Small', max_guests=1)
+        cls.london = make_listing(cls.host, title='London', city='London')
+        make_booking(cls.booked, cls.guest, offset=3, nights=4, status='confirmed')
+        make_booking(cls.free, cls.guest, offset=3, nights=4, status='cancelled')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, offset, nights, **params):
+        check_in = date.today() + timedelta(days=offset)
+        return self.client.get(reverse('listing-search'), {
+            'check_in': check_in,
+            'check_out': check_in + timedelta(days=nights),
+            **params,
+        })
+
+    def test_excludes_overlapping_bookings(self):
+        response = self.search(5, 2, city='Paris', guests=2)
+        self.assertEqual([row['title'] for row in response.data['results']], ['Free'])
+
+    def test_adjacent_stays_do_not_overlap(self):
+        response = self.search(7, 2, city='Paris', guests=2)
+        self.assertEqual(
+            [row['title'] for row in response.data['results']], ['Free', 'Booked']
+        )
+
+    def test_results_are_paged_cheapest_first(self):
+        titles = []
+        response = self.search(7, 2, page_size=2)
+        while True:
+            self.assertLessEqual(len(response.data['results']), 2)
+            titles += [row['title'] for row in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(titles, ['Free', 'Booked', 'Small', 'London'])
+        self.assertEqual(self.search(7, 2, cursor='bogus').status_code, 404)
+
+    def test_invalid_window_is_rejected(self):
+        response = self.search(5, 0)
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_layer_uses_overlap_semantics(self):
+        check_in = date.today() + timedelta(days=1)
+        titles = set(
+            available_listings(check_in, check_in + timedelta(days=3))
+            .values_list('title', flat=True)
+        )
+        self.assertEqual(titles, {'Free', 'Small', 'London'})
+
+
+class GeoSearchTests(APITestCase):
+    """Grid-cell pruned radius and bounding-box search"""
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create(username='host')
+        places = {
+            'Louvre': ('48.860611', '2.337644'),
+            'Eiffel': ('48.858370', '2.294481'),
+            'Versailles': ('48.804865', '2.120355'),
+            'London': ('51.507351', '-0.127758'),
+            'Fiji East': ('-17.713371', '179.900000'),
+            'Fiji West': ('-17.713371', '-179.900000'),
+        }
+        for title, (lat, lng) in places.items():
+            make_listing(host, title=title, latitude=Decimal(lat), longitude=Decimal(lng))
+
+    def test_cell_is_maintained_on_save(self):
+        listing = Listing.objects.get(title='London')
+        self.assertEqual(listing.geo_cell, cell_for(listing.latitude, listing.longitude))
+        listing.latitude, listing.longitude = Decimal('48.86'), Decimal('2.33')
+        listing.save(update_fields=['latitude', 'longitude'])
+        listing.refresh_from_db()
+        self.assertEqual(listing.geo_cell, cell_for(48.86, 2.33))
+
+    def test_radius_ranks_by_distance(self):
+        response = self.client.get(reverse('listing-nearby'), {
+            'lat': 48.8566, 'lng': 2.3522, 'radius_km': 10,
+        })
+        self.assertEqual([row['title'] for row in response.data], ['Louvre', 'Eiffel'])
+        self.assertLess(response.data[0]['distance_km'], response.data[1]['distance_km'])
+
+    def test_radius_prunes_by_cell(self):
+        with CaptureQueriesContext(connection) as queries:
+            within_radius(Listing.objects.all(), 48.8566, 2.3522, 30)
+        self.assertIn('geo_cell', queries[0]['sql'])
+
+    def test_bbox(self):
+        response = self.client.get(reverse('listing-within'), {'bbox': '48.8,2.1,48.9,2.4'})
+        self.assertEqual(
+            {row['title'] for row in response.data['results']}, {'Louvre', 'Eiffel', 'Versailles'}
+        )
+        response = self.client.get(reverse('listing-within'), {'bbox': '48.8,2.1,48.9,2.4', 'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_bbox_across_antimeridian(self):
+        matches = within_bbox(Listing.objects.all(), -18, 179.5, -17, -179.5)
+        self.assertEqual(
+            set(matches.values_list('title', flat=True)), {'Fiji East', 'Fiji West'}
+        )
+        nearby = within_radius(Listing.objects.all(), -17.713371, 179.99, 25)
+        self.assertEqual(len(nearby), 2)
+
+    def test_bbox_at_the_antimeridian(self):
+        make_listing(
+            User.objects.get(username='host'), title='Taveuni',
+            latitude=Decimal('10'), longitude=Decimal('180'),
+        )
+        self.assertEqual(cell_for(10, 180), cell_for(10, 179.95))
+        response = self.client.get(reverse('listing-within'), {'bbox': '9.9,179.95,10.1,180'})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Taveuni'])
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine_km(48.8566, 2.3522, 51.5074, -0.1278), 343.5, delta=1)
+
+    def test_invalid_bbox(self):
+        response = self.client.get(reverse('listing-within'), {'bbox': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkSeedTests(TestCase):
+    """The seed command's --bulk mode"""
+
+    def test_bulk_seed_builds_consistent_data(self):
+        call_command(
+            'seed', bulk=True, users=5, listings=4, bookings=40, reviews=10,
+            batch_size=7, stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Listing.objects.count(), 4)
+        self.assertEqual(Booking.objects.count(), 40)
+        self.assertLessEqual(Review.objects.count(), 10)
+        self.assertTrue(User.objects.get(username='user1').check_password('password123'))
+
+        # Every active booking holds exactly its own nights
+        active = Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
+        self.assertEqual(
+            BookedNight.objects.count(),
+            sum((b.check_out_date - b.check_in_date).days for b in active),
+        )
+        for booking in Booking.objects.select_related('listing')[:10]:
+            nights = (booking.check_out_date - booking.check_in_date).days
+            listing = booking.listing
+            self.assertEqual(
+                booking.total_price,
+                listing.price_per_night * nights + listing.cleaning_fee + listing.service_fee,
+            )
+
+        # Stored aggregates agree with a rebuild from the review table
+        before = list(Listing.objects.order_by('pk').values_list('review_count', 'rating_sum'))
+        Listing.refresh_rating_aggregates()
+        after = list(Listing.objects.order_by('pk').values_list('review_count', 'rating_sum'))
+        self.assertEqual(before, after)
+
+        # Raw inserts still get their feature links
+        for listing in Listing.objects.prefetch_related('features'):
+            self.assertEqual(
+                sorted(f.name for f in listing.features.all() if f.kind == 'amenity'),
+                sorted(listing.amenities),
+            )
+
+        # Explicit primary keys leave the table usable for regular inserts
+        make_listing(User.objects.first())
+
+    def seed_checksum(self, **options):
+        out = StringIO()
+        call_command(
+            'seed', bulk=True, users=6, listings=9, bookings=60, reviews=15,
+            batch_size=20, as_of=date(2026, 1, 1), checksum=True, stdout=out,
+            **options,
+        )
+        return out.getvalue().split('Checksum: ')[1].strip()
+
+    def test_same_seed_gives_same_data_for_any_worker_count(self):
+        first = self.seed_checksum(seed=42, workers=1)
+        bookings = list(Booking.objects.order_by('pk').values())
+        Listing.objects.all().delete()
+
+        # The checksum covers the users too, so this also pins the password hashes
+        self.assertEqual(self.seed_checksum(seed=42, workers=3), first)
+        self.assertEqual(list(Booking.objects.order_by('pk').values()), bookings)
+        Listing.objects.all().delete()
+
+        self.assertNotEqual(self.seed_checksum(seed=43), first)
+
+
+class ExportTests(APITestCase):
+    """Streaming CSV/JSONL exports"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+        cls.listing = make_listing(cls.host)
+        make_booking(cls.listing, cls.guest, offset=0, status='confirmed')
+        make_booking(cls.listing, cls.guest, offset=10, status='cancelled')
+        make_booking(cls.listing, cls.guest, offset=20, status='confirmed')
+
+    def test_command_writes_csv(self):
+        out = StringIO()
+        call_command('export', 'bookings', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'listing_id', 'listing_title'])
+        self.assertEqual(len(lines), 4)
+
+    def test_command_filters_by_date_and_status(self):
+        out = StringIO()
+        call_command(
+            'export', 'bookings', '--format', 'jsonl', '--status', 'confirmed',
+            '--end', str(date.today() + timedelta(days=15)), stdout=out,
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['status'], 'confirmed')
+        self.assertEqual(rows[0]['total_price'], '200.00')
+        self.assertEqual(rows[0]['guest_username'], 'guest')
+
+    def test_endpoint_streams_for_staff_only(self):
+        url = reverse('export', kwargs={'kind': 'listings', 'file_format': 'jsonl'})
+        self.client.force_authenticate(self.guest)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(url)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Test Apartment'])
+
+    def test_endpoint_filters(self):
+        self.client.force_authenticate(self.staff)
+        url = reverse('export', kwargs={'kind': 'bookings', 'file_format': 'csv'})
+        response = self.client.get(url, {'status': ['cancelled', 'confirmed'], 'start': date.today() + timedelta(days=5)})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_listings_filter_on_creation_time(self):
+        today = timezone.localdate()
+        with CaptureQueriesContext(connection) as queries:
+            columns, rows = export_rows('listings', start=today, end=today + timedelta(days=1))
+            self.assertEqual(len(list(rows)), 1)
+        self.assertNotIn('django_datetime_cast_date', queries[0]['sql'])
+        columns, rows = export_rows('listings', end=today)
+        self.assertEqual(list(rows), [])
+
+    def test_listings_reject_status(self):
+        self.client.force_authenticate(self.staff)
+        url = reverse('export', kwargs={'kind': 'listings', 'file_format': 'csv'})
+        response = self.client.get(url, {'status': 'confirmed'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+        with self.assertRaises(CommandError):
+            call_command('export', 'listings', '--status', 'confirmed', stdout=StringIO())
+
+
+FEED_COLUMNS = [
+    'external_id', 'title', 'description', 'address', 'city', 'state', 'country',
+    'postal_code', 'latitude', 'longitude', 'property_type', 'bedrooms',
+    'bathrooms', 'max_guests', 'price_per_night', 'amenities',
+]
+
+
+def feed_record(key, **overrides):
+    record = {
+        'external_id': key, 'title': f'Flat {key}', 'description': 'Bright',
+        'address': '2 Rue X', 'city': 'Paris', 'state': 'IDF', 'country': 'France',
+        'postal_code': '75002', 'latitude': '48.86', 'longitude': '2.35',
+        'property_type': 'apartment', 'bedrooms': '2', 'bathrooms': '1',
+        'max_guests': '4', 'price_per_night': '120', 'amenities': 'WiFi|Kitchen',
+    }
+    record.update(overrides)
+    return record
+
+
+def write_feed(path, records):
+    with open(path, 'w', newline='') as feed:
+        writer = csv.DictWriter(feed, FEED_COLUMNS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+class ListingImportTests(APITestCase):
+    """Partner feed imports"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='partner', is_staff=True)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'feed.csv')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_listings', self.path, '--host', 'partner', '--batch-size', '2',
+                     *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_creates_and_updates_by_external_key(self):
+        write_feed(self.path, [feed_record('a'), feed_record('b')])
+        self.run_import()
+        created_at = Listing.objects.get(external_id='a').created_at
+        User.objects.create(username='other', is_staff=True)
+        write_feed(self.path, [feed_record('a', price_per_night='99.5'), feed_record('c')])
+        out, _ = self.run_import()
+        self.assertIn('1 created, 1 updated, 0 failed', out)
+        self.assertEqual(Listing.objects.get(external_id='a').created_at, created_at)
+
+        listing = Listing.objects.get(external_id='a')
+        self.assertEqual(listing.price_per_night, Decimal('99.50'))
+        self.assertEqual(listing.amenities, ['WiFi', 'Kitchen'])
+        self.assertEqual(listing.host, self.host)
+        self.assertEqual(listing.geo_cell, cell_for(listing.latitude, listing.longitude))
+        self.assertEqual(Listing.objects.count(), 3)
+
+    def test_bad_rows_are_reported_not_fatal(self):
+        write_feed(self.path, [
+            feed_record('a'),
+            feed_record('b', bedrooms='two', property_type='castle'),
+            feed_record('c', latitude='123'),
+            feed_record('d', title=''),
+        ])
+        _, err = self.run_import()
+        self.assertEqual(list(Listing.objects.values_list('external_id', flat=True)), ['a'])
+        self.assertIn('Record 2: property_type: must be one of', err)
+        self.assertIn('bedrooms: not a whole number', err)
+        self.assertIn('Record 3: latitude: must be between -90 and 90', err)
+        self.assertIn('Record 4: title: required', err)
+
+    def test_resume_skips_committed_records(self):
+        write_feed(self.path, [feed_record('a'), feed_record('b'), feed_record('c')])
+        with open(f'{self.path}.checkpoint', 'w') as checkpoint:
+            json.dump({'records': 2}, checkpoint)
+        self.run_import('--resume')
+        self.assertEqual(list(Listing.objects.values_list('external_id', flat=True)), ['c'])
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_checkpoint_tracks_committed_batches(self):
+        records = [feed_record(str(i)) for i in range(5)]
+        with open(self.path.replace('.csv', '.jsonl'), 'w') as feed:
+            for record in records:
+                feed.write(json.dumps(record) + '\n')
+            feed.write('not json\n')
+        checkpoints = []
+        with open(self.path.replace('.csv', '.jsonl')) as stream:
+            report = import_listings(
+                stream, 'jsonl', self.host, batch_size=2,
+                checkpoint=f'{self.path}.checkpoint',
+                on_batch=lambda report: checkpoints.append(read_checkpoint(f'{self.path}.checkpoint')),
+            )
+        self.assertEqual(checkpoints, [2, 4, 6])
+        self.assertEqual(report.created, 5)
+        self.assertEqual(report.errors, [(6, 'not valid JSON')])
+
+    def test_api_upload(self):
+        write_feed(self.path, [feed_record('a'), feed_record('b', max_guests='-1')])
+        self.client.force_authenticate(self.host)
+        with open(self.path, 'rb') as feed:
+            response = self.client.post(reverse('listing-import'), {'file': feed})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'], [
+            {'record': 2, 'error': 'max_guests: must not be negative'},
+        ])
+
+
+class PricingTests(APITestCase):
+    """Batch price quotes and the per-listing pricing cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.listing = make_listing(
+            cls.host,
+            cleaning_fee=Decimal('30.00'),
+            service_fee=Decimal('10.00'),
+            weekly_discount=Decimal('10'),
+            monthly_discount=Decimal('25'),
+        )
+        cls.start = date(2030, 7, 1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_overrides_and_discounts(self):
+        PriceOverride.objects.create(
+            listing=self.listing, start_date=date(2030, 6, 25),
+            end_date=date(2030, 7, 3), price_per_night=Decimal('150.00'),
+        )
+        PriceOverride.objects.create(
+            listing=self.listing, start_date=date(2030, 7, 2),
+            end_date=date(2030, 7, 3), price_per_night=Decimal('200.00'),
+        )
+        short = quote(self.listing.pk, self.start, self.start + timedelta(days=3))
+        self.assertEqual(short.nightly_subtotal, Decimal('450.00'))
+        self.assertEqual(short.discount, Decimal('0.00'))
+        self.assertEqual(short.total, Decimal('490.00'))
+
+        week = quote(self.listing.pk, self.start, self.start + timedelta(days=7))
+        self.assertEqual(week.nightly_subtotal, Decimal('850.00'))
+        self.assertEqual(week.discount, Decimal('85.00'))
+        self.assertEqual(week.total, Decimal('805.00'))
+
+        month = quote(self.listing.pk, self.start, self.start + timedelta(days=28))
+        self.assertEqual(month.discount, Decimal('737.50'))
+
+    def test_booking_save_uses_engine(self):
+        PriceOverride.objects.create(
+            listing=self.listing, start_date=date.today(),
+            end_date=date.today() + timedelta(days=1), price_per_night=Decimal('60.00'),
+        )
+        booking = make_booking(self.listing, self.guest, nights=2)
+        self.assertEqual(booking.total_price, Decimal('200.00'))
+
+    def test_cache_is_invalidated_on_change(self):
+        stay = (self.start, self.start + timedelta(days=1))
+        quote(self.listing.pk, *stay)
+        with self.assertNumQueries(0):
+            self.assertEqual(quote(self.listing.pk, *stay).total, Decimal('140.00'))
+
+        self.listing.price_per_night = Decimal('120.00')
+        self.listing.save()
+        self.assertEqual(quote(self.listing.pk, *stay).total, Decimal('160.00'))
+
+        override = PriceOverride.objects.create(
+            listing=self.listing, start_date=self.start,
+            end_date=stay[1], price_per_night=Decimal('80.00'),
+        )
+        self.assertEqual(quote(self.listing.pk, *stay).total, Decimal('120.00'))
+        override.delete()
+        self.assertEqual(quote(self.listing.pk, *stay).total, Decimal('160.00'))
+
+    def test_pricing_loaded_before_a_commit_is_not_served_after(self):
+        stay = (self.start, self.start + timedelta(days=1))
+        stale = load_pricing([self.listing.pk])
+        Listing.objects.filter(pk=self.listing.pk).update(price_per_night=Decimal('120.00'))
+
+        def load_then_commit(listing_ids):
+            # The writer commits, bumping the stamp, while this reader loads
+            invalidate([self.listing.pk])
+            return stale
+
+        with mock.patch('listings.pricing.load_pricing', side_effect=load_then_commit):
+            self.assertEqual(quote(self.listing.pk, *stay).total, Decimal('140.00'))
+        self.assertEqual(quote(self.listing.pk, *stay).total, Decimal('160.00'))
+
+    def test_quote_many_is_batched(self):
+        others = [make_listing(self.host, price_per_night=Decimal(50 + i)) for i in range(20)]
+        ids = [self.listing.pk] + [listing.pk for listing in others] + [0]
+        with self.assertNumQueries(2):
+            quotes = quote_many(ids, self.start, self.start + timedelta(days=2))
+        self.assertEqual(len(quotes), 21)
+        self.assertEqual(quotes[others[3].pk].total, Decimal('106.00'))
+        with self.assertNumQueries(0):
+            quote_many(ids[:-1], self.start, self.start + timedelta(days=5))
+
+    def test_search_and_quote_endpoints(self):
+        params = {'check_in': self.start, 'check_out': self.start + timedelta(days=7)}
+        response = self.client.get(reverse('listing-search'), params)
+        self.assertEqual(response.data['results'][0]['quote']['total'], '670.00')
+        response = self.client.get(reverse('listing-quote', args=[self.listing.pk]), params)
+        self.assertEqual(response.data['nights'], 7)
+        self.assertEqual(response.data['discount'], '70.00')
+        response = self.client.get(reverse('listing-quote', args=[self.listing.pk]))
+        self.assertEqual(response.status_code, 400)
+
+
+class ResponseCacheTests(APITestCase):
+    """Versioned caching of listing detail and search responses"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+        cls.listing = make_listing(cls.host)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('listing-detail', args=[self.listing.pk])
+
+    def test_detail_is_cached_until_a_review_changes_it(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        make_review(make_booking(self.listing, self.guest), 4)
+        third = self.client.get(self.url)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+        self.assertEqual(third.data['total_reviews'], 1)
+
+    def test_matching_etag_gets_304_without_queries(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.listing.title = 'Renamed'
+        self.listing.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Renamed')
+
+    def test_deactivated_listing_is_not_served_from_cache(self):
+        self.client.get(self.url)
+        self.listing.is_active = False
+        self.listing.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_search_is_cached_until_a_booking_changes_it(self):
+        check_in = date.today() + timedelta(days=3)
+        params = {'check_in': check_in, 'check_out': check_in + timedelta(days=2)}
+        self.assertEqual(len(self.client.get(reverse('listing-search'), params).data['results']), 1)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('listing-search'), params)
+
+        make_booking(self.listing, self.guest, offset=3, status='confirmed')
+        self.assertEqual(self.client.get(reverse('listing-search'), params).data['results'], [])
+
+    def test_stats_endpoint(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.get(self.url)
+        self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(self.client.get(reverse('cache-stats')).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('cache-stats'))
+        self.assertEqual(response.data['listing_detail'], {
+            'hit': 1, 'miss': 1, 'not_modified': 1, 'hit_ratio': 0.6667,
+        })
+        self.assertIsNone(response.data['listing_search']['hit_ratio'])
+        self.client.delete(reverse('cache-stats'))
+        self.assertEqual(self.client.get(reverse('cache-stats')).data['listing_detail']['miss'], 0)
+
+
+class FastPathTests(APITestCase):
+    """values()-based rendering matches the DRF serializers byte for byte"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='hôte', first_name='Zoë')
+        cls.guest = User.objects.create(username='guest')
+        cls.listing = make_listing(
+            cls.host, title='Line\u2028break "quoted" ☀', latitude=Decimal('48.856600'),
+            longitude=Decimal('2.352200'), amenities=['WiFi', 'Pool'], house_rules={'pets': False},
+        )
+        cls.bare = make_listing(cls.host, title='Bare', cleaning_fee=Decimal('12.5'))
+        booking = make_booking(cls.listing, cls.guest, offset=-5)
+        make_review(booking, 4, cleanliness_rating=5, comment='Très bien')
+        make_booking(cls.bare, cls.guest, offset=3, status='pending')
+
+    def assertSameBytes(self, serializer_class, queryset, **kwargs):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, **kwargs).data)
+        plan = compile_plan(serializer_class(**kwargs))
+        actual = FastJSONRenderer().render(plan.render(plan.values(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_matches_drf_output(self):
+        listings = Listing.objects.order_by('pk')
+        bookings = Booking.objects.order_by('pk')
+        self.assertSameBytes(ListingSerializer, listings)
+        self.assertSameBytes(ListingSummarySerializer, listings, expand=['host', 'reviews'])
+        self.assertSameBytes(BookingSerializer, bookings)
+        self.assertSameBytes(BookingSummarySerializer, bookings, expand=['listing.reviews'])
+        self.assertSameBytes(ReviewSerializer, Review.objects.all(), fields=['id', 'guest', 'created_at'])
+
+    def test_list_endpoint_uses_fast_path(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('listing-list'), {'expand': 'reviews'})
+        self.assertEqual(len(queries), 2)
+        self.assertIn(' FROM "listings_review"', queries.captured_queries[1]['sql'])
+        page = Listing.objects.filter(is_active=True).order_by('-created_at', '-id')
+        expected = ListingSummarySerializer(page, many=True, expand=['reviews']).data
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render({'next': None, 'previous': None, 'results': expected}),
+        )
+
+    def test_unsupported_serializer_falls_back(self):
+        class WithMethod(ListingSummarySerializer):
+            shout = serializers.SerializerMethodField()
+
+            class Meta(ListingSummarySerializer.Meta):
+                fields = ListingSummarySerializer.Meta.fields + ['shout']
+
+            def get_shout(self, obj):
+                return obj.title.upper()
+
+        self.assertIsNone(compile_plan(WithMethod()))
+
+
+class FullTextSearchTests(APITestCase):
+    """Ranked prefix search over listing text, with both backends"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.loft = make_listing(
+            cls.host, title='Seaside loft', description='Bright rooms', amenities=['WiFi', 'Pool'],
+        )
+        cls.cabin = make_listing(
+            cls.host, title='Forest cabin', description='Walk to the seaside in ten minutes',
+            amenities=['WiFi', 'Pool table'],
+        )
+        cls.cafe = make_listing(
+            cls.host, title='Rooms above the Café', city='Lyon', amenities=['Espresso machine'],
+        )
+        cls.hidden = make_listing(cls.host, title='Seaside secret', is_active=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def backends(self):
+        backends = [fulltext.InMemoryBackend()]
+        if connection.vendor == 'sqlite':
+            backends.append(fulltext.SQLiteFTSBackend())
+        for backend in backends:
+            with self.subTest(backend=type(backend).__name__), \
+                    mock.patch.object(fulltext, '_backend', backend):
+                yield backend
+
+    def ids(self, query, **kwargs):
+        return [pk for pk, _ in fulltext.search(query, **kwargs)]
+
+    def test_title_matches_rank_first(self):
+        for backend in self.backends():
+            self.assertEqual(self.ids('seaside'), [self.loft.pk, self.cabin.pk])
+
+    def test_words_match_as_prefixes_and_all_must_match(self):
+        for backend in self.backends():
+            self.assertEqual(self.ids('sea lof'), [self.loft.pk])
+            self.assertEqual(self.ids('seaside lyon'), [])
+
+    def test_accents_are_ignored(self):
+        for backend in self.backends():
+            self.assertEqual(self.ids('cafe'), [self.cafe.pk])
+            self.assertEqual(self.ids('CAFÉ lyon'), [self.cafe.pk])
+
+    def test_amenities_must_match_exactly(self):
+        for backend in self.backends():
+            self.assertEqual(self.ids('', amenities=['pool']), [self.loft.pk])
+            self.assertEqual(self.ids('seaside', amenities=['WiFi']), [self.loft.pk, self.cabin.pk])
+            self.assertEqual(self.ids('', amenities=['Pool table', 'WiFi']), [self.cabin.pk])
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 is SQLite only')
+    def test_amenity_search_stops_at_the_limit(self):
+        backend = fulltext.SQLiteFTSBackend()
+        with mock.patch.object(fulltext, 'FETCH_SIZE', 1), \
+                mock.patch.object(fulltext, 'has_amenities', wraps=fulltext.has_amenities) as checked:
+            self.assertEqual(backend.search('seaside', amenities=['WiFi'], limit=1), [(self.loft.pk, mock.ANY)])
+        self.assertEqual(checked.call_count, 1)
+
+    def test_inactive_listings_are_optional(self):
+        for backend in self.backends():
+            self.assertNotIn(self.hidden.pk, self.ids('secret'))
+            self.assertEqual(self.ids('secret', active_only=False), [self.hidden.pk])
+
+    def test_saves_and_deletes_reindex(self):
+        for backend in self.backends():
+            backend.rebuild()
+            listing = make_listing(self.host, title='Harbour studio')
+            self.assertEqual(self.ids('harb'), [listing.pk])
+            listing.title = 'Mountain studio'
+            listing.save()
+            self.assertEqual(self.ids('harb'), [])
+            self.assertEqual(self.ids('mountain'), [listing.pk])
+            listing.delete()
+            self.assertEqual(self.ids('mountain'), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 triggers are SQLite only')
+    def test_triggers_index_bulk_writes(self):
+        Listing.objects.filter(pk=self.cafe.pk).update(title='Riverside rooms')
+        self.assertEqual(self.ids('riverside'), [self.cafe.pk])
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {fulltext.FTS_TABLE}_au')
+        self.assertTrue(fulltext.SQLiteFTSBackend().ensure_schema())
+        Listing.objects.filter(pk=self.cafe.pk).update(title='Hilltop rooms')
+        self.assertEqual(self.ids('riverside'), [])
+        self.assertEqual(self.ids('hilltop'), [self.cafe.pk])
+
+    def test_endpoint_returns_ranked_rows_with_scores(self):
+        response = self.client.get(reverse('listing-text-search'), {'q': 'seaside', 'amenities': 'WiFi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [self.loft.pk, self.cabin.pk])
+        self.assertEqual(response.data[0]['score'], 1.0)
+        self.assertLess(response.data[1]['score'], 1.0)
+        self.assertNotIn('description', response.data[0])
+
+    def test_endpoint_requires_words_or_amenities(self):
+        response = self.client.get(reverse('listing-text-search'), {'q': '  '})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_search_uses_index(self):
+        model_admin = ListingAdmin(Listing, site)
+        for backend in self.backends():
+            queryset, duplicates = model_admin.get_search_results(None, Listing.objects.all(), 'seas')
+            self.assertFalse(duplicates)
+            self.assertEqual(set(queryset), {self.loft, self.cabin, self.hidden})
+
+
+class FeatureFilterTests(APITestCase):
+    """Amenity and house-rule filters through the indexed feature links"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.pool = make_listing(
+            cls.host, title='Pool', amenities=['WiFi', 'Pool'], house_rules=['No pets'],
+        )
+        cls.gym = make_listing(
+            cls.host, title='Gym', amenities=['wifi ', 'Gym'], house_rules=['No pets', 'No smoking'],
+        )
+        cls.bare = make_listing(cls.host, title='Bare', amenities=[], house_rules={'pets': True})
+
+    def titles(self, queryset):
+        return sorted(queryset.values_list('title', flat=True))
+
+    def test_names_share_one_feature_regardless_of_case(self):
+        self.assertEqual(Feature.objects.filter(kind='amenity', key='wifi').count(), 1)
+        self.assertEqual(ListingFeature.objects.filter(listing=self.bare).count(), 0)
+
+    def test_all_and_any_filters(self):
+        listings = Listing.objects.all()
+        self.assertEqual(self.titles(with_amenities(listings, ['WIFI'])), ['Gym', 'Pool'])
+        self.assertEqual(self.titles(with_amenities(listings, ['WiFi', 'Pool'])), ['Pool'])
+        self.assertEqual(self.titles(with_amenities(listings, ['Pool', 'Gym'], match='any')), ['Gym', 'Pool'])
+        self.assertEqual(self.titles(with_amenities(listings, ['Sauna'])), [])
+        self.assertEqual(self.titles(with_house_rules(listings, ['no smoking'])), ['Gym'])
+
+    def test_saving_resyncs_links(self):
+        self.pool.amenities = ['Pool', 'Sauna']
+        self.pool.save(update_fields=['amenities'])
+        listings = Listing.objects.all()
+        self.assertEqual(self.titles(with_amenities(listings, ['WiFi'])), ['Gym'])
+        self.assertEqual(self.titles(with_amenities(listings, ['sauna'])), ['Pool'])
+
+    def test_bulk_updates_resync_explicitly(self):
+        Listing.objects.filter(pk=self.bare.pk).update(amenities=['Gym'])
+        sync_listing_features([self.bare.pk])
+        self.assertEqual(self.titles(with_amenities(Listing.objects.all(), ['gym'])), ['Bare', 'Gym'])
+
+    def test_api_filters_keep_json_shape(self):
+        response = self.client.get(reverse('listing-list'), {
+            'amenities': 'wifi', 'house_rules': 'No pets', 'fields': 'title',
+        })
+        self.assertEqual([row['title'] for row in response.data['results']], ['Gym', 'Pool'])
+        response = self.client.get(reverse('listing-detail', args=[self.gym.pk]))
+        self.assertEqual(response.data['amenities'], ['wifi ', 'Gym'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'checks an SQLite query plan')
+    def test_filter_uses_feature_index(self):
+        queryset = with_amenities(Listing.objects.all(), ['WiFi', 'Pool'])
+        with connection.cursor() as cursor:
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        # SQLite names the unique constraints' indexes sqlite_autoindex_*
+        self.assertIn('(kind=? AND key=?)', plan)
+        self.assertIn('(feature_id=?)', plan)
+        self.assertNotIn('SCAN', plan)
+
+
+class DatabaseConfigTests(TestCase):
+    """SQLite pragmas, persistent connections and replica aliases from the environment"""
+
+    def test_replicas_are_read_only_aliases(self):
+        databases = databases_from_env(Path('/srv/app'), {
+            'DATABASE_REPLICAS': '/srv/r1.sqlite3, /srv/r2.sqlite3',
+            'DATABASE_CONN_MAX_AGE': '0',
+        })
+        self.assertEqual(list(databases), ['default', 'replica_1', 'replica_2'])
+        self.assertEqual(databases['default']['NAME'], '/srv/app/db.sqlite3')
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 0)
+        self.assertNotIn('query_only', databases['default']['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA query_only=1', databases['replica_2']['OPTIONS']['init_command'])
+        self.assertEqual(databases['replica_1']['TEST'], {'MIRROR': 'default'})
+
+    @skipUnless(connection.vendor == 'sqlite', 'checks SQLite pragmas')
+    def test_connection_applies_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    """Replica choice by health and lag, and read-your-writes pinning"""
+
+    def setUp(self):
+        self.lags = {'replica_1': 0.5, 'replica_2': None, 'replica_3': 60.0}
+        self.now = 0.0
+        self.monitor = ReplicaMonitor(
+            aliases=list(self.lags), probe=lambda alias: self.lags[alias], clock=lambda: self.now,
+        )
+        self.router = ReplicaRouter(self.monitor)
+
+    def fresh(self, func, *args):
+        """Run ``func`` in a context where nothing has written yet"""
+        return contextvars.Context().run(func, *args)
+
+    def read(self, model=Listing):
+        return self.fresh(self.router.db_for_read, model)
+
+    def test_reads_go_to_healthy_fresh_replicas(self):
+        self.assertEqual({self.read() for _ in range(20)}, {'replica_1'})
+        self.assertEqual(self.read(Review), 'replica_1')
+        self.assertEqual(self.read(Booking), 'default')
+
+    def test_falls_back_to_primary_and_rechecks_after_interval(self):
+        self.assertEqual(self.read(), 'replica_1')
+        self.lags['replica_1'] = None
+        self.assertEqual(self.read(), 'replica_1')  # still cached as healthy
+        self.now = 10.0
+        self.assertEqual(self.read(), 'default')
+        self.lags['replica_3'] = 1.0
+        self.now = 20.0
+        self.assertEqual(self.read(), 'replica_3')
+
+    def test_writes_pin_reads_to_primary(self):
+        def write_then_read():
+            before = self.router.db_for_read(Listing)
+            self.router.db_for_write(Booking)
+            return before, self.router.db_for_read(Listing)
+
+        self.assertEqual(self.fresh(write_then_read), ('replica_1', 'default'))
+
+    def test_primary_only_block(self):
+        def read_in_block():
+            with primary_only():
+                return self.router.db_for_read(Listing)
+
+        self.assertEqual(self.fresh(read_in_block), 'default')
+
+    def test_middleware_unpins_each_request(self):
+        def view(request):
+            self.router.db_for_write(Booking)
+            return is_pinned()
+
+        def two_requests():
+            middleware = PrimaryPinningMiddleware(view)
+            pinned = middleware(RequestFactory().get('/'))
+            return pinned, is_pinned()
+
+        self.assertEqual(self.fresh(two_requests), (True, False))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_1', 'listings'))
+        self.assertTrue(self.router.allow_migrate('default', 'listings'))
+
+
+class HeartbeatTests(TestCase):
+    """Replica lag measured from the heartbeat row"""
+
+    def test_lag_is_time_since_last_beat(self):
+        beat(clock=lambda: 100.0)
+        self.assertEqual(heartbeat_lag('default', clock=lambda: 102.5), 2.5)
+
+
+class AsyncSearchTests(TestCase):
+    """Async search and availability views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.cheap = make_listing(
+            cls.host, title='Cheap', price_per_night=Decimal('80.00'),
+            latitude=Decimal('48.856600'), longitude=Decimal('2.352200'),
+        )
+        cls.booked = make_listing(cls.host, title='Booked', latitude=Decimal('48.860000'), longitude=Decimal('2.340000'))
+        cls.far = make_listing(
+            cls.host, title='Far', price_per_night=Decimal('120.00'),
+            latitude=Decimal('45.764000'), longitude=Decimal('4.835700'),
+        )
+        make_booking(cls.booked, cls.guest, offset=3, nights=4, status='confirmed')
+
+    def setUp(self):
+        cache.clear()
+        self.check_in = date.today() + timedelta(days=4)
+        self.window = {'check_in': self.check_in, 'check_out': self.check_in + timedelta(days=2)}
+
+    async def test_search_matches_sync_endpoint(self):
+        response = await self.async_client.get(reverse('async-listing-search'), {**self.window, 'city': 'Paris'})
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.client.get)(
+            reverse('listing-search'), {**self.window, 'city': 'Paris'}
+        )
+        self.assertEqual(response.json(), expected.json()['results'])
+        self.assertEqual([row['title'] for row in response.json()], ['Cheap', 'Far'])
+
+    async def test_search_limit(self):
+        url = reverse('async-listing-search')
+        response = await self.async_client.get(url, {**self.window, 'limit': 1})
+        self.assertEqual([row['title'] for row in response.json()], ['Cheap'])
+        response = await self.async_client.get(url, {**self.window, 'lat': 48.8566, 'lng': 2.3522, 'radius_km': 50, 'limit': 1})
+        self.assertEqual([row['title'] for row in response.json()], ['Cheap'])
+        response = await self.async_client.get(url, {**self.window, 'limit': 501})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_search_by_radius(self):
+        response = await self.async_client.get(
+            reverse('async-listing-search'), {**self.window, 'lat': 48.8566, 'lng': 2.3522, 'radius_km': 5},
+        )
+        self.assertEqual([(row['title'], row['distance_km']) for row in response.json()], [('Cheap', 0.0)])
+        response = await self.async_client.get(reverse('async-listing-search'), {**self.window, 'lat': 48.8})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_availability(self):
+        url = reverse('async-listing-availability', args=[self.booked.pk])
+        response = await self.async_client.get(url, self.window)
+        self.assertFalse(response.json()['available'])
+        self.assertEqual(response.json()['quote']['nights'], 2)
+        url = reverse('async-listing-availability', args=[self.cheap.pk])
+        self.assertTrue((await self.async_client.get(url, self.window)).json()['available'])
+        url = reverse('async-listing-availability', args=[0])
+        self.assertEqual((await self.async_client.get(url, self.window)).status_code, 404)
+
+
+class InstrumentationTests(APITestCase):
+    """Per-request query counts, Server-Timing, structured logs and /metrics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        for number in range(3):
+            listing = make_listing(cls.host, title=f'Listing {number}')
+            make_review(make_booking(listing, cls.guest, offset=-10), 4)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def timing(self, response):
+        entries = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            entries[name] = dict(param.split('=', 1) for param in params)
+        return entries
+
+    def test_server_timing_counts_queries(self):
+        url = reverse('listing-detail', args=[Listing.objects.first().pk])
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('alx_travel_app.requests') as logs:
+            response = self.client.get(url)
+        timing = self.timing(response)
+        self.assertEqual(timing['db']['desc'], f'"{len(queries)} queries"')
+        self.assertIn('serialize', timing)
+        self.assertIn('render', timing)
+        self.assertGreaterEqual(float(timing['total']['dur']), float(timing['db']['dur']))
+
+        record, = logs.records
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertEqual(record.fields['route'], 'listing-detail')
+        self.assertEqual(record.fields['status'], 200)
+        self.assertEqual(record.fields['db_queries'], len(queries))
+        line = json.loads(JSONFormatter().format(record))
+        self.assertEqual(line['db_queries'], len(queries))
+        self.assertEqual(line['logger'], 'alx_travel_app.requests')
+
+    def test_other_execute_wrappers_are_left_alone(self):
+        seen = []
+
+        def wrapper(execute, sql, params, many, context):
+            seen.append(sql)
+            return execute(sql, params, many, context)
+
+        with self.assertLogs('alx_travel_app.requests'):
+            with connection.execute_wrapper(wrapper):
+                self.client.get(reverse('listing-list'))
+        self.assertTrue(seen)
+        self.assertNotIn(wrapper, connection.execute_wrappers)
+
+    @override_settings(REQUEST_QUERY_BUDGET=1)
+    def test_query_budget(self):
+        with self.assertLogs('alx_travel_app.requests') as logs:
+            for listing in Listing.objects.all():
+                self.client.get(reverse('listing-detail', args=[listing.pk]))
+        self.assertTrue(all(record.levelname == 'WARNING' for record in logs.records))
+        self.assertEqual(logs.records[0].fields['query_budget'], 1)
+        self.assertIn('http_requests_over_query_budget_total{route="listing-detail",method="GET"} 3',
+                      registry.render())
+
+    @override_settings(SLOW_REQUEST_MS=0, SLOW_REQUEST_SAMPLE_RATE=1.0)
+    def test_slow_requests_are_sampled_with_sql(self):
+        with self.assertLogs('alx_travel_app.requests', 'WARNING') as logs:
+            self.client.get(reverse('listing-list'))
+        record, = logs.records
+        self.assertTrue(record.fields['slow'])
+        self.assertEqual(len(record.fields['sql']), record.fields['db_queries'])
+        self.assertIn('listings_listing', record.fields['sql'][-1]['sql'])
+
+    @override_settings(SLOW_REQUEST_MS=0, SLOW_REQUEST_SAMPLE_RATE=0.0)
+    def test_slow_sampling_rate(self):
+        with self.assertLogs('alx_travel_app.requests') as logs:
+            self.client.get(reverse('listing-list'))
+        self.assertNotIn('sql', logs.records[0].fields)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_endpoint(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with self.assertLogs('alx_travel_app.requests'):
+            self.client.get(reverse('listing-list'))
+            self.client.get(reverse('listing-list'))
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="listing-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{route="listing-list",method="GET"} 2', body)
+        self.assertIn('http_requests_total{route="listing-list",method="GET",status="200"} 2', body)
+
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        with self.assertLogs('alx_travel_app.requests'):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    async def test_async_views_are_measured(self):
+        check_in = date.today() + timedelta(days=4)
+        with self.assertLogs('alx_travel_app.requests') as logs:
+            response = await self.async_client.get(
+                reverse('async-listing-search'), {'check_in': check_in, 'check_out': check_in + timedelta(days=2)},
+            )
+        self.assertEqual(len(response.json()), 3)
+        self.assertGreater(logs.records[0].fields['db_queries'], 0)
+        self.assertIn('serialize', self.timing(response))
+
+
+class QueryBudgetTests(APITestCase):
+    """Admin changelists and booking creation cost the same queries at any size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def test_admin_changelists(self):
+        # Session and user, table estimate, capped count, the page and the
+        # date hierarchy's range; filter values and the date hierarchy's
+        # years only until they are cached
+        expected = {'listing': (9, 6), 'booking': (7, 6), 'review': (8, 6)}
+        self.client.force_login(self.admin)
+        for rows in (1, 60):
+            bulk_listings_with_reviews(self.host, self.guest, rows)
+            cache.clear()
+            for model, (cold, warm) in expected.items():
+                url = reverse(f'admin:listings_{model}_changelist')
+                with self.subTest(model=model, rows=rows):
+                    with self.assertNumQueries(cold):
+                        self.assertEqual(self.client.get(url).status_code, 200)
+                    with self.assertNumQueries(warm):
+                        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_booking_create(self):
+        listing = make_listing(self.host)
+        counts = []
+        for offset in (10, 20, 30):
+            check_in = date.today() + timedelta(days=offset)
+            counts.append(self.count_queries(
+                lambda: create_booking(self.guest, listing.pk, check_in, check_in + timedelta(days=3), 1)
+            ))
+        # The first booking also loads the listing's pricing into the cache
+        self.assertEqual(counts[1], counts[2])
+        self.assertLessEqual(counts[1], 6)
+
+
+class BenchmarkHarnessTests(SimpleTestCase):
+    """Measurements and regression checks of the bench_suite command"""
+
+    def results(self, **scenario):
+        return {'scenarios': {'listing.detail': {'queries': 2, 'wall_ms': 10.0, 'peak_kib': 200.0, **scenario}}}
+
+    def test_measure(self):
+        calls = []
+        stats = measure(lambda: calls.append(bytearray(512 * 1024)), repeat=3)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(stats['queries'], 0)
+        self.assertGreaterEqual(stats['peak_kib'], 512)
+        self.assertGreaterEqual(stats['p95_ms'], stats['wall_ms'])
+
+    def test_regressions(self):
+        baseline = self.results()
+        self.assertEqual(find_regressions(self.results(), baseline), [])
+        self.assertEqual(find_regressions(self.results(queries=1, wall_ms=14.0, peak_kib=250.0), baseline), [])
+        self.assertEqual(
+            find_regressions(self.results(queries=3), baseline),
+            ['listing.detail: 3 queries, baseline 2'],
+        )
+        self.assertEqual(len(find_regressions(self.results(wall_ms=15.5), baseline)), 1)
+        self.assertEqual(len(find_regressions(self.results(peak_kib=300.0), baseline)), 1)
+        self.assertEqual(
+            find_regressions({'scenarios': {}}, baseline), ['listing.detail: missing from the results']
+        )
+
+    def test_small_numbers_need_an_absolute_change(self):
+        baseline = {'scenarios': {'booking.validate': {'queries': 2, 'wall_ms': 0.4, 'peak_kib': 10.0}}}
+        results = {'scenarios': {'booking.validate': {'queries': 2, 'wall_ms': 1.2, 'peak_kib': 60.0}}}
+        self.assertEqual(find_regressions(results, baseline), [])
+
+
+class LargeTableAdminTests(TestCase):
+    """Estimated counts, cached filter values and column trimming in the admin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        bulk_listings_with_reviews(cls.host, cls.guest, 12)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        response = self.client.get(reverse(f'admin:listings_{model}_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_counts_are_estimated_or_capped(self):
+        Booking.objects.filter(pk=Booking.objects.order_by('pk').first().pk).delete()
+        cl = self.changelist('booking')
+        # Unfiltered: the largest id, which still counts the deleted row
+        self.assertEqual(cl.result_count, Booking.objects.order_by('-pk').first().pk)
+        self.assertEqual(Booking.objects.count(), 11)
+        cl = self.changelist('booking', status__exact='completed')
+        self.assertEqual(cl.result_count, 5)
+
+    def test_small_tables_are_counted_exactly(self):
+        self.assertEqual(self.changelist('review').result_count, 12)
+        self.assertEqual(self.changelist('listing', city='Paris').result_count, 12)
+
+    def test_filter_values_are_cached(self):
+        cl = self.changelist('listing')
+        city = next(spec for spec in cl.filter_specs if spec.field_path == 'city')
+        self.assertEqual(city.lookup_choices, ['Paris'])
+        make_listing(self.host, city='Lyon')
+        cl = self.changelist('listing')
+        city = next(spec for spec in cl.filter_specs if spec.field_path == 'city')
+        self.assertEqual(city.lookup_choices, ['Paris'])
+        cache.clear()
+        cl = self.changelist('listing')
+        city = next(spec for spec in cl.filter_specs if spec.field_path == 'city')
+        self.assertEqual(city.lookup_choices, ['Lyon', 'Paris'])
+
+    def test_only_displayed_columns_are_loaded(self):
+        cl = self.changelist('booking')
+        booking = cl.result_list[0]
+        self.assertIn('special_requests', booking.get_deferred_fields())
+        with self.assertNumQueries(0):
+            str(booking.listing)
+            str(booking.guest)
+
+    def test_date_hierarchy_lists_are_cached(self):
+        url = reverse('admin:listings_booking_changelist')
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(url)
+        self.assertTrue(any('DISTINCT django_date_trunc' in query['sql'] for query in cold))
+        self.assertFalse(any('DISTINCT' in query['sql'] for query in warm))
+
+    def test_queryset_leaves_the_alias_to_the_router(self):
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        queryset = ListingAdmin(Listing, site).get_queryset(request)
+        self.assertIsNone(queryset._db)
+        self.assertTrue(hasattr(queryset, 'cached_key'))
+        self.assertEqual(queryset.count(), 12)
+
+    def test_date_hierarchy_drilldown(self):
+        year = Booking.objects.first().check_in_date.year
+        cl = self.changelist('booking', check_in_date__year=year)
+        self.assertEqual(cl.result_count, 12)
+        self.assertEqual(self.changelist('review', created_at__year=year + 1).result_count, 0)
+
+
+class BookingJobTests(TestCase):
+    """Lifecycle jobs: batched, idempotent, resumable, and claimed by one worker"""
+
+    def setUp(self):
+        self.host = User.objects.create(username='host')
+        self.guest = User.objects.create(username='guest')
+        self.listing = make_listing(self.host)
+        self.worker = Worker(name='test-worker', batch_size=2)
+
+    def age(self, booking, hours):
+        Booking.objects.filter(pk=booking.pk).update(created_at=timezone.now() - timedelta(hours=hours))
+
+    def run_job(self, name):
+        enqueue(name)
+        with self.assertLogs('listings.jobs'):
+            return self.worker.run_pending()
+
+    def test_stale_pending_bookings_expire(self):
+        stale = [make_booking(self.listing, self.guest, offset=10 * n, status='pending') for n in range(3)]
+        fresh = make_booking(self.listing, self.guest, offset=40, status='pending')
+        for booking in stale:
+            self.age(booking, 25)
+        [report] = self.run_job('expire_pending_bookings')
+        self.assertEqual((report['status'], report['rows'], report['batches']), ('done', 3, 2))
+        self.assertGreater(report['backlog_lag_s'], 3000)
+        self.assertEqual(
+            set(Booking.objects.filter(status='cancelled').values_list('pk', flat=True)),
+            {booking.pk for booking in stale},
+        )
+        self.assertEqual(set(BookedNight.objects.values_list('booking_id', flat=True)), {fresh.pk})
+        # Idempotent: a rerun finds nothing left to do
+        [report] = self.run_job('expire_pending_bookings')
+        self.assertEqual(report['rows'], 0)
+
+    def test_past_stays_complete(self):
+        past = make_booking(self.listing, self.guest, offset=-6, status='confirmed')
+        # Checks out today, so the stay is over
+        ending = make_booking(self.listing, self.guest, offset=-3, nights=3, status='confirmed')
+        current = make_booking(self.listing, self.guest, offset=0, nights=3, status='confirmed')
+        self.run_job('complete_past_stays')
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {past.pk: 'completed', ending.pk: 'completed', current.pk: 'confirmed'})
+        # Completed stays keep their nights
+        self.assertEqual(BookedNight.objects.count(), 8)
+
+    def test_transitions_measure_lag_by_default(self):
+        class CancelPastPending(BookingTransition):
+            source = 'pending'
+            target = 'cancelled'
+            order_field = 'check_in_date'
+
+            def eligible(self, now):
+                return super().eligible(now).filter(check_in_date__lt=timezone.localdate(now))
+
+        make_booking(self.listing, self.guest, offset=-2, nights=1, status='pending')
+        self.assertEqual(CancelPastPending().lag(timezone.now()), 2 * 86400)
+        self.assertEqual(JOBS['complete_past_stays'].lag(timezone.now()), 0)
+
+    def test_interrupted_run_resumes_from_cursor(self):
+        listings = [self.listing] + [make_listing(self.host) for _ in range(4)]
+        review = make_review(make_booking(listings[-1], self.guest), 4)
+        Listing.objects.update(review_count=0, rating_sum=0, rating_average=0)
+        enqueue('refresh_listing_aggregates')
+        with self.assertLogs('listings.jobs'):
+            report = self.worker.run(self.worker.claim(), max_batches=1)
+        job = Job.objects.get()
+        self.assertEqual((report['status'], job.status, job.processed, job.attempts), ('queued', 'queued', 2, 0))
+        self.assertEqual(job.cursor, {'after': listings[1].pk})
+
+        # A worker that dies mid-run leaves the job running until its lease ends
+        Job.objects.update(status='running', locked_by='dead-worker', locked_until=timezone.now() + timedelta(minutes=5))
+        self.assertIsNone(Worker(name='other').claim())
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('listings.jobs'):
+            [report] = Worker(name='other', batch_size=2).run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.attempts), ('done', 5, 1))
+        self.assertEqual(Listing.objects.get(pk=review.listing_id).review_count, 1)
+
+    def test_lost_lease_rolls_back_the_batch(self):
+        make_booking(self.listing, self.guest, status='pending')
+        self.age(Booking.objects.get(), 25)
+        enqueue('expire_pending_bookings')
+        job = self.worker.claim()
+        Job.objects.update(locked_by='someone-else')
+        with self.assertLogs('listings.jobs', 'WARNING'):
+            report = self.worker.run(job)
+        self.assertEqual(report['status'], 'lost')
+        self.assertIn(job.status, {choice for choice, _ in Job.STATUS_CHOICES})
+        self.assertEqual(Booking.objects.get().status, 'pending')
+
+    def test_failed_runs_are_retried_then_given_up(self):
+        enqueue('complete_past_stays')
+        worker = Worker(name='test-worker', max_attempts=2)
+        with mock.patch('listings.jobs.CompletePastStays.step', side_effect=RuntimeError('boom')):
+            for attempt, expected in [(1, 'queued'), (2, 'failed')]:
+                Job.objects.update(run_after=timezone.now())
+                with self.assertLogs('listings.jobs', 'ERROR'):
+                    [report] = worker.run_pending()
+                job = Job.objects.get()
+                self.assertEqual((job.attempts, job.status), (attempt, expected))
+                self.assertIn('boom', job.last_error)
+
+    def test_schedule_enqueues_each_slot_once(self):
+        now = timezone.now()
+        self.assertEqual(len(enqueue_due(now)), 4)
+        self.assertEqual(enqueue_due(now), [])
+        Job.objects.update(status='done')
+        enqueue_due(now)
+        self.assertEqual(Job.objects.count(), 4)
+
+    def test_one_claim_per_job(self):
+        enqueue('complete_past_stays')
+        self.assertIsNotNone(Worker(name='a').claim())
+        self.assertIsNone(Worker(name='b').claim())
+
+    def test_run_worker_command(self):
+        make_booking(self.listing, self.guest, offset=-5, status='confirmed')
+        out = StringIO()
+        with self.assertLogs('listings.jobs'):
+            call_command('run_worker', once=True, stdout=out)
+        self.assertIn('complete_past_stays', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(Booking.objects.get().status, 'completed')
+        out = StringIO()
+        call_command('run_worker', status=True, stdout=out)
+        self.assertIn('expire_pending_bookings', out.getvalue())
+
+
+class HostAnalyticsTests(APITestCase):
+    """Daily rollups kept by signals and jobs, their backfill, and the analytics endpoint"""
+
+    def setUp(self):
+        self.host = User.objects.create(username='host')
+        self.guest = User.objects.create(username='guest')
+        self.listing = make_listing(self.host, title='Loft')
+        self.url = reverse('host-analytics')
+
+    def book(self, check_in, nights, **overrides):
+        fields = {
+            'listing': self.listing, 'guest': self.guest, 'check_in_date': check_in,
+            'check_out_date': check_in + timedelta(days=nights), 'number_of_guests': 1,
+            'status': 'confirmed', 'total_price': Decimal('400.01'),
+        }
+        fields.update(overrides)
+        return Booking.objects.create(**fields)
+
+    def days(self, listing=None):
+        """Non-empty rollup rows as (date, nights, revenue, cancellations, reviews, rating sum)"""
+        return [
+            (row.date, row.nights_booked, row.revenue, row.cancellations, row.review_count, row.rating_sum)
+            for row in ListingDailyStats.objects.filter(listing=listing or self.listing).order_by('date')
+            if row.nights_booked or row.cancellations or row.review_count
+        ]
+
+    def test_stays_split_into_nights_across_months(self):
+        self.book(date(2026, 1, 30), 4)
+        self.assertEqual(self.days(), [
+            (date(2026, 1, 30), 1, Decimal('100.01'), 0, 0, 0),
+            (date(2026, 1, 31), 1, Decimal('100.00'), 0, 0, 0),
+            (date(2026, 2, 1), 1, Decimal('100.00'), 0, 0, 0),
+            (date(2026, 2, 2), 1, Decimal('100.00'), 0, 0, 0),
+        ])
+
+    def test_stays_without_nights_earn_nothing(self):
+        self.assertEqual(nightly_revenue(Decimal('100.00'), 0), [])
+        day = date(2026, 1, 5)
+        self.assertEqual(booking_days([(self.listing.pk, day, day, 'confirmed', Decimal('100.00'))]), {})
+
+    def test_rollups_follow_booking_changes(self):
+        booking = self.book(date(2026, 3, 10), 2, status='pending')
+        self.assertEqual(self.days(), [])
+        booking.status = 'confirmed'
+        booking.save()
+        self.assertEqual([day[0] for day in self.days()], [date(2026, 3, 10), date(2026, 3, 11)])
+        booking.check_in_date, booking.check_out_date = date(2026, 3, 20), date(2026, 3, 21)
+        booking.save()
+        self.assertEqual(self.days(), [(date(2026, 3, 20), 1, Decimal('400.01'), 0, 0, 0)])
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(self.days(), [(date(2026, 3, 20), 0, Decimal('0.00'), 1, 0, 0)])
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertEqual(self.days(), [])
+
+    def test_reviews_roll_up_by_day(self):
+        booking = self.book(date(2026, 1, 5), 1, status='completed')
+        with self.captureOnCommitCallbacks(execute=True):
+            review = make_review(booking, 4)
+        today = timezone.localdate()
+        self.assertIn((today, 0, Decimal('0.00'), 0, 1, 4), self.days())
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertEqual(len(self.days()), 1)
+
+    def test_deleting_a_listing_cascades_cleanly(self):
+        make_review(self.book(date(2026, 1, 5), 1), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.delete()
+        self.assertFalse(ListingDailyStats.objects.exists())
+
+    def test_expired_bookings_count_as_cancellations(self):
+        booking = self.book(date(2026, 4, 1), 2, status='pending')
+        Booking.objects.filter(pk=booking.pk).update(created_at=timezone.now() - timedelta(days=2))
+        enqueue('expire_pending_bookings')
+        with self.assertLogs('listings.jobs'):
+            Worker(name='test-worker').run_pending()
+        self.assertEqual(self.days(), [(date(2026, 4, 1), 0, Decimal('0.00'), 1, 0, 0)])
+
+    def test_backfill_matches_incremental_rollups(self):
+        other = make_listing(self.host)
+        self.book(date(2026, 1, 30), 4)
+        self.book(date(2026, 2, 10), 3, status='completed')
+        self.book(date(2026, 2, 20), 2, status='cancelled')
+        make_review(self.book(date(2026, 3, 1), 1, listing=other), 3)
+        incremental = self.days(), self.days(other)
+        ListingDailyStats.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_daily_stats', batch_size=1, stdout=out)
+        self.assertEqual((self.days(), self.days(other)), incremental)
+        self.assertIn('for 2 listings', out.getvalue())
+
+    def test_monthly_report(self):
+        self.book(date(2026, 1, 30), 4)
+        self.book(date(2026, 2, 10), 2, status='cancelled')
+        make_listing(self.guest, title='Not mine')
+        self.client.force_authenticate(self.host)
+        response = self.client.get(self.url, {'start': '2026-01-01', 'end': '2026-03-01'})
+        self.assertEqual(response.status_code, 200)
+        [listing] = response.data['listings']
+        january, february = listing['months']
+        self.assertEqual(listing['title'], 'Loft')
+        self.assertEqual(
+            (january['month'], january['nights'], january['nights_booked'], january['revenue'], january['adr']),
+            ('2026-01', 31, 2, Decimal('200.01'), Decimal('100.01')),
+        )
+        self.assertEqual((february['nights'], february['nights_booked'], february['cancellations']), (28, 2, 1))
+        self.assertEqual(february['occupancy_rate'], round(2 / 28, 4))
+        self.assertEqual([month['revenue'] for month in response.data['totals']], [Decimal('200.01'), Decimal('200.00')])
+
+    def test_report_queries_do_not_grow_with_listings(self):
+        self.client.force_authenticate(self.host)
+        for _ in range(5):
+            make_listing(self.host)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['listings']), 6)
+        self.assertEqual(len(response.data['totals']), 12)
+
+    def test_report_parameters(self):
+        self.client.force_authenticate(self.host)
+        other = make_listing(self.guest)
+        self.assertEqual(self.client.get(self.url, {'listing': other.pk}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'start': '2026-03-01', 'end': '2026-02-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2020-01-01', 'end': '2026-01-01'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+
+
+class BookingCreateTests(APITestCase):
+    """POST /api/bookings/: one short transaction, replayable with an Idempotency-Key"""
+
+    url = reverse('booking-list')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create(username='host')
+        cls.guest = User.objects.create(username='guest')
+        cls.listing = make_listing(cls.host, max_guests=2)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.guest)
+
+    def payload(self, offset=10, nights=3, **overrides):
+        check_in = date.today() + timedelta(days=offset)
+        data = {
+            'listing': self.listing.pk,
+            'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=nights)).isoformat(),
+            'number_of_guests': 1,
+        }
+        data.update(overrides)
+        return data
+
+    def post(self, data, key=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(self.url, data, format='json', headers=headers)
+
+    def test_creates_a_priced_booking(self):
+        response = self.post(self.payload())
+        self.assertEqual(response.status_code, 201)
+        booking = Booking.objects.get()
+        self.assertEqual(response.data['id'], booking.pk)
+        self.assertEqual(response.data['total_price'], str(quote(self.listing.pk, booking.check_in_date, booking.check_out_date).total))
+        self.assertEqual((booking.guest, booking.status), (self.guest, 'pending'))
+        self.assertEqual(booking.booked_nights.count(), 3)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_retry_with_the_same_key_replays_the_response(self):
+        first = self.post(self.payload(), key='retry-1')
+        second = self.post(self.payload(), key='retry-1')
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second.json(), first.json())
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self.post(self.payload(), key='shared')
+        self.client.force_authenticate(self.host)
+        self.assertEqual(self.post(self.payload(offset=20), key='shared').status_code, 201)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.post(self.payload(), key='reused')
+        response = self.post(self.payload(offset=20), key='reused')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_taken_nights_conflict_and_are_not_stored(self):
+        self.post(self.payload())
+        response = self.post(self.payload(offset=12), key='late')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        # Once the nights are free again the same key books them
+        Booking.objects.update(status='cancelled')
+        BookedNight.objects.all().delete()
+        self.assertEqual(self.post(self.payload(offset=12), key='late').status_code, 201)
+
+    def test_listing_rules(self):
+        inactive = make_listing(self.host, is_active=False)
+        cases = {
+            'too many guests': self.payload(number_of_guests=3),
+            'inactive': self.payload(listing=inactive.pk),
+            'unknown listing': self.payload(listing=inactive.pk + 1),
+            'dates reversed': self.payload(nights=0),
+        }
+        for name, data in cases.items():
+            with self.subTest(name):
+                self.assertEqual(self.post(data).status_code, 400)
+        self.assertEqual(self.post(self.payload(), key='x' * 256).status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_round_trips(self):
+        self.post(self.payload(offset=100))
+        # Listing rules, availability and key in one read, then BEGIN, the
+        # booking, its nights, the key and COMMIT; pricing comes from the cache
+        with self.assertNumQueries(6):
+            self.assertEqual(self.post(self.payload(), key='counted').status_code, 201)
+        # A replay reads the stored response instead
+        with self.assertNumQueries(2):
+            self.assertEqual(self.post(self.payload(), key='counted').status_code, 201)
+
+    def test_expired_keys_are_purged(self):
+        self.post(self.payload(), key='old')
+        self.post(self.payload(offset=20), key='new')
+        IdempotencyKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(hours=25))
+        enqueue('purge_idempotency_keys')
+        with self.assertLogs('listings.jobs'):
+            [report] = Worker(name='test-worker').run_pending()
+        self.assertEqual(report['rows'], 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class BookingDeletionRaceTests(TransactionTestCase):
+    """Bookings whose listing or guest disappears between the checks and the write"""
+
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create(username='host')
+        self.guest = User.objects.create(username='guest')
+        self.listing = make_listing(self.host)
+        self.check_in = date.today() + timedelta(days=5)
+
+    def test_listing_deleted_after_read_rules(self):
+        def read_then_delete(*args, **kwargs):
+            rules = read_rules(*args, **kwargs)
+            Listing.objects.filter(pk=self.listing.pk).delete()
+            return rules
+
+        with mock.patch('listings.bookings.read_rules', side_effect=read_then_delete):
+            with self.assertRaisesMessage(BookingInvalid, 'does not exist'):
+                create_booking(self.guest, self.listing.pk, self.check_in, self.check_in + timedelta(days=2), 1)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_listing_deleted_before_insert(self):
+        booking = Booking(
+            listing_id=self.listing.pk, guest=self.guest, check_in_date=self.check_in,
+            check_out_date=self.check_in + timedelta(days=2), number_of_guests=1,
+            total_price=Decimal('200.00'),
+        )
+        Listing.objects.filter(pk=self.listing.pk).delete()
+        with self.assertRaisesMessage(BookingInvalid, 'does not exist'):
+            insert(booking)
+
+    def test_other_integrity_errors_propagate(self):
+        booking = Booking(
+            listing_id=self.listing.pk, guest=User(pk=self.guest.pk + 100), check_in_date=self.check_in,
+            check_out_date=self.check_in + timedelta(days=2), number_of_guests=1,
+            total_price=Decimal('200.00'),
+        )
+        with self.assertRaises(IntegrityError):
+            insert(booking)
+
+
+class ConcurrentBookingCreateTests(TransactionTestCase):
+    """Many threads booking one listing: fast, and never double-booked"""
+
+    THREADS = 8
+    ATTEMPTS = 25
+
+    def hammer(self, attempt):
+        """Run ``attempt(thread, n)`` ATTEMPTS times on each of THREADS threads at once"""
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+
+        def run(thread):
+            try:
+                barrier.wait()
+                for n in range(self.ATTEMPTS):
+                    outcomes.append(attempt(thread, n))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.THREADS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes, time.perf_counter() - started
+
+    def test_no_night_is_booked_twice(self):
+        host = User.objects.create(username='host')
+        guests = [User.objects.create(username=f'guest{i}') for i in range(self.THREADS)]
+        listing = make_listing(host)
+        first = date.today() + timedelta(days=1)
+
+        def attempt(thread, n):
+            # Every thread walks the same overlapping stays, so most attempts collide
+            check_in = first + timedelta(days=n * 2)
+            try:
+                create_booking(
+                    guests[thread], listing.pk, check_in, check_in + timedelta(days=3), 1,
+                    idempotency_key=f'{thread}-{n}',
+                )
+                return 'won'
+            except NightsUnavailable:
+                return 'lost'
+
+        outcomes, elapsed = self.hammer(attempt)
+        self.assertEqual(len(outcomes), self.THREADS * self.ATTEMPTS)
+        stays = sorted(Booking.objects.values_list('check_in_date', 'check_out_date'))
+        self.assertEqual(outcomes.count('won'), len(stays))
+        for (_, previous_out), (check_in, _) in zip(stays, stays[1:]):
+            self.assertLessEqual(previous_out, check_in)
+        self.assertEqual(BookedNight.objects.count(), sum((out - in_).days for in_, out in stays))
+        # Generous enough for a loaded CI box; a few hundred per second here
+        self.assertGreater(len(outcomes) / elapsed, 20)
+
+    def test_concurrent_retries_book_once(self):
+        host = User.objects.create(username='host')
+        guest = User.objects.create(username='guest')
+        listing = make_listing(host)
+        check_in = date.today() + timedelta(days=5)
+
+        def attempt(thread, n):
+            result = create_booking(
+                guest, listing.pk, check_in, check_in + timedelta(days=2), 1, idempotency_key='mobile-retry',
+            )
+            return result.status_code, result.data['id']
+
+        outcomes, _ = self.hammer(attempt)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(set(outcomes), {(201, Booking.objects.get().pk)})
@@ -0,0 +1,27 @@
+from django.urls import include, path, re_path
+from rest_framework.routers import DefaultRouter
+
+from . import async_views, views
+
+router = DefaultRouter()
+router.register('listings', views.ListingViewSet, basename='listing')
+router.register('bookings', views.BookingViewSet, basename='booking')
+router.register('reviews', views.ReviewViewSet, basename='review')
+
+urlpatterns = [
+    path('', include(router.urls)),
+    re_path(
+        r'^export/(?P<kind>bookings|listings)\.(?P<file_format>csv|jsonl)$',
+        views.ExportView.as_view(),
+        name='export',
+    ),
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache-stats'),
+    path('import/listings/', views.ListingImportView.as_view(), name='listing-import'),
+    path('analytics/host/', views.HostAnalyticsView.as_view(), name='host-analytics'),
+    path('async/listings/search/', async_views.search, name='async-listing-search'),
+    path(
+        'async/listings/<int:pk>/availability/',
+        async_views.availability,
+        name='async-listing-availability',
+    ),
+]
@@ -1,3 +1,395 @@
-from django.shortcuts import render
+import io
 
-# Create your views here.
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from alx_travel_app.instrumentation import timed
+
+from .models import Listing, Booking, Review
+from .analytics import host_report
+from .availability import NightsUnavailable
+from .bookings import UNAVAILABLE, BookingInvalid, IdempotencyKeyReused, create_booking
+from .caching import cached_response, detail_key, reset_stats, search_key, stats
+from .exports import CONTENT_TYPES, iter_export
+from .fulltext import search as text_search
+from .fastpath import compile_plan
+from .features import with_amenities, with_house_rules
+from .imports import import_listings
+from .pagination import CheapestFirstPagination
+from .geo import within_bbox, within_radius
+from .pricing import quote_many
+from .search import available_listings
+from .serializers import (
+    ListingSerializer, ListingSummarySerializer, BookingSerializer,
+    BookingSummarySerializer, ReviewSerializer, ListingSearchSerializer,
+    StayDatesSerializer, TextSearchSerializer, ListingFilterSerializer,
+    NearbySearchSerializer, BoundingBoxSerializer, ExportFilterSerializer,
+    ListingImportSerializer, HostAnalyticsSerializer, BookingRequestSerializer,
+)
+
+
+class SparseFieldsMixin:
+    """Pick the compact serializer for list actions and load only what it renders.
+    
+    The serializer's ``query_plan()`` (honouring ``?fields=``/``?expand=``)
+    becomes ``only()``, ``select_related()`` and ``prefetch_related()`` on
+    the queryset, so nested objects never cost a query per row. The list
+    action skips model instances entirely and renders ``values()`` rows
+    through ``listings.fastpath``.
+    """
+    
+    summary_serializer_class = None
+    summary_actions = ('list',)
+    
+    def get_serializer_class(self):
+        if self.action in self.summary_actions and self.summary_serializer_class:
+            return self.summary_serializer_class
+        return super().get_serializer_class()
+    
+    def trim_queryset(self, queryset):
+        only, joins, prefetches = self.get_serializer().query_plan()
+        if joins:
+            # select_related() with no arguments would follow every foreign key
+            queryset = queryset.select_related(*joins)
+        # The paginator reads its ordering columns to build cursors
+        ordering = [name.lstrip('-') for name in getattr(self.paginator, 'ordering', ())]
+        return queryset.prefetch_related(*prefetches).only(*only, *ordering)
+    
+    def list(self, request, *args, **kwargs):
+        """Build list pages from values() rows when the serializer allows it"""
+        serializer = self.get_serializer()
+        plan = compile_plan(serializer)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        
+        ordering = [name.lstrip('-') for name in getattr(self.paginator, 'ordering', ())]
+        rows = plan.values(self.filter_queryset(self.get_queryset()), *ordering)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            with timed('serialize'):
+                return self.get_paginated_response(plan.render(page))
+        with timed('serialize'):
+            return Response(plan.render(rows))
+    
+    def cache_variant(self):
+        """Query parameters that change the shape of a cached response"""
+        params = self.request.query_params
+        return {name: params.get(name, '') for name in ('fields', 'expand')}
+
+
+class ListingViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """Read-only listing endpoints.
+    
+    List and search actions return ``ListingSummarySerializer`` rows; detail
+    returns the full listing with host and reviews. Joins and prefetches
+    follow the rendered fields, so the number of queries does not depend on
+    how many listings are returned. Rating aggregates are stored on the
+    listing row itself.
+    """
+    
+    serializer_class = ListingSerializer
+    summary_serializer_class = ListingSummarySerializer
+    summary_actions = ('list', 'search', 'text_search', 'nearby', 'within')
+    
+    def get_queryset(self):
+        return self.trim_queryset(Listing.objects.filter(is_active=True))
+    
+    def filter_queryset(self, queryset):
+        """Apply ?amenities= (all of), ?any_amenities= and ?house_rules= (all of)
+        
+        The filters are index lookups on the feature links, not JSON scans.
+        """
+        queryset = super().filter_queryset(queryset)
+        filters = self.feature_filters()
+        queryset = with_amenities(queryset, filters['amenities'])
+        queryset = with_amenities(queryset, filters['any_amenities'], match='any')
+        return with_house_rules(queryset, filters['house_rules'])
+    
+    def feature_filters(self):
+        params = ListingFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+    
+    def cache_variant(self):
+        return {**super().cache_variant(), **{
+            name: ','.join(names) for name, names in self.feature_filters().items()
+        }}
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Listing detail, cached per listing version with an ETag"""
+        pk = kwargs['pk']
+        if not pk.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        
+        def build():
+            listing = self.get_object()
+            with timed('serialize'):
+                return self.get_serializer(listing).data
+        
+        key = detail_key(int(pk), self.cache_variant())
+        return cached_response(request, 'listing_detail', key, build)
+    
+    @action(detail=False)
+    def search(self, request):
+        """Listings free for a date window: ?check_in=&check_out=&city=&guests=
+        
+        Results come cheapest first, a page at a time (``?page_size=``, then
+        the ``next`` cursor). Each result carries a ``quote`` for the
+        requested stay.
+        """
+        params = ListingSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        check_in = params.validated_data['check_in']
+        check_out = params.validated_data['check_out']
+        paginator = CheapestFirstPagination()
+        
+        def build():
+            queryset = available_listings(
+                check_in,
+                check_out,
+                city=params.validated_data.get('city'),
+                guests=params.validated_data.get('guests'),
+                queryset=self.filter_queryset(self.get_queryset()),
+            )
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            with timed('serialize'):
+                data = self.get_serializer(page, many=True).data
+            quotes = quote_many([row['id'] for row in data], check_in, check_out)
+            for row in data:
+                row['quote'] = quotes[row['id']].as_dict()
+            return paginator.get_paginated_response(data).data
+        
+        key = search_key({
+            **params.validated_data,
+            **self.cache_variant(),
+            'cursor': request.query_params.get(paginator.cursor_query_param, ''),
+            'page_size': paginator.get_page_size(request),
+        })
+        return cached_response(request, 'listing_search', key, build)
+    
+    @action(detail=False, url_path='text-search')
+    def text_search(self, request):
+        """Listings matching ?q= words and ?amenities=WiFi,Pool, best match first
+        
+        Every word matches as a prefix. Each result carries a ``score``
+        relative to the best match (1.0), since raw BM25 values depend on
+        the backend and the size of the catalogue.
+        """
+        params = TextSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        
+        def build():
+            matches = text_search(
+                params.validated_data['q'],
+                amenities=params.validated_data['amenities'],
+                limit=params.validated_data['limit'],
+            )
+            scores = dict(matches)
+            best = max(scores.values(), default=0) or 1
+            listings = self.get_queryset().in_bulk(list(scores))
+            with timed('serialize'):
+                data = self.get_serializer(
+                    [listings[pk] for pk, _ in matches if pk in listings], many=True
+                ).data
+            for row in data:
+                row['score'] = round(scores[row['id']] / best, 4)
+            return data
+        
+        key = search_key({
+            'text': params.validated_data['q'],
+            'amenities': ','.join(params.validated_data['amenities']),
+            'limit': params.validated_data['limit'],
+            **self.cache_variant(),
+        })
+        return cached_response(request, 'listing_search', key, build)
+    
+    @action(detail=True)
+    def quote(self, request, pk=None):
+        """Price breakdown for staying ?check_in=&check_out="""
+        params = StayDatesSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        listing = self.get_object()
+        quotes = quote_many(
+            [listing.pk],
+            params.validated_data['check_in'],
+            params.validated_data['check_out'],
+        )
+        return Response(quotes[listing.pk].as_dict())
+    
+    @action(detail=False)
+    def nearby(self, request):
+        """Listings within ?radius_km= of ?lat=&lng=, nearest first"""
+        params = NearbySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        matches = within_radius(
+            self.filter_queryset(self.get_queryset()),
+            params.validated_data['lat'],
+            params.validated_data['lng'],
+            params.validated_data['radius_km'],
+            limit=params.validated_data['limit'],
+        )
+        distances = dict(matches)
+        listings = self.get_queryset().in_bulk(list(distances))
+        with timed('serialize'):
+            data = self.get_serializer([listings[pk] for pk, _ in matches], many=True).data
+        for row in data:
+            row['distance_km'] = round(distances[row['id']], 3)
+        return Response(data)
+    
+    @action(detail=False)
+    def within(self, request):
+        """Listings inside ?bbox=min_lat,min_lng,max_lat,max_lng, newest first, a page at a time"""
+        params = BoundingBoxSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = within_bbox(self.filter_queryset(self.get_queryset()), *params.validated_data['bbox'])
+        page = self.paginate_queryset(queryset)
+        with timed('serialize'):
+            data = self.get_serializer(page, many=True).data
+        return self.get_paginated_response(data)
+
+
+class BookingViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """Bookings made by, or made on listings hosted by, the current user.
+    
+    The list returns ``BookingSummarySerializer`` rows; ``?expand=listing``
+    or ``?expand=guest`` nests the related objects.
+    
+    ``POST`` books a stay for the current user. Send an ``Idempotency-Key``
+    header to make retries safe: a repeat of the same request gets the
+    original 201 back with ``Idempotent-Replayed: true``, and the same key
+    with a different request is refused with 422.
+    """
+    
+    serializer_class = BookingSerializer
+    summary_serializer_class = BookingSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        user = self.request.user
+        return self.trim_queryset(
+            Booking.objects.filter(Q(guest=user) | Q(listing__host=user))
+        )
+    
+    def create(self, request):
+        params = BookingRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        key = request.headers.get('Idempotency-Key', '').strip() or None
+        if key is not None and len(key) > 255:
+            raise ValidationError({'Idempotency-Key': 'Ensure this header has no more than 255 characters.'})
+        try:
+            result = create_booking(request.user, idempotency_key=key, **params.validated_data)
+        except BookingInvalid as exc:
+            raise ValidationError({'non_field_errors': [str(exc)]})
+        except NightsUnavailable:
+            return Response({'detail': UNAVAILABLE}, status=status.HTTP_409_CONFLICT)
+        except IdempotencyKeyReused:
+            return Response(
+                {'detail': 'This Idempotency-Key was already used for a different request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = Response(result.data, status=result.status_code)
+        if result.replayed:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+class ReviewViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """Read-only review endpoints, optionally filtered by ``?listing=<id>``"""
+    
+    serializer_class = ReviewSerializer
+    
+    def get_queryset(self):
+        queryset = self.trim_queryset(Review.objects.all())
+        listing_id = self.request.query_params.get('listing')
+        if listing_id and listing_id.isdigit():
+            queryset = queryset.filter(listing_id=listing_id)
+        return queryset
+
+
+class CacheStatsView(APIView):
+    """Response cache hit/miss counters for staff; DELETE resets them"""
+    
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        return Response(stats())
+    
+    def delete(self, request):
+        reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ExportView(APIView):
+    """Stream bookings or listings as CSV or JSONL to staff users.
+    
+    ``GET /api/export/bookings.csv?start=2024-01-01&end=2024-02-01&status=confirmed``
+    """
+    
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request, kind, file_format):
+        params = ExportFilterSerializer(data=request.query_params, context={'kind': kind})
+        params.is_valid(raise_exception=True)
+        lines = iter_export(
+            kind, file_format,
+            start=params.validated_data.get('start'),
+            end=params.validated_data.get('end'),
+            statuses=sorted(params.validated_data.get('status', [])),
+        )
+        response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{file_format}"'
+        return response
+
+
+class ListingImportView(APIView):
+    """Import a partner listing feed uploaded as ``file`` (CSV or JSONL).
+    
+    Newly created listings are owned by the uploading staff user. The
+    response reports counts, throughput and the first rejected records.
+    """
+    
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+    
+    def post(self, request):
+        params = ListingImportSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        upload = params.validated_data['file']
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        report = import_listings(
+            stream,
+            params.validated_data['file_format'],
+            request.user,
+            batch_size=params.validated_data['batch_size'],
+        )
+        return Response(report.as_dict(max_errors=100))
+
+
+class HostAnalyticsView(APIView):
+    """Occupancy, revenue and ADR per month for the current user's listings.
+    
+    ``GET /api/analytics/host/?start=2026-01-01&end=2026-07-01&listing=12``
+    answers from the ListingDailyStats rollups. ``start`` and ``end`` default
+    to the twelve months up to this one; ``listing`` narrows the report to
+    one of the host's listings.
+    """
+    
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        params = HostAnalyticsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        listings = Listing.objects.filter(host=request.user).order_by('pk')
+        if 'listing' in params.validated_data:
+            listings = listings.filter(pk=params.validated_data['listing'])
+        listings = list(listings.values_list('pk', 'title'))
+        if not listings and 'listing' in params.validated_data:
+            raise NotFound('No such listing among yours.')
+        report = host_report(listings, params.validated_data['start'], params.validated_data['end'])
+        return Response(report)